@@ -1,35 +1,91 @@
+import hmac
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 
-from fastapi import Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from fastapi import Depends, Header, HTTPException, status
+from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
 from .config import get_settings
 from .database import get_session
+from .hashing import password_hasher
+from .metrics import PASSWORD_REHASHED
 from .models import User
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/v1/auth/token")
 settings = get_settings()
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated caller: just enough to authorize a request without loading the user graph."""
 
+    id: int
+    email: str
 
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+
+class PrincipalCache:
+    """Bounded LRU cache of principals with a per-entry TTL and explicit invalidation."""
+
+    def __init__(self, maxsize: int, ttl_seconds: float) -> None:
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[int, Tuple[float, Principal]]" = OrderedDict()
+
+    def get(self, user_id: int) -> Optional[Principal]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        expires_at, principal = entry
+        if expires_at < time.monotonic():
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return principal
+
+    def set(self, principal: Principal) -> None:
+        self._entries[principal.id] = (time.monotonic() + self.ttl_seconds, principal)
+        self._entries.move_to_end(principal.id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        self._entries.pop(user_id, None)
+
+
+principal_cache = PrincipalCache(settings.principal_cache_size, settings.principal_cache_ttl_seconds)
+
+
+def invalidate_principal(user_id: int) -> None:
+    """Drop a cached principal; call whenever a user's email changes or the user is removed."""
+    principal_cache.invalidate(user_id)
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return await password_hasher.verify_and_update(plain_password, hashed_password)
+
+
+async def get_password_hash(password: str) -> str:
+    return await password_hasher.hash(password)
 
 
 async def authenticate_user(session: AsyncSession, email: str, password: str) -> Optional[User]:
     result = await session.execute(select(User).where(User.email == email))
     user = result.scalars().first()
-    if not user or not verify_password(password, user.password_hash):
+    if not user:
         return None
+    valid, new_hash = await verify_password(password, user.password_hash)
+    if not valid:
+        return None
+    if new_hash:
+        user.password_hash = new_hash
+        await session.commit()
+        PASSWORD_REHASHED.inc()
     return user
 
 
@@ -43,7 +99,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
 
 async def get_current_user(
     token: str = Depends(oauth2_scheme), session: AsyncSession = Depends(get_session)
-) -> User:
+) -> Principal:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -54,10 +110,19 @@ async def get_current_user(
         user_id: int = payload.get("sub")
         if user_id is None:
             raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    result = await session.execute(select(User).where(User.id == int(user_id)))
-    user = result.scalars().first()
-    if user is None:
+        user_id = int(user_id)
+    except (JWTError, ValueError):
         raise credentials_exception
-    return user
+    principal = principal_cache.get(user_id)
+    if principal is None:
+        row = (await session.execute(select(User.id, User.email).where(User.id == user_id))).first()
+        if row is None:
+            raise credentials_exception
+        principal = Principal(id=row.id, email=row.email)
+        principal_cache.set(principal)
+    return principal
+
+
+def verify_internal_token(x_sheetify_internal_token: str = Header(...)) -> None:
+    if not hmac.compare_digest(x_sheetify_internal_token, settings.internal_token):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid internal token")
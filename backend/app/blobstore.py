@@ -0,0 +1,98 @@
+import hashlib
+import os
+import re
+import tempfile
+import zlib
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator
+
+from .config import get_settings
+
+settings = get_settings()
+
+DIGEST_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+class BlobNotFound(Exception):
+    pass
+
+
+class BlobStore:
+    """Content-addressed store of zlib-compressed blobs, keyed by the SHA-256 of the raw bytes.
+
+    Writing content that is already stored is a no-op, so re-uploading an
+    identical app costs one hash and one ``stat``.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+
+    def path_for(self, digest: str) -> Path:
+        if not DIGEST_PATTERN.match(digest):
+            raise BlobNotFound(digest)
+        return self.root / digest[:2] / f"{digest}.z"
+
+    def exists(self, digest: str) -> bool:
+        return self.path_for(digest).exists()
+
+    def put_bytes(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        if not self.exists(digest):
+            self.put_chunks([data])
+        return digest
+
+    def put_chunks(self, chunks: Iterable[bytes]) -> str:
+        """Hash and compress ``chunks`` to a temporary file, then move it into place."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        hasher = hashlib.sha256()
+        compressor = zlib.compressobj(settings.blob_compression_level)
+        with tempfile.NamedTemporaryFile(dir=self.root, delete=False) as tmp:
+            try:
+                for chunk in chunks:
+                    hasher.update(chunk)
+                    tmp.write(compressor.compress(chunk))
+                tmp.write(compressor.flush())
+            except BaseException:
+                os.unlink(tmp.name)
+                raise
+        digest = hasher.hexdigest()
+        path = self.path_for(digest)
+        if path.exists():
+            os.unlink(tmp.name)
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp.name, path)
+        return digest
+
+    def put_file(self, path: Path, chunk_size: int = 64 * 1024) -> str:
+        def chunks() -> Iterator[bytes]:
+            with path.open("rb") as fh:
+                while chunk := fh.read(chunk_size):
+                    yield chunk
+
+        return self.put_chunks(chunks())
+
+    def open_compressed(self, digest: str) -> BinaryIO:
+        try:
+            return self.path_for(digest).open("rb")
+        except FileNotFoundError:
+            raise BlobNotFound(digest)
+
+    def iter_bytes(self, digest: str, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        decompressor = zlib.decompressobj()
+        with self.open_compressed(digest) as fh:
+            while True:
+                chunk = fh.read(chunk_size)
+                if not chunk:
+                    break
+                yield decompressor.decompress(chunk)
+        yield decompressor.flush()
+
+    def read_bytes(self, digest: str) -> bytes:
+        return b"".join(self.iter_bytes(digest))
+
+    def read_text(self, digest: str) -> str:
+        return self.read_bytes(digest).decode("utf-8")
+
+
+blob_store = BlobStore(Path(settings.blob_store_path))
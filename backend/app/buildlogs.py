@@ -0,0 +1,87 @@
+import asyncio
+import json
+import time
+from typing import AsyncIterator, List
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from .config import get_settings
+from .database import AsyncSessionLocal
+from .models import BuildLogChunk, BuildStatus, ToolBuild
+
+settings = get_settings()
+
+ACTIVE_BUILD_STATUSES = {BuildStatus.PENDING, BuildStatus.RUNNING}
+
+
+class BuildLogWriter:
+    """Persist build output as bounded ``BuildLogChunk`` rows while the build runs."""
+
+    def __init__(self, session: AsyncSession, build_id: int) -> None:
+        self.session = session
+        self.build_id = build_id
+        self._lines: List[str] = []
+        self._size = 0
+        self._seq = 0
+        self._last_flush = time.monotonic()
+
+    async def write(self, line: str) -> None:
+        line = line[: settings.build_log_chunk_bytes]
+        self._lines.append(line)
+        self._size += len(line) + 1
+        if (
+            self._size >= settings.build_log_chunk_bytes
+            or time.monotonic() - self._last_flush >= settings.build_log_flush_seconds
+        ):
+            await self.flush()
+
+    async def flush(self) -> None:
+        self._last_flush = time.monotonic()
+        if not self._lines:
+            return
+        self._seq += 1
+        self.session.add(BuildLogChunk(build_id=self.build_id, seq=self._seq, content="\n".join(self._lines)))
+        self._lines = []
+        self._size = 0
+        await self.session.commit()
+
+
+async def iter_log_chunks(build_id: int, after_seq: int = 0, page_size: int = 50) -> AsyncIterator[BuildLogChunk]:
+    while True:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(BuildLogChunk)
+                .where(BuildLogChunk.build_id == build_id, BuildLogChunk.seq > after_seq)
+                .order_by(BuildLogChunk.seq)
+                .limit(page_size)
+            )
+            chunks = result.scalars().all()
+        for chunk in chunks:
+            after_seq = chunk.seq
+            yield chunk
+        if len(chunks) < page_size:
+            return
+
+
+async def stream_log_text(build_id: int) -> AsyncIterator[str]:
+    async for chunk in iter_log_chunks(build_id):
+        yield chunk.content + "\n"
+
+
+def _chunk_event(chunk: BuildLogChunk) -> str:
+    return f"id: {chunk.seq}\ndata: {json.dumps({'seq': chunk.seq, 'text': chunk.content})}\n\n"
+
+
+async def follow_log_events(build_id: int, after_seq: int = 0) -> AsyncIterator[str]:
+    """Server-sent events for a build's log, ending once the build has finished."""
+    while True:
+        async with AsyncSessionLocal() as session:
+            status = (await session.execute(select(ToolBuild.status).where(ToolBuild.id == build_id))).scalar()
+        async for chunk in iter_log_chunks(build_id, after_seq):
+            after_seq = chunk.seq
+            yield _chunk_event(chunk)
+        if status not in ACTIVE_BUILD_STATUSES:
+            yield f"event: end\ndata: {json.dumps({'status': status.value if status else None})}\n\n"
+            return
+        await asyncio.sleep(settings.log_follow_poll_seconds)
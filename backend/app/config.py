@@ -8,10 +8,57 @@ class Settings(BaseSettings):
     redis_url: str = "redis://redis:6379/0"
     secret_key: str = "super-secret"
     access_token_expire_minutes: int = 60 * 24
+    principal_cache_size: int = 10000
+    principal_cache_ttl_seconds: float = 60.0
+    bcrypt_rounds: int = 12
+    hash_workers: int = 4
+    hash_max_pending: int = 64
     celery_broker_url: str = "redis://redis:6379/1"
     celery_result_backend: str = "redis://redis:6379/1"
+    celery_runtime_queue: str = "runtime"
+    worker_metrics_port: int = 0
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
     runner_url: str = "http://runner:8001"
+    runner_max_connections: int = 50
+    runner_max_keepalive_connections: int = 10
+    runner_keepalive_seconds: float = 30.0
+    runner_connect_timeout: float = 5.0
+    runner_default_timeout: float = 30.0
+    runner_build_submit_timeout: float = 30.0
+    runner_run_timeout: float = 120.0
+    runner_resolve_timeout: float = 330.0
+    runner_stop_timeout: float = 60.0
+    runner_status_timeout: float = 10.0
+    runner_stream_read_timeout: float = 60.0
+    runner_retry_attempts: int = 3
+    runner_retry_base_delay: float = 0.5
+    runner_retry_max_delay: float = 8.0
+    runner_breaker_threshold: int = 5
+    runner_breaker_reset_seconds: float = 30.0
+    node_heartbeat_timeout_seconds: float = 45.0
+    node_check_interval_seconds: float = 30.0
+    placement_image_weight: float = 4.0
+    placement_deps_weight: float = 2.0
+    placement_strategy: str = "binpack"
+    placement_attempts: int = 3
     base_tool_url: str = "http://localhost/t"
+    internal_token: str = "internal-secret"
+    blob_store_path: str = "/var/lib/sheetify/blobs"
+    blob_compression_level: int = 6
+    upload_max_bytes: int = 50 * 1024 * 1024
+    archive_max_members: int = 1000
+    archive_max_total_bytes: int = 200 * 1024 * 1024
+    archive_max_ratio: float = 100.0
+    source_max_bytes: int = 1024 * 1024
+    build_log_chunk_bytes: int = 64 * 1024
+    build_log_flush_seconds: float = 1.0
+    log_follow_poll_seconds: float = 1.0
+    run_log_segment_bytes: int = 256 * 1024
+    run_log_tail_lines: int = 500
+    tool_events_channel: str = "sheetify:tool-events"
+    tool_events_queue_size: int = 100
+    tool_events_keepalive_seconds: float = 15.0
 
     class Config:
         env_file = ".env"
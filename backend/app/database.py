@@ -1,21 +1,56 @@
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+import os
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 from .config import get_settings
 
 settings = get_settings()
 
-engine = create_async_engine(str(settings.database_url), future=True, echo=False)
-
 AsyncSessionLocal = sessionmaker(
-    bind=engine,
     class_=AsyncSession,
     expire_on_commit=False,
 )
 
 Base = declarative_base()
 
+_engine: Optional[AsyncEngine] = None
+_engine_pid: Optional[int] = None
+
+
+def get_engine() -> AsyncEngine:
+    """Return this process's engine, creating it (and binding sessions) on first use.
+
+    Engines are never shared across ``fork``: a child that inherits its parent's
+    engine drops the inherited pool without closing the parent's connections.
+    """
+    global _engine, _engine_pid
+    if _engine is not None and _engine_pid != os.getpid():
+        _engine.sync_engine.dispose(close=False)
+        _engine = None
+    if _engine is None:
+        _engine = create_async_engine(
+            str(settings.database_url),
+            future=True,
+            echo=False,
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_pre_ping=True,
+        )
+        _engine_pid = os.getpid()
+        AsyncSessionLocal.configure(bind=_engine)
+    return _engine
+
+
+async def dispose_engine() -> None:
+    global _engine
+    if _engine is not None and _engine_pid == os.getpid():
+        await _engine.dispose()
+    _engine = None
+
 
 async def get_session() -> AsyncSession:
+    get_engine()
     async with AsyncSessionLocal() as session:
         yield session
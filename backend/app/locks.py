@@ -0,0 +1,46 @@
+import asyncio
+from typing import Optional
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from .blobstore import blob_store
+from .models import DependencyLock, ToolVersion
+from .runner import resolve_requirements
+
+
+async def _memoised(session: AsyncSession, requirements_digest: str) -> Optional[DependencyLock]:
+    stmt = select(DependencyLock).where(DependencyLock.requirements_digest == requirements_digest)
+    return (await session.execute(stmt)).scalars().first()
+
+
+async def cached_lock(session: AsyncSession, version: ToolVersion) -> Optional[str]:
+    """The version's lock digest if its requirements were already resolved, by it or any other version."""
+    if version.lock_digest is None:
+        lock = await _memoised(session, version.requirements_digest)
+        if lock is not None:
+            version.lock_digest = lock.lock_digest
+            await session.commit()
+    return version.lock_digest
+
+
+async def resolve_lock(session: AsyncSession, version: ToolVersion, runner_url: Optional[str] = None) -> DependencyLock:
+    """Resolve the version's requirements on a runner and record the lock for every version that shares them."""
+    result = await resolve_requirements(version.requirements_digest, runner_url=runner_url)
+    lock_digest = await asyncio.to_thread(blob_store.put_bytes, result["lock"].encode("utf-8"))
+    # Two builds may resolve the same requirements at once: the first insert wins and both use its lock.
+    await session.execute(
+        insert(DependencyLock)
+        .values(
+            requirements_digest=version.requirements_digest,
+            lock_digest=lock_digest,
+            packages=result["packages"],
+            environment=result.get("environment"),
+        )
+        .on_conflict_do_nothing(index_elements=[DependencyLock.requirements_digest])
+    )
+    lock = await _memoised(session, version.requirements_digest)
+    version.lock_digest = lock.lock_digest
+    await session.commit()
+    return lock
@@ -1,20 +1,118 @@
-from fastapi import Depends, FastAPI, File, HTTPException, UploadFile
+import hashlib
+import time
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import Depends, FastAPI, File, Header, HTTPException, Query, Request, Response, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from sqlalchemy import func
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy.orm import selectinload, undefer
 
 from . import auth
-from .auth import create_access_token, get_password_hash, get_current_user
+from .auth import Principal, create_access_token, get_password_hash, get_current_user, verify_internal_token
+from .blobstore import BlobNotFound, blob_store
+from .buildlogs import follow_log_events, stream_log_text
 from .config import get_settings
-from .database import Base, engine, get_session
-from .models import Tool, ToolBuild, ToolStatus, ToolVersion, User
-from .schemas import BuildRequest, ToolCreate, ToolDetail, ToolOut, UserCreate, UserOut
-from .tasks import execute_build, execute_run, execute_stop
-from .utils.packaging import PackagingError, load_version_payload
+from .database import Base, dispose_engine, get_engine, get_session
+from .hashing import HashingBusy
+from .models import (
+    BuildStatus,
+    NodeStatus,
+    RunnerNode,
+    RunStatus,
+    Tool,
+    ToolBuild,
+    ToolReplica,
+    ToolRun,
+    ToolStatus,
+    ToolVersion,
+    User,
+)
+from .metrics import HTTP_REQUEST_SECONDS
+from .placement import heartbeat_cutoff, node_url
+from .profiles import profile_for
+from .runlogs import follow_run_log_events, stream_run_log_text
+from .runner import RunnerUnavailable, cancel_job, close_runner_client, scale_tool
+from .schemas import (
+    BuildPage,
+    BuildRequest,
+    NodeHeartbeat,
+    NodeOut,
+    ReplicaReport,
+    ReplicaUsage,
+    RunPage,
+    ToolResources,
+    ToolScaling,
+    ToolStateReport,
+    ToolCreate,
+    ToolDetail,
+    ToolOut,
+    ToolUsage,
+    UserCreate,
+    UserOut,
+    VersionPage,
+)
+from .tasks import archive_run_output, execute_build, execute_run, execute_stop, reschedule_node
+from .toolevents import close_event_publisher, follow_tool_events, hub, publish_tool_event
+from .tracing import current_traceparent, reset_traceparent, set_traceparent
+from .utils.packaging import ArchiveLimits, PackagingError, load_version_payload
 
 settings = get_settings()
 
+archive_limits = ArchiveLimits(
+    max_members=settings.archive_max_members,
+    max_total_bytes=settings.archive_max_total_bytes,
+    max_ratio=settings.archive_max_ratio,
+    max_source_bytes=settings.source_max_bytes,
+)
+
+
+class UploadTooLarge(HTTPException):
+    def __init__(self) -> None:
+        super().__init__(status_code=413, detail="Upload is too large")
+
+
+class UploadSizeLimit:
+    """Caps POST bodies at ``max_bytes`` while they are received, before anything is spooled past the cap.
+
+    A declared Content-Length over the cap is refused up front. Chunked bodies
+    carry no length, so the bytes are counted as they arrive and reading stops
+    with ``UploadTooLarge`` once they pass the cap.
+    """
+
+    def __init__(self, app, max_bytes: int) -> None:
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or scope["method"] != "POST":
+            await self.app(scope, receive, send)
+            return
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > self.max_bytes:
+            await JSONResponse(status_code=413, content={"detail": "Upload is too large"})(scope, receive, send)
+            return
+        received = 0
+
+        async def receive_capped():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Raised inside the body parser, so FastAPI's exception handling turns it into the 413.
+                    raise UploadTooLarge()
+            return message
+
+        await self.app(scope, receive_capped, send)
+
+
 app = FastAPI(title="Sheetify Studio API", version="0.1.0")
 
 app.add_middleware(
@@ -26,18 +124,56 @@ app.add_middleware(
 )
 
 
+app.add_middleware(UploadSizeLimit, max_bytes=settings.upload_max_bytes)
+
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Continue the caller's trace (or start one) and time the request by route template."""
+    token = set_traceparent(request.headers.get("traceparent"))
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.labels(
+            request.method, route.path if route else "unmatched", str(response.status_code)
+        ).observe(time.perf_counter() - started)
+        response.headers["traceparent"] = current_traceparent()
+        return response
+    finally:
+        reset_traceparent(token)
+
+
+@app.exception_handler(HashingBusy)
+async def hashing_busy_handler(request, exc: HashingBusy):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+
 @app.on_event("startup")
 async def on_startup() -> None:
-    async with engine.begin() as conn:
+    async with get_engine().begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
 
 
+@app.on_event("shutdown")
+async def on_shutdown() -> None:
+    await hub.close()
+    await close_event_publisher()
+    await close_runner_client()
+    await dispose_engine()
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics() -> Response:
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 @app.post("/v1/auth/register", response_model=UserOut)
 async def register_user(payload: UserCreate, session: AsyncSession = Depends(get_session)):
     result = await session.execute(select(User).where(User.email == payload.email))
     if result.scalars().first():
         raise HTTPException(status_code=400, detail="Email already registered")
-    user = User(email=payload.email, password_hash=get_password_hash(payload.password))
+    user = User(email=payload.email, password_hash=await get_password_hash(payload.password))
     session.add(user)
     await session.commit()
     await session.refresh(user)
@@ -60,45 +196,281 @@ async def login(
 async def create_tool(
     payload: ToolCreate,
     session: AsyncSession = Depends(get_session),
-    user: User = Depends(get_current_user),
+    user: Principal = Depends(get_current_user),
 ):
     tool = Tool(name=payload.name, description=payload.description, owner_id=user.id)
     session.add(tool)
     await session.commit()
-    await session.refresh(tool, attribute_names=["versions", "runs"])
-    for version in tool.versions:
-        await session.refresh(version, attribute_names=["builds"])
+    await session.refresh(tool)
     return tool
 
 
-@app.get("/v1/tools/{tool_id}", response_model=ToolDetail)
-async def get_tool(tool_id: int, session: AsyncSession = Depends(get_session), user: User = Depends(get_current_user)):
-    result = await session.execute(select(Tool).where(Tool.id == tool_id, Tool.owner_id == user.id))
-    tool = result.scalars().first()
+async def _get_owned_tool(session: AsyncSession, tool_id: int, user_id: int) -> Tool:
+    tool = (await session.execute(select(Tool).where(Tool.id == tool_id, Tool.owner_id == user_id))).scalars().first()
     if not tool:
         raise HTTPException(status_code=404, detail="Tool not found")
-    await session.refresh(tool, attribute_names=["versions", "runs"])
-    for version in tool.versions:
-        await session.refresh(version, attribute_names=["builds"])
     return tool
 
 
+async def _page(session: AsyncSession, stmt, id_column, cursor: Optional[int], limit: int):
+    """Return one newest-first page of ``stmt`` and the cursor for the next page, if any."""
+    if cursor is not None:
+        stmt = stmt.where(id_column < cursor)
+    rows = (await session.execute(stmt.order_by(id_column.desc()).limit(limit + 1))).scalars().all()
+    next_cursor = rows[limit - 1].id if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def _versions_query(tool_id: int):
+    return select(ToolVersion).where(ToolVersion.tool_id == tool_id)
+
+
+def _builds_query(tool_id: int):
+    return (
+        select(ToolBuild)
+        .join(ToolVersion, ToolBuild.version_id == ToolVersion.id)
+        .where(ToolVersion.tool_id == tool_id)
+    )
+
+
+def _runs_query(tool_id: int):
+    return select(ToolRun).where(ToolRun.tool_id == tool_id).options(selectinload(ToolRun.replicas))
+
+
+async def _tool_etag(session: AsyncSession, tool_id: int, user_id: int, limit: int) -> Optional[str]:
+    """Cheap fingerprint of everything the detail view shows, from a single aggregate query."""
+    builds = _builds_query(tool_id).subquery()
+    row = (
+        await session.execute(
+            select(
+                Tool.name,
+                Tool.description,
+                Tool.status,
+                Tool.current_image_ref,
+                Tool.current_version_id,
+                Tool.min_replicas,
+                Tool.max_replicas,
+                Tool.resource_profile,
+                select(func.max(ToolVersion.id)).where(ToolVersion.tool_id == tool_id).scalar_subquery(),
+                select(func.count(builds.c.id)).scalar_subquery(),
+                select(func.max(builds.c.updated_at)).scalar_subquery(),
+                select(func.count(ToolRun.id)).where(ToolRun.tool_id == tool_id).scalar_subquery(),
+                select(func.max(ToolRun.updated_at)).where(ToolRun.tool_id == tool_id).scalar_subquery(),
+                select(func.max(ToolReplica.updated_at))
+                .join(ToolRun, ToolReplica.run_id == ToolRun.id)
+                .where(ToolRun.tool_id == tool_id)
+                .scalar_subquery(),
+            ).where(Tool.id == tool_id, Tool.owner_id == user_id)
+        )
+    ).first()
+    if row is None:
+        return None
+    return 'W/"' + hashlib.sha1(repr((tuple(row), limit)).encode("utf-8")).hexdigest() + '"'
+
+
+@app.get("/v1/tools/{tool_id}", response_model=ToolDetail)
+async def get_tool(
+    tool_id: int,
+    response: Response,
+    limit: int = Query(20, ge=1, le=100),
+    if_none_match: Optional[str] = Header(None),
+    session: AsyncSession = Depends(get_session),
+    user: Principal = Depends(get_current_user),
+):
+    etag = await _tool_etag(session, tool_id, user.id, limit)
+    if etag is None:
+        raise HTTPException(status_code=404, detail="Tool not found")
+    cache_headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if if_none_match and etag in {tag.strip() for tag in if_none_match.split(",")}:
+        return Response(status_code=304, headers=cache_headers)
+    tool = await _get_owned_tool(session, tool_id, user.id)
+    versions, next_versions_cursor = await _page(session, _versions_query(tool_id), ToolVersion.id, None, limit)
+    builds, next_builds_cursor = await _page(session, _builds_query(tool_id), ToolBuild.id, None, limit)
+    runs, next_runs_cursor = await _page(session, _runs_query(tool_id), ToolRun.id, None, limit)
+    response.headers.update(cache_headers)
+    return ToolDetail(
+        **ToolOut.from_orm(tool).dict(),
+        versions=versions,
+        builds=builds,
+        runs=runs,
+        next_versions_cursor=next_versions_cursor,
+        next_builds_cursor=next_builds_cursor,
+        next_runs_cursor=next_runs_cursor,
+    )
+
+
+@app.get("/v1/tools/{tool_id}/events")
+async def tool_events(
+    tool_id: int,
+    session: AsyncSession = Depends(get_session),
+    user: Principal = Depends(get_current_user),
+):
+    """Server-sent build and run status changes for one tool, in place of polling the detail view.
+
+    Each event carries the new statuses; a ``resync`` event (sent first and
+    after any gap) means the client should fetch the tool again.
+    """
+    await _get_owned_tool(session, tool_id, user.id)
+    # The stream can stay open for hours; don't hold a pooled connection for it.
+    await session.close()
+    return StreamingResponse(
+        follow_tool_events(tool_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/v1/tools/{tool_id}/versions", response_model=VersionPage)
+async def list_versions(
+    tool_id: int,
+    cursor: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100),
+    session: AsyncSession = Depends(get_session),
+    user: Principal = Depends(get_current_user),
+):
+    await _get_owned_tool(session, tool_id, user.id)
+    items, next_cursor = await _page(session, _versions_query(tool_id), ToolVersion.id, cursor, limit)
+    return VersionPage(items=items, next_cursor=next_cursor)
+
+
+@app.get("/v1/tools/{tool_id}/builds", response_model=BuildPage)
+async def list_builds(
+    tool_id: int,
+    cursor: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100),
+    session: AsyncSession = Depends(get_session),
+    user: Principal = Depends(get_current_user),
+):
+    await _get_owned_tool(session, tool_id, user.id)
+    items, next_cursor = await _page(session, _builds_query(tool_id), ToolBuild.id, cursor, limit)
+    return BuildPage(items=items, next_cursor=next_cursor)
+
+
+@app.get("/v1/tools/{tool_id}/runs", response_model=RunPage)
+async def list_runs(
+    tool_id: int,
+    cursor: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100),
+    session: AsyncSession = Depends(get_session),
+    user: Principal = Depends(get_current_user),
+):
+    await _get_owned_tool(session, tool_id, user.id)
+    items, next_cursor = await _page(session, _runs_query(tool_id), ToolRun.id, cursor, limit)
+    return RunPage(items=items, next_cursor=next_cursor)
+
+
+@app.get("/v1/tools/{tool_id}/runs/{run_id}/logs")
+async def get_run_logs(
+    tool_id: int,
+    run_id: int,
+    tail: Optional[int] = Query(None, ge=1, le=10000),
+    follow: bool = False,
+    last_event_id: Optional[str] = Header(None),
+    session: AsyncSession = Depends(get_session),
+    user: Principal = Depends(get_current_user),
+):
+    """The run's lifecycle messages and runtime output; ``tail`` limits live output, ``follow`` streams it as SSE."""
+    result = await session.execute(
+        select(ToolRun)
+        .join(Tool, ToolRun.tool_id == Tool.id)
+        .where(ToolRun.id == run_id, Tool.id == tool_id, Tool.owner_id == user.id)
+        .options(undefer(ToolRun.logs))
+    )
+    run = result.scalars().first()
+    if run is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+    runner_url = await node_url(session, run.node_id)
+    # The response streams for as long as the run does; don't hold a pooled connection for it.
+    await session.close()
+    if follow:
+        after = int(last_event_id) if last_event_id and last_event_id.isdigit() else 0
+        return StreamingResponse(
+            follow_run_log_events(run, runner_url, after),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+    return StreamingResponse(stream_run_log_text(run, runner_url, tail), media_type="text/plain")
+
+
+@app.get("/v1/tools/{tool_id}/builds/{build_id}/logs")
+async def get_build_logs(
+    tool_id: int,
+    build_id: int,
+    follow: bool = False,
+    last_event_id: Optional[str] = Header(None),
+    session: AsyncSession = Depends(get_session),
+    user: Principal = Depends(get_current_user),
+):
+    result = await session.execute(
+        select(ToolBuild.id)
+        .join(ToolVersion, ToolBuild.version_id == ToolVersion.id)
+        .join(Tool, ToolVersion.tool_id == Tool.id)
+        .where(ToolBuild.id == build_id, Tool.id == tool_id, Tool.owner_id == user.id)
+    )
+    if result.scalar() is None:
+        raise HTTPException(status_code=404, detail="Build not found")
+    if follow:
+        after_seq = int(last_event_id) if last_event_id and last_event_id.isdigit() else 0
+        return StreamingResponse(
+            follow_log_events(build_id, after_seq),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+    return StreamingResponse(stream_log_text(build_id), media_type="text/plain")
+
+
+@app.post("/v1/tools/{tool_id}/builds/{build_id}/cancel")
+async def cancel_build(
+    tool_id: int,
+    build_id: int,
+    session: AsyncSession = Depends(get_session),
+    user: Principal = Depends(get_current_user),
+):
+    result = await session.execute(
+        select(ToolBuild)
+        .join(ToolVersion, ToolBuild.version_id == ToolVersion.id)
+        .join(Tool, ToolVersion.tool_id == Tool.id)
+        .where(ToolBuild.id == build_id, Tool.id == tool_id, Tool.owner_id == user.id)
+    )
+    build = result.scalars().first()
+    if not build:
+        raise HTTPException(status_code=404, detail="Build not found")
+    if build.status not in (BuildStatus.PENDING, BuildStatus.RUNNING) or not build.runner_job_id:
+        raise HTTPException(status_code=400, detail="Build is not running")
+    try:
+        await cancel_job(build.runner_job_id, runner_url=await node_url(session, build.node_id))
+    except RunnerUnavailable as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+    return {"status": "cancelling"}
+
+
 @app.post("/v1/tools/{tool_id}/versions")
 async def upload_version(
     tool_id: int,
     file: UploadFile = File(...),
     session: AsyncSession = Depends(get_session),
-    user: User = Depends(get_current_user),
+    user: Principal = Depends(get_current_user),
 ):
     tool = await session.get(Tool, tool_id)
     if not tool or tool.owner_id != user.id:
         raise HTTPException(status_code=404, detail="Tool not found")
     try:
-        contents = await file.read()
-        app_py, requirements_txt = load_version_payload(file.filename, contents)
+        payload = await run_in_threadpool(load_version_payload, file.filename, file.file, archive_limits)
     except PackagingError as exc:
         raise HTTPException(status_code=400, detail=str(exc))
-    version = ToolVersion(tool_id=tool_id, app_py=app_py, requirements_txt=requirements_txt)
+    try:
+        app_digest = await run_in_threadpool(blob_store.put_bytes, payload.app_py.encode("utf-8"))
+        requirements_digest = await run_in_threadpool(blob_store.put_bytes, payload.requirements_txt.encode("utf-8"))
+        bundle_digest = await run_in_threadpool(blob_store.put_file, payload.bundle) if payload.bundle else None
+    finally:
+        payload.cleanup()
+    version = ToolVersion(
+        tool_id=tool_id,
+        app_digest=app_digest,
+        requirements_digest=requirements_digest,
+        bundle_digest=bundle_digest,
+        metadata_={"files": payload.files},
+    )
     session.add(version)
     await session.commit()
     await session.refresh(version)
@@ -110,7 +482,7 @@ async def build_tool(
     tool_id: int,
     payload: BuildRequest,
     session: AsyncSession = Depends(get_session),
-    user: User = Depends(get_current_user),
+    user: Principal = Depends(get_current_user),
 ):
     tool = await session.get(Tool, tool_id)
     if not tool or tool.owner_id != user.id:
@@ -123,7 +495,10 @@ async def build_tool(
         raise HTTPException(status_code=400, detail="Invalid version")
     tool.status = ToolStatus.BUILDING
     await session.commit()
-    execute_build.delay(tool_id, version_id, version.app_py, version.requirements_txt)
+    execute_build.delay(
+        tool_id, version_id, version.app_digest, version.requirements_digest, bundle_digest=version.bundle_digest
+    )
+    await publish_tool_event(tool_id, "build", status="queued", tool_status=tool.status.value)
     return {"status": "queued"}
 
 
@@ -131,7 +506,7 @@ async def build_tool(
 async def run_tool(
     tool_id: int,
     session: AsyncSession = Depends(get_session),
-    user: User = Depends(get_current_user),
+    user: Principal = Depends(get_current_user),
 ):
     tool = await session.get(Tool, tool_id)
     if not tool or tool.owner_id != user.id:
@@ -149,14 +524,207 @@ async def run_tool(
     return {"status": "starting"}
 
 
+@app.put("/v1/tools/{tool_id}/scaling", response_model=ToolOut)
+async def update_scaling(
+    tool_id: int,
+    payload: ToolScaling,
+    session: AsyncSession = Depends(get_session),
+    user: Principal = Depends(get_current_user),
+):
+    tool = await _get_owned_tool(session, tool_id, user.id)
+    tool.min_replicas = payload.min_replicas
+    tool.max_replicas = payload.max_replicas
+    await session.commit()
+    if tool.status in (ToolStatus.RUNNING, ToolStatus.HIBERNATED):
+        # Saved bounds apply on the next start regardless; a live deployment is resized now.
+        run = await _latest_run(session, tool_id)
+        try:
+            await scale_tool(
+                tool_id,
+                payload.min_replicas,
+                payload.max_replicas,
+                runner_url=await node_url(session, run.node_id if run else None),
+            )
+        except RunnerUnavailable as exc:
+            raise HTTPException(status_code=503, detail=str(exc))
+    return tool
+
+
+@app.put("/v1/tools/{tool_id}/resources", response_model=ToolOut)
+async def update_resources(
+    tool_id: int,
+    payload: ToolResources,
+    session: AsyncSession = Depends(get_session),
+    user: Principal = Depends(get_current_user),
+):
+    """Choose the tool's resource profile; it applies from the next start."""
+    tool = await _get_owned_tool(session, tool_id, user.id)
+    tool.resource_profile = payload.resource_profile
+    await session.commit()
+    return tool
+
+
+@app.get("/v1/tools/{tool_id}/usage", response_model=ToolUsage)
+async def get_usage(
+    tool_id: int,
+    session: AsyncSession = Depends(get_session),
+    user: Principal = Depends(get_current_user),
+):
+    """Live per-replica usage against the tool's profile, from the nodes' latest heartbeats."""
+    tool = await _get_owned_tool(session, tool_id, user.id)
+    nodes = (
+        await session.execute(select(RunnerNode).where(RunnerNode.last_heartbeat >= heartbeat_cutoff()))
+    ).scalars().all()
+    replicas = [
+        ReplicaUsage(node=node.name, **sample)
+        for node in nodes
+        for sample in node.usage or []
+        if sample.get("tool_id") == tool_id
+    ]
+    return ToolUsage(
+        resource_profile=tool.resource_profile, **profile_for(tool.resource_profile).as_dict(), replicas=replicas
+    )
+
+
 @app.post("/v1/tools/{tool_id}/stop")
 async def stop_tool(
     tool_id: int,
     session: AsyncSession = Depends(get_session),
-    user: User = Depends(get_current_user),
+    user: Principal = Depends(get_current_user),
 ):
     tool = await session.get(Tool, tool_id)
     if not tool or tool.owner_id != user.id:
         raise HTTPException(status_code=404, detail="Tool not found")
     execute_stop.delay(tool_id)
     return {"status": "stopping"}
+
+
+@app.get("/internal/blobs/{digest}", dependencies=[Depends(verify_internal_token)])
+async def get_blob(digest: str):
+    try:
+        path = blob_store.path_for(digest)
+    except BlobNotFound:
+        raise HTTPException(status_code=404, detail="Blob not found")
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="Blob not found")
+    return FileResponse(path, media_type="application/zlib")
+
+
+async def _latest_run(session: AsyncSession, tool_id: int) -> Optional[ToolRun]:
+    stmt = _runs_query(tool_id).order_by(ToolRun.id.desc()).limit(1)
+    return (await session.execute(stmt)).scalars().first()
+
+
+RUN_STATE_TOOL_STATUS = {
+    RunStatus.RUNNING: ToolStatus.RUNNING,
+    RunStatus.HIBERNATED: ToolStatus.HIBERNATED,
+    RunStatus.STOPPED: ToolStatus.IDLE,
+    RunStatus.FAILED: ToolStatus.ERROR,
+}
+
+
+@app.post("/internal/tools/{tool_id}/state", dependencies=[Depends(verify_internal_token)])
+async def report_tool_state(tool_id: int, payload: ToolStateReport, session: AsyncSession = Depends(get_session)):
+    tool = await session.get(Tool, tool_id)
+    if not tool:
+        raise HTTPException(status_code=404, detail="Tool not found")
+    run = await _latest_run(session, tool_id)
+    active = run is not None and run.status not in (RunStatus.STOPPED, RunStatus.FAILED)
+    if payload.replica is not None:
+        # One replica changed (e.g. it crashed); the run only follows once none are left serving.
+        if not active:
+            return {"status": "ignored"}
+        for replica in run.replicas:
+            if replica.replica == payload.replica:
+                replica.status = payload.state
+        if payload.reason:
+            await session.refresh(run, ["logs"])
+            run.logs = "\n".join(filter(None, [run.logs, payload.reason]))
+        if any(replica.status == RunStatus.RUNNING for replica in run.replicas):
+            await session.commit()
+            await publish_tool_event(tool_id, "run", id=run.id, status=run.status.value, tool_status=tool.status.value)
+            return {"status": "ok"}
+        run.status = payload.state
+    elif active:
+        run.status = payload.state
+        if payload.container_id:
+            run.container_id = payload.container_id
+        for replica in run.replicas:
+            if replica.status not in (RunStatus.STOPPED, RunStatus.FAILED):
+                replica.status = payload.state
+    if payload.state in RUN_STATE_TOOL_STATUS and tool.status != ToolStatus.BUILDING:
+        tool.status = RUN_STATE_TOOL_STATUS[payload.state]
+    await session.commit()
+    if active and run.status == RunStatus.FAILED:
+        # Keep what the crashed app printed before the runner's buffer is reused.
+        archive_run_output.delay(run.id)
+    if active:
+        await publish_tool_event(tool_id, "run", id=run.id, status=run.status.value, tool_status=tool.status.value)
+    else:
+        await publish_tool_event(tool_id, "tool", tool_status=tool.status.value)
+    return {"status": "ok"}
+
+
+@app.post("/internal/tools/{tool_id}/replicas", dependencies=[Depends(verify_internal_token)])
+async def report_replicas(tool_id: int, payload: ReplicaReport, session: AsyncSession = Depends(get_session)):
+    """Sync the latest run's replicas with what the runner reports after scaling."""
+    run = await _latest_run(session, tool_id)
+    if not run or run.status in (RunStatus.STOPPED, RunStatus.FAILED):
+        raise HTTPException(status_code=404, detail="No active run")
+    reported = {state.replica: state for state in payload.replicas}
+    for replica in run.replicas:
+        state = reported.pop(replica.replica, None)
+        if state is None:
+            if replica.status != RunStatus.FAILED:
+                replica.status = RunStatus.STOPPED
+        else:
+            replica.status = RunStatus.RUNNING
+            replica.container_id = state.container_id
+    for state in reported.values():
+        run.replicas.append(ToolReplica(replica=state.replica, container_id=state.container_id))
+    await session.commit()
+    await publish_tool_event(tool_id, "replicas", id=run.id)
+    return {"status": "ok"}
+
+
+@app.post("/internal/nodes/heartbeat", dependencies=[Depends(verify_internal_token)])
+async def node_heartbeat(payload: NodeHeartbeat, session: AsyncSession = Depends(get_session)):
+    """Register or refresh a runner node; the reply tells the node whether it is draining."""
+    node = (await session.execute(select(RunnerNode).where(RunnerNode.name == payload.name))).scalars().first()
+    if node is None:
+        node = RunnerNode(name=payload.name)
+        session.add(node)
+    for field, value in payload.dict().items():
+        setattr(node, field, value)
+    node.last_heartbeat = datetime.utcnow()
+    if node.status in (None, NodeStatus.OFFLINE):
+        node.status = NodeStatus.ACTIVE
+    await session.commit()
+    return {"id": node.id, "status": node.status.value}
+
+
+@app.get("/internal/nodes", response_model=List[NodeOut], dependencies=[Depends(verify_internal_token)])
+async def list_nodes(session: AsyncSession = Depends(get_session)):
+    return (await session.execute(select(RunnerNode).order_by(RunnerNode.name))).scalars().all()
+
+
+@app.post("/internal/nodes/{node_id}/drain", response_model=NodeOut, dependencies=[Depends(verify_internal_token)])
+async def drain_node(node_id: int, session: AsyncSession = Depends(get_session)):
+    """Stop placing work on a node and move its running tools elsewhere."""
+    node = await session.get(RunnerNode, node_id)
+    if not node:
+        raise HTTPException(status_code=404, detail="Node not found")
+    node.status = NodeStatus.DRAINING
+    await session.commit()
+    reschedule_node.delay(node_id)
+    return node
+
+
+@app.post("/internal/nodes/{node_id}/activate", response_model=NodeOut, dependencies=[Depends(verify_internal_token)])
+async def activate_node(node_id: int, session: AsyncSession = Depends(get_session)):
+    node = await session.get(RunnerNode, node_id)
+    if not node:
+        raise HTTPException(status_code=404, detail="Node not found")
+    node.status = NodeStatus.ACTIVE
+    await session.commit()
+    return node
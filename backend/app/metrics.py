@@ -0,0 +1,46 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+PASSWORD_HASH_SECONDS = Histogram(
+    "sheetify_password_hash_seconds",
+    "Time spent hashing or verifying a password, including queue wait.",
+    ["operation"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+PASSWORD_HASH_QUEUE_DEPTH = Gauge(
+    "sheetify_password_hash_queue_depth",
+    "Password hash operations submitted to the hashing pool and not yet finished.",
+)
+PASSWORD_HASH_REJECTED = Counter(
+    "sheetify_password_hash_rejected_total",
+    "Password hash operations rejected because the hashing queue was full.",
+)
+PASSWORD_REHASHED = Counter(
+    "sheetify_password_rehashed_total",
+    "Password hashes upgraded on login after the work factor changed.",
+)
+TOOL_EVENT_SUBSCRIBERS = Gauge(
+    "sheetify_tool_event_subscribers",
+    "Clients following tool status events on this API process.",
+)
+TOOL_EVENTS_DELIVERED = Counter(
+    "sheetify_tool_events_delivered_total",
+    "Tool status events handed to subscribed clients.",
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "sheetify_http_request_seconds",
+    "API request latency until the response starts, by route template.",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+CELERY_QUEUE_SECONDS = Histogram(
+    "sheetify_celery_queue_seconds",
+    "Time a Celery task waited between being published and starting.",
+    ["task"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300),
+)
+PHASE_SECONDS = Histogram(
+    "sheetify_phase_seconds",
+    "Time spent in each phase of a build or run, from queueing to a live app.",
+    ["operation", "phase"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600),
+)
@@ -1,9 +1,9 @@
 import enum
 from datetime import datetime
 from typing import Optional
-from sqlalchemy import Column, DateTime, Enum, ForeignKey, Integer, String, Text
+from sqlalchemy import BigInteger, Column, DateTime, Enum, Float, ForeignKey, Integer, String, Text, UniqueConstraint
 from sqlalchemy.dialects.postgresql import JSONB
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import deferred, relationship
 
 from .database import Base
 
@@ -12,9 +12,37 @@ class ToolStatus(enum.Enum):
     IDLE = "idle"
     BUILDING = "building"
     RUNNING = "running"
+    HIBERNATED = "hibernated"
     ERROR = "error"
 
 
+class NodeStatus(enum.Enum):
+    ACTIVE = "active"
+    DRAINING = "draining"
+    OFFLINE = "offline"
+
+
+class RunnerNode(Base):
+    __tablename__ = "runner_nodes"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(255), unique=True, nullable=False)
+    url = Column(String(512), nullable=False)
+    # Base URL of the node's own Traefik; None when its tools are served by the main public proxy.
+    tool_url = Column(String(512))
+    status = Column(Enum(NodeStatus), default=NodeStatus.ACTIVE, nullable=False)
+    cpu_total = Column(Float, default=0, nullable=False)
+    cpu_free = Column(Float, default=0, nullable=False)
+    memory_total = Column(BigInteger, default=0, nullable=False)
+    memory_free = Column(BigInteger, default=0, nullable=False)
+    running_tools = Column(JSONB, default=list, nullable=False)
+    images = Column(JSONB, default=list, nullable=False)
+    requirements_digests = Column(JSONB, default=list, nullable=False)
+    usage = Column(JSONB, default=list, nullable=False)
+    last_heartbeat = Column(DateTime, default=datetime.utcnow, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -23,7 +51,7 @@ class User(Base):
     password_hash = Column(String(255), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
-    tools = relationship("Tool", back_populates="owner", lazy="selectin")
+    tools = relationship("Tool", back_populates="owner", lazy="raise")
 
 
 class Tool(Base):
@@ -35,11 +63,23 @@ class Tool(Base):
     owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     status = Column(Enum(ToolStatus), default=ToolStatus.IDLE, nullable=False)
     current_image_ref = Column(String(512), nullable=True)
-    current_version_id = Column(Integer, ForeignKey("tool_versions.id"), nullable=True)
-
-    owner = relationship("User", back_populates="tools", lazy="joined")
-    versions = relationship("ToolVersion", back_populates="tool", cascade="all, delete", lazy="selectin")
-    runs = relationship("ToolRun", back_populates="tool", cascade="all, delete", lazy="selectin")
+    # tool_versions also points back here, so this side of the cycle is added after both tables exist.
+    current_version_id = Column(
+        Integer, ForeignKey("tool_versions.id", use_alter=True, name="fk_tools_current_version_id"), nullable=True
+    )
+    min_replicas = Column(Integer, default=1, nullable=False)
+    max_replicas = Column(Integer, default=1, nullable=False)
+    resource_profile = Column(String(32), default="standard", nullable=False)
+
+    owner = relationship("User", back_populates="tools", lazy="raise")
+    versions = relationship(
+        "ToolVersion",
+        back_populates="tool",
+        cascade="all, delete",
+        lazy="raise",
+        foreign_keys="ToolVersion.tool_id",
+    )
+    runs = relationship("ToolRun", back_populates="tool", cascade="all, delete", lazy="raise")
 
 
 class ToolVersion(Base):
@@ -47,13 +87,34 @@ class ToolVersion(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     tool_id = Column(Integer, ForeignKey("tools.id"), nullable=False)
-    app_py = Column(Text, nullable=False)
-    requirements_txt = Column(Text, nullable=False)
+    app_digest = Column(String(64), nullable=False)
+    requirements_digest = Column(String(64), nullable=False)
+    # Tar of the complete app directory, for uploads with more files than app.py and requirements.txt.
+    bundle_digest = Column(String(64), nullable=True)
+    # Fully pinned requirements; builds use this instead of requirements_digest once it is resolved.
+    lock_digest = Column(String(64), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
-    metadata = Column(JSONB, nullable=True)
+    metadata_ = Column("metadata", JSONB, nullable=True)
+
+    tool = relationship("Tool", back_populates="versions", lazy="raise", foreign_keys="ToolVersion.tool_id")
+    builds = relationship("ToolBuild", back_populates="version", cascade="all, delete", lazy="raise")
 
-    tool = relationship("Tool", back_populates="versions", lazy="joined")
-    builds = relationship("ToolBuild", back_populates="version", cascade="all, delete", lazy="selectin")
+
+class DependencyLock(Base):
+    """A resolved lockfile, memoised by the digest of the requirements it pins.
+
+    Versions with identical requirements share one lock, so their builds share
+    dependency layers across tools.
+    """
+
+    __tablename__ = "dependency_locks"
+
+    id = Column(Integer, primary_key=True)
+    requirements_digest = Column(String(64), nullable=False, unique=True)
+    lock_digest = Column(String(64), nullable=False)
+    packages = Column(Integer, nullable=False)
+    environment = Column(JSONB, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
 
 class BuildStatus(enum.Enum):
@@ -69,17 +130,36 @@ class ToolBuild(Base):
     id = Column(Integer, primary_key=True)
     version_id = Column(Integer, ForeignKey("tool_versions.id"), nullable=False)
     status = Column(Enum(BuildStatus), default=BuildStatus.PENDING, nullable=False)
-    logs = Column(Text, nullable=True)
+    logs = deferred(Column(Text, nullable=True))
     image_ref = Column(String(512), nullable=True)
+    cache_status = Column(String(16), nullable=True)
+    runner_job_id = Column(String(64), nullable=True)
+    node_id = Column(Integer, ForeignKey("runner_nodes.id"), nullable=True)
+    # W3C trace ID shared by the API request, Celery task and runner calls behind this build.
+    trace_id = Column(String(32), nullable=True)
+    # Seconds per phase, e.g. {"queue": 0.4, "lock": 2.1, "deps_image": 41.0, "total": 55.2}.
+    phase_timings = Column(JSONB, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
-    version = relationship("ToolVersion", back_populates="builds")
+    version = relationship("ToolVersion", back_populates="builds", lazy="raise")
+
+
+class BuildLogChunk(Base):
+    __tablename__ = "build_log_chunks"
+    __table_args__ = (UniqueConstraint("build_id", "seq"),)
+
+    id = Column(Integer, primary_key=True)
+    build_id = Column(Integer, ForeignKey("tool_builds.id", ondelete="CASCADE"), nullable=False)
+    seq = Column(Integer, nullable=False)
+    content = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
 
 
 class RunStatus(enum.Enum):
     STARTING = "starting"
     RUNNING = "running"
+    HIBERNATED = "hibernated"
     STOPPED = "stopped"
     FAILED = "failed"
 
@@ -93,8 +173,55 @@ class ToolRun(Base):
     status = Column(Enum(RunStatus), default=RunStatus.STARTING, nullable=False)
     container_id = Column(String(255), nullable=True)
     url = Column(String(512), nullable=True)
-    logs = Column(Text, nullable=True)
+    node_id = Column(Integer, ForeignKey("runner_nodes.id"), nullable=True)
+    # Seconds from asking the runner to start the tool until every replica passed its health check.
+    ready_seconds = Column(Float, nullable=True)
+    trace_id = Column(String(32), nullable=True)
+    # Seconds per phase, e.g. {"queue": 0.1, "placement": 0.02, "start": 0.8, "boot": 3.9, "total": 5.1}.
+    phase_timings = Column(JSONB, nullable=True)
+    logs = deferred(Column(Text, nullable=True))
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    tool = relationship("Tool", back_populates="runs", lazy="raise")
+    replicas = relationship(
+        "ToolReplica",
+        back_populates="run",
+        cascade="all, delete-orphan",
+        order_by="ToolReplica.replica",
+        lazy="raise",
+    )
+
+
+class RunLogSegment(Base):
+    """An archived stretch of a run's runtime output, stored compressed in the blob store."""
+
+    __tablename__ = "run_log_segments"
+    __table_args__ = (UniqueConstraint("run_id", "seq"),)
+
+    id = Column(Integer, primary_key=True)
+    run_id = Column(Integer, ForeignKey("tool_runs.id", ondelete="CASCADE"), nullable=False)
+    seq = Column(Integer, nullable=False)
+    digest = Column(String(64), nullable=False)
+    # Runner line numbers covered by the segment, so archiving can resume after the last one.
+    first_line = Column(Integer, nullable=False)
+    last_line = Column(Integer, nullable=False)
+    size_bytes = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ToolReplica(Base):
+    __tablename__ = "tool_replicas"
+    __table_args__ = (UniqueConstraint("run_id", "replica"),)
+
+    id = Column(Integer, primary_key=True)
+    run_id = Column(Integer, ForeignKey("tool_runs.id", ondelete="CASCADE"), nullable=False)
+    replica = Column(Integer, nullable=False)
+    container_id = Column(String(255), nullable=True)
+    status = Column(Enum(RunStatus), default=RunStatus.RUNNING, nullable=False)
+    start_mode = Column(String(16), nullable=True)
+    startup_seconds = Column(Float, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
-    tool = relationship("Tool", back_populates="runs", lazy="joined")
+    run = relationship("ToolRun", back_populates="replicas", lazy="raise")
@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from .config import get_settings
+from .models import NodeStatus, RunnerNode
+from .profiles import DEFAULT_PROFILE, ResourceProfile, profile_for
+from .runner import RunnerUnavailable
+
+settings = get_settings()
+
+MB = 1024 * 1024
+
+
+def heartbeat_cutoff() -> datetime:
+    return datetime.utcnow() - timedelta(seconds=settings.node_heartbeat_timeout_seconds)
+
+
+def score_node(
+    node: RunnerNode,
+    profile: ResourceProfile,
+    replicas: int,
+    image_ref: Optional[str],
+    requirements_digest: Optional[str],
+) -> float:
+    """Higher is better: how well the request packs onto the node, plus a bonus for cached layers.
+
+    ``binpack`` prefers the node left with the least free capacity after
+    placement, so busy nodes fill up and whole nodes stay free for large
+    tools; ``spread`` prefers the node left with the most. A node that already
+    holds the image starts the tool without building; one holding the
+    dependency layers only has to add the app layer.
+    """
+    cpu_left = (node.cpu_free - profile.cpus * replicas) / max(node.cpu_total, 1)
+    memory_left = (node.memory_free - profile.memory_mb * MB * replicas) / max(node.memory_total, 1)
+    headroom = cpu_left + memory_left
+    score = -headroom if settings.placement_strategy == "binpack" else headroom
+    if image_ref and image_ref in (node.images or []):
+        score += settings.placement_image_weight
+    elif requirements_digest and requirements_digest in (node.requirements_digests or []):
+        score += settings.placement_deps_weight
+    return score
+
+
+async def choose_node(
+    session: AsyncSession,
+    image_ref: Optional[str] = None,
+    requirements_digest: Optional[str] = None,
+    profile: Optional[ResourceProfile] = None,
+    replicas: int = 1,
+    exclude: Iterable[int] = (),
+) -> Optional[RunnerNode]:
+    """Pick the live, active node best placed to build or run, or ``None`` if no nodes are registered.
+
+    Only nodes with room for ``replicas`` replicas of ``profile`` qualify.
+    With no registry the backend keeps talking to ``settings.runner_url``;
+    once nodes exist, having none with room raises ``RunnerUnavailable``.
+    """
+    registered = (await session.execute(select(func.count(RunnerNode.id)))).scalar_one()
+    if not registered:
+        return None
+    profile = profile or profile_for(DEFAULT_PROFILE)
+    stmt = select(RunnerNode).where(
+        RunnerNode.status == NodeStatus.ACTIVE,
+        RunnerNode.last_heartbeat >= heartbeat_cutoff(),
+        RunnerNode.cpu_free >= profile.cpus * replicas,
+        RunnerNode.memory_free >= profile.memory_mb * MB * replicas,
+    )
+    excluded = list(exclude)
+    if excluded:
+        stmt = stmt.where(RunnerNode.id.notin_(excluded))
+    nodes = (await session.execute(stmt)).scalars().all()
+    if not nodes:
+        raise RunnerUnavailable(
+            f"No runner node has room for {replicas} x {profile.cpus} CPUs / {profile.memory_mb} MB"
+        )
+    return max(nodes, key=lambda node: score_node(node, profile, replicas, image_ref, requirements_digest))
+
+
+async def node_url(session: AsyncSession, node_id: Optional[int]) -> str:
+    """Base URL of the runner that owns a build or run; the default runner for rows without a node."""
+    if node_id is None:
+        return settings.runner_url
+    node = await session.get(RunnerNode, node_id)
+    return node.url if node else settings.runner_url
@@ -0,0 +1,27 @@
+from dataclasses import asdict, dataclass
+from typing import Dict
+
+
+@dataclass(frozen=True)
+class ResourceProfile:
+    """Per-replica limits the runner applies to a tool's containers."""
+
+    cpus: float
+    memory_mb: int
+    pids: int
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+RESOURCE_PROFILES: Dict[str, ResourceProfile] = {
+    "small": ResourceProfile(cpus=0.5, memory_mb=512, pids=128),
+    "standard": ResourceProfile(cpus=1.0, memory_mb=1024, pids=256),
+    "large": ResourceProfile(cpus=2.0, memory_mb=4096, pids=512),
+    "xlarge": ResourceProfile(cpus=4.0, memory_mb=8192, pids=1024),
+}
+DEFAULT_PROFILE = "standard"
+
+
+def profile_for(name: str) -> ResourceProfile:
+    return RESOURCE_PROFILES.get(name, RESOURCE_PROFILES[DEFAULT_PROFILE])
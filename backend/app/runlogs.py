@@ -0,0 +1,105 @@
+import asyncio
+import json
+from typing import AsyncIterator, List, Optional
+
+import httpx
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from .blobstore import blob_store
+from .config import get_settings
+from .database import AsyncSessionLocal
+from .models import RunLogSegment, RunStatus, ToolRun
+from .runner import RunnerError, fetch_tool_logs, follow_tool_logs
+
+settings = get_settings()
+
+ACTIVE_RUN_STATUSES = {RunStatus.STARTING, RunStatus.RUNNING, RunStatus.HIBERNATED}
+
+
+def format_line(line: dict) -> str:
+    return f"[replica {line['replica']}] {line['text']}"
+
+
+def _dropped_note(buffered: dict, after: int) -> List[str]:
+    dropped = buffered["first_seq"] - after - 1
+    return [f"... {dropped} earlier line(s) were dropped from the runner's buffer"] if dropped > 0 else []
+
+
+async def archive_run_logs(session: AsyncSession, run: ToolRun, runner_url: Optional[str] = None) -> int:
+    """Move the run's buffered output from its runner into compressed ``RunLogSegment`` blobs.
+
+    Resumes after the last line already archived, so it is safe to repeat.
+    Returns the number of lines archived.
+    """
+    last_line, last_seq = (
+        await session.execute(
+            select(func.max(RunLogSegment.last_line), func.max(RunLogSegment.seq)).where(RunLogSegment.run_id == run.id)
+        )
+    ).one()
+    after, seq = last_line or 0, last_seq or 0
+    buffered = await fetch_tool_logs(run.tool_id, after=after, runner_url=runner_url)
+    if not buffered or not buffered["lines"]:
+        return 0
+    segment: List[str] = _dropped_note(buffered, after)
+    first_line, size = buffered["lines"][0]["seq"], 0
+    for index, line in enumerate(buffered["lines"]):
+        text = format_line(line)
+        segment.append(text)
+        size += len(text) + 1
+        if size >= settings.run_log_segment_bytes or index + 1 == len(buffered["lines"]):
+            data = ("\n".join(segment) + "\n").encode("utf-8")
+            seq += 1
+            session.add(
+                RunLogSegment(
+                    run_id=run.id,
+                    seq=seq,
+                    digest=await asyncio.to_thread(blob_store.put_bytes, data),
+                    first_line=first_line,
+                    last_line=line["seq"],
+                    size_bytes=len(data),
+                )
+            )
+            segment, first_line, size = [], line["seq"] + 1, 0
+    await session.commit()
+    return len(buffered["lines"])
+
+
+async def stream_run_log_text(
+    run: ToolRun, runner_url: Optional[str] = None, tail: Optional[int] = None
+) -> AsyncIterator[str]:
+    """The run's lifecycle messages, then its output: archived segments, or the runner's buffer while it runs."""
+    if run.logs:
+        yield run.logs + "\n"
+    async with AsyncSessionLocal() as session:
+        digests = (
+            await session.execute(
+                select(RunLogSegment.digest).where(RunLogSegment.run_id == run.id).order_by(RunLogSegment.seq)
+            )
+        ).scalars().all()
+    for digest in digests:
+        yield await asyncio.to_thread(blob_store.read_text, digest)
+    if digests or run.status not in ACTIVE_RUN_STATUSES:
+        return
+    try:
+        buffered = await fetch_tool_logs(run.tool_id, tail=tail or settings.run_log_tail_lines, runner_url=runner_url)
+    except (RunnerError, httpx.HTTPError) as exc:
+        yield f"Live output unavailable: {exc}\n"
+        return
+    for line in buffered["lines"] if buffered else []:
+        yield format_line(line) + "\n"
+
+
+async def follow_run_log_events(run: ToolRun, runner_url: Optional[str] = None, after: int = 0) -> AsyncIterator[str]:
+    """Server-sent events for a live run's output, ending once the tool stops."""
+    if run.status in ACTIVE_RUN_STATUSES:
+        try:
+            async for line in follow_tool_logs(run.tool_id, after, runner_url=runner_url):
+                if "seq" in line:
+                    event = {"seq": line["seq"], "text": format_line(line)}
+                    yield f"id: {line['seq']}\ndata: {json.dumps(event)}\n\n"
+        except (RunnerError, httpx.HTTPError):
+            # The client reconnects with Last-Event-ID and resumes where it left off.
+            return
+    yield f"event: end\ndata: {json.dumps({'status': run.status.value})}\n\n"
@@ -1,45 +1,343 @@
-from typing import Optional
+import asyncio
+import json
+import os
+import random
+import time
+from typing import AsyncIterator, Optional
 
 import httpx
 
 from .config import get_settings
+from .tracing import child_traceparent
 
 settings = get_settings()
 
 
-async def trigger_build(tool_id: int, version_id: int, app_py: str, requirements_txt: str) -> dict:
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(
-            f"{settings.runner_url}/build",
-            json={
-                "tool_id": tool_id,
-                "version_id": version_id,
-                "app_py": app_py,
-                "requirements_txt": requirements_txt,
-            },
-            timeout=60,
+class RunnerError(Exception):
+    pass
+
+
+class RunnerUnavailable(RunnerError):
+    pass
+
+
+class CircuitBreaker:
+    """Fails fast after repeated runner failures, letting one probe through per cooldown."""
+
+    def __init__(self, failure_threshold: int, reset_seconds: float) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half-open"
+        return "open"
+
+    def before_call(self) -> None:
+        state = self.state
+        if state == "open" or (state == "half-open" and self._probing):
+            raise RunnerUnavailable("Runner circuit is open")
+        if state == "half-open":
+            self._probing = True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probing = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+# Statuses that mean the runner itself is unreachable or overloaded rather than that the request failed.
+UNAVAILABLE_STATUSES = {502, 503, 504}
+
+
+def _backoff(attempt: int) -> float:
+    return random.uniform(0, min(settings.runner_retry_max_delay, settings.runner_retry_base_delay * 2**attempt))
+
+
+class RunnerClient:
+    """Process-wide pooled HTTP client for the runner service.
+
+    Idempotent operations are retried with jittered exponential backoff and
+    every call goes through a circuit breaker, so callers fail fast with
+    ``RunnerUnavailable`` while the runner is down. Only transport errors and
+    502/503/504 count against the breaker; any other error status is the
+    request's own failure and raises ``httpx.HTTPStatusError``.
+    """
+
+    def __init__(self, base_url: str) -> None:
+        self.base_url = base_url
+        self.breaker = CircuitBreaker(settings.runner_breaker_threshold, settings.runner_breaker_reset_seconds)
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=httpx.Limits(
+                    max_connections=settings.runner_max_connections,
+                    max_keepalive_connections=settings.runner_max_keepalive_connections,
+                    keepalive_expiry=settings.runner_keepalive_seconds,
+                ),
+                timeout=httpx.Timeout(settings.runner_default_timeout, connect=settings.runner_connect_timeout),
+            )
+        return self._client
+
+    async def request(
+        self, method: str, path: str, *, timeout: float, idempotent: bool = False, **kwargs
+    ) -> httpx.Response:
+        attempts = settings.runner_retry_attempts if idempotent else 1
+        extra_headers = kwargs.pop("headers", {})
+        for attempt in range(attempts):
+            self.breaker.before_call()
+            # Each attempt is its own span in the caller's trace.
+            headers = {**extra_headers, "traceparent": child_traceparent()}
+            try:
+                resp = await self.http.request(method, path, timeout=timeout, headers=headers, **kwargs)
+            except httpx.TransportError as exc:
+                self.breaker.record_failure()
+                error: Exception = exc
+            else:
+                if resp.status_code not in UNAVAILABLE_STATUSES:
+                    self.breaker.record_success()
+                    resp.raise_for_status()
+                    return resp
+                self.breaker.record_failure()
+                error = httpx.HTTPStatusError(
+                    f"Runner returned {resp.status_code}", request=resp.request, response=resp
+                )
+            if attempt + 1 < attempts:
+                await asyncio.sleep(_backoff(attempt))
+        raise RunnerUnavailable(f"{method} {path} failed: {error}") from error
+
+    async def stream_lines(self, path: str, params: dict) -> AsyncIterator[str]:
+        self.breaker.before_call()
+        try:
+            async with self.http.stream(
+                "GET",
+                path,
+                params=params,
+                headers={"traceparent": child_traceparent()},
+                timeout=httpx.Timeout(settings.runner_default_timeout, read=settings.runner_stream_read_timeout),
+            ) as resp:
+                resp.raise_for_status()
+                self.breaker.record_success()
+                async for line in resp.aiter_lines():
+                    if line:
+                        yield line
+        except httpx.TransportError:
+            self.breaker.record_failure()
+            raise
+        except httpx.HTTPStatusError as exc:
+            if exc.response.status_code in UNAVAILABLE_STATUSES:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+_clients: dict = {}
+
+
+def get_runner_client(base_url: Optional[str] = None) -> RunnerClient:
+    """Pooled client for one runner node (the default runner if ``base_url`` is omitted).
+
+    Keyed by pid so a forked worker never reuses its parent's sockets, and by
+    URL so each node gets its own pool and circuit breaker.
+    """
+    base_url = base_url or settings.runner_url
+    pid = os.getpid()
+    if any(key[0] != pid for key in _clients):
+        _clients.clear()
+    if (pid, base_url) not in _clients:
+        _clients[(pid, base_url)] = RunnerClient(base_url)
+    return _clients[(pid, base_url)]
+
+
+async def close_runner_client() -> None:
+    pid = os.getpid()
+    for key in [key for key in _clients if key[0] == pid]:
+        await _clients.pop(key).aclose()
+
+
+async def submit_build(
+    tool_id: int,
+    version_id: int,
+    app_digest: str,
+    requirements_digest: str,
+    job_id: str,
+    bundle_digest: Optional[str] = None,
+    runner_url: Optional[str] = None,
+) -> dict:
+    # The runner deduplicates on job_id, which makes the submission safe to retry.
+    resp = await get_runner_client(runner_url).request(
+        "POST",
+        "/build",
+        json={
+            "tool_id": tool_id,
+            "version_id": version_id,
+            "app_digest": app_digest,
+            "requirements_digest": requirements_digest,
+            "bundle_digest": bundle_digest,
+            "job_id": job_id,
+        },
+        timeout=settings.runner_build_submit_timeout,
+        idempotent=True,
+    )
+    return resp.json()
+
+
+async def resolve_requirements(requirements_digest: str, runner_url: Optional[str] = None) -> dict:
+    """Ask a runner to pin a requirements blob; returns the lock text, package count and environment."""
+    resp = await get_runner_client(runner_url).request(
+        "POST",
+        "/resolve",
+        json={"requirements_digest": requirements_digest},
+        timeout=settings.runner_resolve_timeout,
+        idempotent=True,
+    )
+    return resp.json()
+
+
+async def follow_job(job_id: str, after: int = 0, runner_url: Optional[str] = None) -> AsyncIterator[dict]:
+    """Yield a runner job's events as they arrive, ending with its final ``status`` event.
+
+    Dropped connections are resumed from the last sequence number seen.
+    """
+    client = get_runner_client(runner_url)
+    attempt = 0
+    while True:
+        try:
+            async for line in client.stream_lines(f"/jobs/{job_id}/events", {"after": after}):
+                event = json.loads(line)
+                attempt = 0
+                if "seq" in event:
+                    after = event["seq"]
+                yield event
+                if "status" in event:
+                    return
+            raise RunnerError(f"Runner closed the event stream for job {job_id}")
+        except (httpx.TransportError, httpx.HTTPStatusError, RunnerError) as exc:
+            if (
+                isinstance(exc, RunnerUnavailable)
+                or (isinstance(exc, httpx.HTTPStatusError) and exc.response.status_code < 500)
+                or attempt + 1 >= settings.runner_retry_attempts
+            ):
+                raise
+            await asyncio.sleep(_backoff(attempt))
+            attempt += 1
+
+
+async def cancel_job(job_id: str, runner_url: Optional[str] = None) -> dict:
+    resp = await get_runner_client(runner_url).request(
+        "POST", f"/jobs/{job_id}/cancel", timeout=settings.runner_status_timeout, idempotent=True
+    )
+    return resp.json()
+
+
+async def trigger_run(
+    tool_id: int,
+    image_ref: str,
+    min_replicas: int = 1,
+    max_replicas: int = 1,
+    source: Optional[dict] = None,
+    resources: Optional[dict] = None,
+    runner_url: Optional[str] = None,
+) -> dict:
+    """Start a tool.
+
+    ``source`` (version and digests) lets a node without the image build it
+    first; ``resources`` are the per-replica limits the runner admits and applies.
+    """
+    resp = await get_runner_client(runner_url).request(
+        "POST",
+        "/run",
+        json={
+            "tool_id": tool_id,
+            "image_ref": image_ref,
+            "min_replicas": min_replicas,
+            "max_replicas": max_replicas,
+            "source": source,
+            "resources": resources,
+        },
+        timeout=settings.runner_run_timeout,
+    )
+    return resp.json()
+
+
+async def fetch_tool_logs(
+    tool_id: int, after: int = 0, tail: Optional[int] = None, runner_url: Optional[str] = None
+) -> Optional[dict]:
+    """The tool's buffered runtime output on its runner, or ``None`` if the runner holds none."""
+    params = {"after": after}
+    if tail:
+        params["tail"] = tail
+    try:
+        resp = await get_runner_client(runner_url).request(
+            "GET", f"/logs/{tool_id}", params=params, timeout=settings.runner_status_timeout, idempotent=True
         )
-        resp.raise_for_status()
-        return resp.json()
+    except httpx.HTTPStatusError as exc:
+        if exc.response.status_code == 404:
+            return None
+        raise
+    return resp.json()
+
+
+async def follow_tool_logs(tool_id: int, after: int = 0, runner_url: Optional[str] = None) -> AsyncIterator[dict]:
+    """Yield the tool's output lines as they are written, until the tool stops or the runner drops the stream."""
+    async for line in get_runner_client(runner_url).stream_lines(f"/logs/{tool_id}/follow", {"after": after}):
+        event = json.loads(line)
+        if "heartbeat" in event:
+            continue
+        yield event
+        if event.get("end"):
+            return
 
 
-async def trigger_run(tool_id: int, image_ref: str) -> dict:
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(
-            f"{settings.runner_url}/run",
-            json={"tool_id": tool_id, "image_ref": image_ref},
-            timeout=60,
+async def scale_tool(tool_id: int, min_replicas: int, max_replicas: int, runner_url: Optional[str] = None) -> dict:
+    try:
+        resp = await get_runner_client(runner_url).request(
+            "POST",
+            "/scale",
+            json={"tool_id": tool_id, "min_replicas": min_replicas, "max_replicas": max_replicas},
+            timeout=settings.runner_run_timeout,
+            idempotent=True,
         )
-        resp.raise_for_status()
-        return resp.json()
+    except httpx.HTTPStatusError as exc:
+        if exc.response.status_code == 404:
+            return {"replicas": []}
+        raise
+    return resp.json()
 
 
-async def trigger_stop(tool_id: int) -> dict:
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(
-            f"{settings.runner_url}/stop",
+async def trigger_stop(tool_id: int, runner_url: Optional[str] = None) -> dict:
+    try:
+        resp = await get_runner_client(runner_url).request(
+            "POST",
+            "/stop",
             json={"tool_id": tool_id},
-            timeout=30,
+            timeout=settings.runner_stop_timeout,
+            idempotent=True,
         )
-        resp.raise_for_status()
-        return resp.json()
+    except httpx.HTTPStatusError as exc:
+        if exc.response.status_code == 404:
+            return {"status": "stopped"}
+        raise
+    return resp.json()
@@ -1,8 +1,9 @@
 from datetime import datetime
-from typing import List, Optional
-from pydantic import BaseModel, EmailStr
+from typing import Dict, List, Optional
+from pydantic import BaseModel, EmailStr, conint, validator
 
-from .models import BuildStatus, RunStatus, ToolStatus
+from .models import BuildStatus, NodeStatus, RunStatus, ToolStatus
+from .profiles import RESOURCE_PROFILES
 
 
 class UserCreate(BaseModel):
@@ -32,11 +33,55 @@ class ToolOut(ToolBase):
     owner_id: int
     status: ToolStatus
     current_image_ref: Optional[str]
+    min_replicas: int
+    max_replicas: int
+    resource_profile: str
 
     class Config:
         orm_mode = True
 
 
+class ToolResources(BaseModel):
+    resource_profile: str
+
+    @validator("resource_profile")
+    def known_profile(cls, value):
+        if value not in RESOURCE_PROFILES:
+            raise ValueError(f"Unknown profile; choose one of {', '.join(RESOURCE_PROFILES)}")
+        return value
+
+
+class ReplicaUsage(BaseModel):
+    node: str
+    replica: Optional[int]
+    container_id: str
+    cpu_seconds: float
+    cpu_limit: float
+    memory_bytes: int
+    memory_peak_bytes: int
+    memory_limit_bytes: int
+    pids: int
+
+
+class ToolUsage(BaseModel):
+    resource_profile: str
+    cpus: float
+    memory_mb: int
+    pids: int
+    replicas: List[ReplicaUsage]
+
+
+class ToolScaling(BaseModel):
+    min_replicas: conint(ge=1)
+    max_replicas: conint(ge=1)
+
+    @validator("max_replicas")
+    def max_not_below_min(cls, value, values):
+        if "min_replicas" in values and value < values["min_replicas"]:
+            raise ValueError("max_replicas must be at least min_replicas")
+        return value
+
+
 class VersionUpload(BaseModel):
     app_py: str
     requirements_txt: str
@@ -44,9 +89,12 @@ class VersionUpload(BaseModel):
 
 class BuildOut(BaseModel):
     id: int
+    version_id: int
     status: BuildStatus
-    logs: Optional[str]
     image_ref: Optional[str]
+    cache_status: Optional[str]
+    trace_id: Optional[str]
+    phase_timings: Optional[Dict[str, float]]
     created_at: datetime
 
     class Config:
@@ -56,8 +104,20 @@ class BuildOut(BaseModel):
 class ToolVersionOut(BaseModel):
     id: int
     tool_id: int
+    bundle_digest: Optional[str]
+    lock_digest: Optional[str]
     created_at: datetime
-    builds: List[BuildOut] = []
+
+    class Config:
+        orm_mode = True
+
+
+class ReplicaOut(BaseModel):
+    replica: int
+    container_id: Optional[str]
+    status: RunStatus
+    start_mode: Optional[str]
+    startup_seconds: Optional[float]
 
     class Config:
         orm_mode = True
@@ -65,9 +125,14 @@ class ToolVersionOut(BaseModel):
 
 class RunOut(BaseModel):
     id: int
+    build_id: int
     status: RunStatus
     url: Optional[str]
-    logs: Optional[str]
+    ready_seconds: Optional[float]
+    trace_id: Optional[str]
+    phase_timings: Optional[Dict[str, float]]
+    replicas: List[ReplicaOut] = []
+    created_at: datetime
 
     class Config:
         orm_mode = True
@@ -75,8 +140,75 @@ class RunOut(BaseModel):
 
 class ToolDetail(ToolOut):
     versions: List[ToolVersionOut] = []
+    builds: List[BuildOut] = []
     runs: List[RunOut] = []
+    next_versions_cursor: Optional[int] = None
+    next_builds_cursor: Optional[int] = None
+    next_runs_cursor: Optional[int] = None
+
+
+class VersionPage(BaseModel):
+    items: List[ToolVersionOut]
+    next_cursor: Optional[int] = None
+
+
+class BuildPage(BaseModel):
+    items: List[BuildOut]
+    next_cursor: Optional[int] = None
+
+
+class RunPage(BaseModel):
+    items: List[RunOut]
+    next_cursor: Optional[int] = None
 
 
 class BuildRequest(BaseModel):
     version_id: Optional[int] = None
+
+
+class ToolStateReport(BaseModel):
+    state: RunStatus
+    container_id: Optional[str] = None
+    # Set when the change concerns a single replica, e.g. one that crashed.
+    replica: Optional[int] = None
+    reason: Optional[str] = None
+
+
+class ReplicaState(BaseModel):
+    replica: int
+    container_id: str
+
+
+class ReplicaReport(BaseModel):
+    replicas: List[ReplicaState]
+
+
+class NodeHeartbeat(BaseModel):
+    name: str
+    url: str
+    tool_url: Optional[str] = None
+    cpu_total: float
+    cpu_free: float
+    memory_total: int
+    memory_free: int
+    running_tools: List[int] = []
+    images: List[str] = []
+    requirements_digests: List[str] = []
+    usage: List[dict] = []
+
+
+class NodeOut(BaseModel):
+    id: int
+    name: str
+    url: str
+    tool_url: Optional[str]
+    status: NodeStatus
+    cpu_total: float
+    cpu_free: float
+    memory_total: int
+    memory_free: int
+    running_tools: List[int]
+    last_heartbeat: datetime
+
+    class Config:
+        orm_mode = True
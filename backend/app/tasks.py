@@ -1,103 +1,478 @@
+import logging
+import os
+import time
+from typing import Optional, Sequence
+
+import httpx
 from celery import Celery
+from celery.signals import (
+    before_task_publish,
+    task_prerun,
+    worker_init,
+    worker_process_init,
+    worker_process_shutdown,
+    worker_shutdown,
+)
+from prometheus_client import REGISTRY, CollectorRegistry, multiprocess, start_http_server
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-import asyncio
+from sqlalchemy.orm import selectinload
 
+from .buildlogs import BuildLogWriter
 from .config import get_settings
 from .database import AsyncSessionLocal
-from .models import BuildStatus, RunStatus, Tool, ToolBuild, ToolRun, ToolStatus
-from .runner import trigger_build, trigger_run, trigger_stop
+from .locks import cached_lock, resolve_lock
+from .metrics import CELERY_QUEUE_SECONDS
+from .models import (
+    BuildStatus,
+    NodeStatus,
+    RunnerNode,
+    RunStatus,
+    Tool,
+    ToolBuild,
+    ToolReplica,
+    ToolRun,
+    ToolStatus,
+    ToolVersion,
+)
+from .placement import choose_node, heartbeat_cutoff, node_url
+from .profiles import profile_for
+from .runlogs import ACTIVE_RUN_STATUSES, archive_run_logs
+from .runner import RunnerError, follow_job, submit_build, trigger_run, trigger_stop
+from .toolevents import publish_tool_event
+from .tracing import (
+    PhaseTimer,
+    child_traceparent,
+    current_trace_id,
+    queued_seconds,
+    set_queued_seconds,
+    set_traceparent,
+)
+from .worker import runtime
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
 
 celery_app = Celery(
     "sheetify",
     broker=settings.celery_broker_url,
     backend=settings.celery_result_backend,
 )
+celery_app.conf.task_routes = {
+    "app.tasks.execute_run": {"queue": settings.celery_runtime_queue},
+    "app.tasks.execute_stop": {"queue": settings.celery_runtime_queue},
+    "app.tasks.reschedule_node": {"queue": settings.celery_runtime_queue},
+    "app.tasks.archive_run_output": {"queue": settings.celery_runtime_queue},
+}
+celery_app.conf.beat_schedule = {
+    "check-runner-nodes": {"task": "app.tasks.check_runner_nodes", "schedule": settings.node_check_interval_seconds},
+}
+
+
+@worker_init.connect
+def _serve_worker_metrics(**_) -> None:
+    """Serve the worker's metrics (queue wait, build and run phases) on ``worker_metrics_port``; 0 disables.
+
+    Prefork children observe in their own processes, so with
+    ``PROMETHEUS_MULTIPROC_DIR`` set they write samples there and this
+    endpoint sums them. A ``threads`` pool is one process and needs neither.
+    """
+    if not settings.worker_metrics_port:
+        return
+    registry = REGISTRY
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    start_http_server(settings.worker_metrics_port, registry=registry)
+
+
+@worker_process_init.connect
+def _start_worker_runtime(**_) -> None:
+    runtime.start()
+
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def _stop_worker_runtime(**_) -> None:
+    runtime.stop()
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(os.getpid())
+
+
+@before_task_publish.connect
+def _stamp_task_headers(headers=None, **_) -> None:
+    """Carry the publisher's trace and the publish time to the worker in the message headers."""
+    if headers is not None:
+        headers.setdefault("traceparent", child_traceparent())
+        headers.setdefault("sheetify_sent_at", time.time())
+
+
+@task_prerun.connect
+def _enter_task_context(task=None, **_) -> None:
+    """Continue the publisher's trace in this task; every task sets both, so nothing leaks between tasks."""
+    sent_at = getattr(task.request, "sheetify_sent_at", None)
+    waited = max(time.time() - sent_at, 0.0) if sent_at else None
+    if waited is not None:
+        CELERY_QUEUE_SECONDS.labels(task.name).observe(waited)
+    set_traceparent(getattr(task.request, "traceparent", None))
+    set_queued_seconds(waited)
 
 
 def _run_async(coro):
-    try:
-        loop = asyncio.get_event_loop()
-    except RuntimeError:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-    return loop.run_until_complete(coro)
+    return runtime.run(coro)
+
+
+async def _publish_build(tool_id: int, build: ToolBuild, tool_status: ToolStatus) -> None:
+    await publish_tool_event(
+        tool_id, "build", id=build.id, status=build.status.value, tool_status=tool_status.value
+    )
+
+
+async def _publish_run(tool: Tool, run: ToolRun) -> None:
+    await publish_tool_event(
+        tool.id,
+        "run",
+        id=run.id,
+        status=run.status.value,
+        tool_status=tool.status.value,
+        ready_seconds=run.ready_seconds,
+    )
 
 
 @celery_app.task
-def execute_build(tool_id: int, version_id: int, app_py: str, requirements_txt: str) -> None:
+def execute_build(
+    tool_id: int, version_id: int, app_digest: str, requirements_digest: str, bundle_digest: Optional[str] = None
+) -> None:
     async def _inner():
+        timer = PhaseTimer("build")
+        timer.record("queue", queued_seconds())
         async with AsyncSessionLocal() as session:
-            build = ToolBuild(version_id=version_id, status=BuildStatus.RUNNING)
+            build = ToolBuild(version_id=version_id, status=BuildStatus.RUNNING, trace_id=current_trace_id())
             session.add(build)
             await session.flush()
+            build.runner_job_id = f"build-{build.id}"
+            await session.commit()
+            await _publish_build(tool_id, build, ToolStatus.BUILDING)
+            log = BuildLogWriter(session, build.id)
             try:
                 await session.execute(
                     select(Tool).where(Tool.id == tool_id).execution_options(populate_existing=True)
                 )
-                result = await trigger_build(tool_id, version_id, app_py, requirements_txt)
+                version = await session.get(ToolVersion, version_id)
+                locked = await cached_lock(session, version)
+                if locked:
+                    await log.write(f"Reusing dependency lock {locked[:12]}")
+                with timer.phase("placement"):
+                    node = await choose_node(session, requirements_digest=locked or requirements_digest)
+                runner_url = node.url if node else None
+                build.node_id = node.id if node else None
+                await session.commit()
+                with timer.phase("lock"):
+                    pinned = locked or await _lock_requirements(session, version, runner_url, log)
+                with timer.phase("submit"):
+                    await submit_build(
+                        tool_id,
+                        version_id,
+                        app_digest,
+                        pinned,
+                        build.runner_job_id,
+                        bundle_digest=bundle_digest,
+                        runner_url=runner_url,
+                    )
+                result = None
+                async for event in follow_job(build.runner_job_id, runner_url=runner_url):
+                    if "log" in event:
+                        await log.write(event["log"])
+                    elif "status" in event:
+                        if event["status"] != "succeeded":
+                            raise RunnerError(event.get("error") or f"Build {event['status']}")
+                        result = event.get("result") or {}
+                if result is None:
+                    raise RunnerError("Runner closed the build stream without a result")
+                timer.merge(result.get("phases"))
                 build.status = BuildStatus.SUCCESS
                 build.image_ref = result.get("image_ref")
-                build.logs = result.get("logs")
+                build.cache_status = result.get("cache")
                 tool = await session.get(Tool, tool_id)
                 if tool:
                     tool.status = ToolStatus.IDLE
                     tool.current_image_ref = build.image_ref
                     tool.current_version_id = version_id
             except Exception as exc:  # pragma: no cover
+                await log.write(str(exc))
                 build.status = BuildStatus.FAILED
                 build.logs = str(exc)
                 tool = await session.get(Tool, tool_id)
                 if tool:
                     tool.status = ToolStatus.ERROR
+            await log.flush()
+            build.phase_timings = timer.finish()
             await session.commit()
+            await _publish_build(tool_id, build, tool.status if tool else ToolStatus.IDLE)
     _run_async(_inner())
 
 
+async def _lock_requirements(
+    session: AsyncSession, version: ToolVersion, runner_url: Optional[str], log: BuildLogWriter
+) -> str:
+    """Pin the version's requirements, falling back to building them unpinned if resolution fails."""
+    try:
+        lock = await resolve_lock(session, version, runner_url)
+    except (RunnerError, httpx.HTTPError) as exc:
+        await log.write(f"Dependency resolution failed, building unpinned requirements: {_failure_detail(exc)}")
+        return version.requirements_digest
+    await log.write(f"Resolved {lock.packages} pinned packages into lock {lock.lock_digest[:12]}")
+    return lock.lock_digest
+
+
+async def _start_run(
+    session: AsyncSession,
+    tool: Tool,
+    build_id: int,
+    image_ref: str,
+    exclude: Sequence[int] = (),
+    queued: Optional[float] = None,
+) -> ToolRun:
+    """Place a run on the best node and start it there, recording the outcome on the new ``ToolRun``."""
+    timer = PhaseTimer("run")
+    timer.record("queue", queued)
+    run = ToolRun(
+        tool_id=tool.id, build_id=build_id, status=RunStatus.STARTING, trace_id=current_trace_id(), replicas=[]
+    )
+    session.add(run)
+    # Commit so the run shows as starting while the runner waits for the app to pass its health check.
+    await session.commit()
+    await _publish_run(tool, run)
+    try:
+        build = await session.get(ToolBuild, build_id)
+        version = await session.get(ToolVersion, build.version_id)
+        profile = profile_for(tool.resource_profile)
+        tried = list(exclude)
+        for attempt in range(settings.placement_attempts):
+            with timer.phase("placement"):
+                node = await choose_node(
+                    session,
+                    image_ref=image_ref,
+                    requirements_digest=version.lock_digest or version.requirements_digest,
+                    profile=profile,
+                    replicas=tool.min_replicas,
+                    exclude=tried,
+                )
+            run.node_id = node.id if node else None
+            try:
+                result = await trigger_run(
+                    tool.id,
+                    image_ref,
+                    tool.min_replicas,
+                    tool.max_replicas,
+                    # Lets a node that has never seen this image build it from the stored sources.
+                    source={
+                        "version_id": version.id,
+                        "app_digest": version.app_digest,
+                        "requirements_digest": version.lock_digest or version.requirements_digest,
+                        "bundle_digest": version.bundle_digest,
+                    },
+                    resources=profile.as_dict(),
+                    runner_url=node.url if node else None,
+                )
+                break
+            except httpx.HTTPStatusError as exc:
+                # 429: the node's admission control refused, its last heartbeat overstated its free capacity.
+                # 409: the node started draining since its last heartbeat.
+                if exc.response.status_code not in (409, 429) or node is None or attempt + 1 >= settings.placement_attempts:
+                    raise
+                tried.append(node.id)
+        timer.merge(result.get("phases"))
+        run.status = RunStatus.RUNNING
+        run.container_id = result.get("container_id")
+        run.url = result.get("url")
+        if node is not None and node.tool_url:
+            # The node publishes routes only to its own proxy, so the run is reachable only through it.
+            run.url = f"{node.tool_url.rstrip('/')}{run.url}"
+        run.ready_seconds = result.get("ready_seconds")
+        run.logs = result.get("logs")
+        run.replicas = [
+            ToolReplica(
+                replica=replica["replica"],
+                container_id=replica["container_id"],
+                status=RunStatus.RUNNING,
+                start_mode=replica.get("start_mode"),
+                startup_seconds=replica.get("startup_seconds"),
+            )
+            for replica in result.get("replicas", [])
+        ]
+        tool.status = ToolStatus.RUNNING
+    except Exception as exc:  # pragma: no cover
+        run.status = RunStatus.FAILED
+        run.logs = _failure_detail(exc)
+        tool.status = ToolStatus.ERROR
+    run.phase_timings = timer.finish()
+    return run
+
+
+def _failure_detail(exc: Exception) -> str:
+    """The runner's own explanation (e.g. why the app never became healthy) where it sent one."""
+    if isinstance(exc, httpx.HTTPStatusError):
+        try:
+            return exc.response.json()["detail"]
+        except (ValueError, KeyError, TypeError):
+            pass
+    return str(exc)
+
+
 @celery_app.task
 def execute_run(tool_id: int, build_id: int, image_ref: str) -> None:
     async def _inner():
         async with AsyncSessionLocal() as session:
-            run = ToolRun(tool_id=tool_id, build_id=build_id, status=RunStatus.STARTING)
-            session.add(run)
-            await session.flush()
-            try:
-                result = await trigger_run(tool_id, image_ref)
-                run.status = RunStatus.RUNNING
-                run.container_id = result.get("container_id")
-                run.url = result.get("url")
-                run.logs = result.get("logs")
-                tool = await session.get(Tool, tool_id)
-                if tool:
-                    tool.status = ToolStatus.RUNNING
-            except Exception as exc:  # pragma: no cover
-                run.status = RunStatus.FAILED
-                run.logs = str(exc)
-                tool = await session.get(Tool, tool_id)
-                if tool:
-                    tool.status = ToolStatus.ERROR
+            tool = await session.get(Tool, tool_id)
+            if not tool:
+                return
+            await _retire_live_runs(session, tool)
+            run = await _start_run(session, tool, build_id, image_ref, queued=queued_seconds())
             await session.commit()
+            await _publish_run(tool, run)
     _run_async(_inner())
 
 
+async def _retire_live_runs(session: AsyncSession, tool: Tool) -> None:
+    """Stop and archive the tool's live runs before a redeploy replaces them.
+
+    A node keeps one output buffer per tool and a new run on it starts a fresh
+    one, so the superseded run's output is archived first rather than lost or
+    shown as the new run's.
+    """
+    runs = (
+        await session.execute(
+            select(ToolRun)
+            .where(ToolRun.tool_id == tool.id, ToolRun.status.in_(ACTIVE_RUN_STATUSES))
+            .options(selectinload(ToolRun.replicas))
+        )
+    ).scalars().all()
+    for run in runs:
+        runner_url = await node_url(session, run.node_id)
+        try:
+            await trigger_stop(tool.id, runner_url=runner_url)
+        except (RunnerError, httpx.HTTPError) as exc:
+            logger.warning("Could not stop superseded run %s of tool %s: %s", run.id, tool.id, exc)
+        run.status = RunStatus.STOPPED
+        for replica in run.replicas:
+            replica.status = RunStatus.STOPPED
+        await session.commit()
+        await _archive_quietly(session, run, runner_url)
+        await _publish_run(tool, run)
+
+
 @celery_app.task
 def execute_stop(tool_id: int) -> None:
     async def _inner():
         async with AsyncSessionLocal() as session:
             tool = await session.get(Tool, tool_id)
-            if not tool or tool.status != ToolStatus.RUNNING:
+            if not tool or tool.status not in (ToolStatus.RUNNING, ToolStatus.HIBERNATED):
                 return
-            await trigger_stop(tool_id)
-            tool.status = ToolStatus.IDLE
             result = await session.execute(
-                select(ToolRun).where(ToolRun.tool_id == tool_id).order_by(ToolRun.created_at.desc())
+                select(ToolRun)
+                .where(ToolRun.tool_id == tool_id)
+                .order_by(ToolRun.created_at.desc())
+                .options(selectinload(ToolRun.replicas))
             )
             last_run = result.scalars().first()
+            runner_url = await node_url(session, last_run.node_id if last_run else None)
+            await trigger_stop(tool_id, runner_url=runner_url)
+            tool.status = ToolStatus.IDLE
             if last_run:
                 last_run.status = RunStatus.STOPPED
-                last_run.logs = (last_run.logs or "") + "
-Stopped by user"
+                for replica in last_run.replicas:
+                    replica.status = RunStatus.STOPPED
+            await session.commit()
+            if last_run:
+                await _archive_quietly(session, last_run, runner_url)
+                await _publish_run(tool, last_run)
+            else:
+                await publish_tool_event(tool_id, "tool", tool_status=tool.status.value)
+    _run_async(_inner())
+
+
+async def _archive_quietly(session: AsyncSession, run: ToolRun, runner_url: Optional[str]) -> None:
+    """Archive a finished run's output; a runner that can't be reached only costs the output, not the stop."""
+    try:
+        await archive_run_logs(session, run, runner_url)
+    except (RunnerError, httpx.HTTPError) as exc:
+        logger.warning("Could not archive logs of run %s: %s", run.id, exc)
+
+
+@celery_app.task
+def archive_run_output(run_id: int) -> None:
+    async def _inner():
+        async with AsyncSessionLocal() as session:
+            run = await session.get(ToolRun, run_id)
+            if run:
+                await _archive_quietly(session, run, await node_url(session, run.node_id))
+    _run_async(_inner())
+
+
+@celery_app.task
+def reschedule_node(node_id: int) -> None:
+    """Move every live tool off a draining or offline node.
+
+    Each tool is started on another node before its old run is retired, so a
+    draining node keeps serving until the replacement is up.
+    """
+    async def _inner():
+        async with AsyncSessionLocal() as session:
+            node = await session.get(RunnerNode, node_id)
+            if not node:
+                return
+            runs = (
+                await session.execute(
+                    select(ToolRun)
+                    .where(
+                        ToolRun.node_id == node_id,
+                        ToolRun.status.in_([RunStatus.STARTING, RunStatus.RUNNING, RunStatus.HIBERNATED]),
+                    )
+                    .options(selectinload(ToolRun.replicas))
+                )
+            ).scalars().all()
+            for old_run in runs:
+                tool = await session.get(Tool, old_run.tool_id)
+                build = await session.get(ToolBuild, old_run.build_id)
+                if not tool or not build or not build.image_ref:
+                    continue
+                new_run = await _start_run(session, tool, build.id, build.image_ref, exclude=[node_id])
+                if new_run.status != RunStatus.RUNNING:
+                    logger.warning("Could not reschedule tool %s off node %s: %s", tool.id, node.name, new_run.logs)
+                    await session.commit()
+                    await _publish_run(tool, new_run)
+                    continue
+                old_run.status = RunStatus.STOPPED
+                for replica in old_run.replicas:
+                    replica.status = RunStatus.STOPPED
+                await session.commit()
+                await _publish_run(tool, old_run)
+                await _publish_run(tool, new_run)
+                if node.status == NodeStatus.DRAINING:
+                    try:
+                        await trigger_stop(tool.id, runner_url=node.url)
+                    except (RunnerError, httpx.HTTPError) as exc:
+                        logger.warning("Could not stop tool %s on draining node %s: %s", tool.id, node.name, exc)
+                    await _archive_quietly(session, old_run, node.url)
+    _run_async(_inner())
+
+
+@celery_app.task
+def check_runner_nodes() -> None:
+    """Mark nodes that stopped sending heartbeats offline and reschedule their tools."""
+    async def _inner():
+        async with AsyncSessionLocal() as session:
+            stale = (
+                await session.execute(
+                    select(RunnerNode).where(
+                        RunnerNode.status == NodeStatus.ACTIVE, RunnerNode.last_heartbeat < heartbeat_cutoff()
+                    )
+                )
+            ).scalars().all()
+            for node in stale:
+                node.status = NodeStatus.OFFLINE
             await session.commit()
+        for node in stale:
+            reschedule_node.delay(node.id)
     _run_async(_inner())
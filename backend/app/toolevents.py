@@ -0,0 +1,138 @@
+import asyncio
+import json
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional, Set
+
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
+
+from .config import get_settings
+from .metrics import TOOL_EVENT_SUBSCRIBERS, TOOL_EVENTS_DELIVERED
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Tells a client its view may be stale (it just subscribed, fell behind or missed events) and should refetch.
+RESYNC = {"kind": "resync"}
+
+_publishers: Dict[int, aioredis.Redis] = {}
+
+
+def _publisher() -> aioredis.Redis:
+    pid = os.getpid()
+    if pid not in _publishers:
+        _publishers.clear()
+        _publishers[pid] = aioredis.from_url(settings.redis_url)
+    return _publishers[pid]
+
+
+async def publish_tool_event(tool_id: int, kind: str, **fields) -> None:
+    """Announce a committed change (``kind`` is ``build``, ``run``, ``replicas`` or ``tool``) to every API process.
+
+    Best effort: a lost event only delays a client until its next resync.
+    """
+    event = {"tool_id": tool_id, "kind": kind, **fields}
+    try:
+        await _publisher().publish(settings.tool_events_channel, json.dumps(event, default=str))
+    except (RedisError, OSError) as exc:
+        logger.warning("Could not publish %s event for tool %s: %s", kind, tool_id, exc)
+
+
+async def close_event_publisher() -> None:
+    publisher = _publishers.pop(os.getpid(), None)
+    if publisher is not None:
+        await publisher.aclose()
+
+
+class ToolEventHub:
+    """Fans tool events out to this process's clients from a single Redis subscription.
+
+    The subscription starts with the first client and reconnects with backoff;
+    after a reconnect every client is told to resync. A client whose queue
+    fills up loses its backlog and gets a resync instead of blocking the rest.
+    """
+
+    def __init__(self, channel: str, queue_size: int) -> None:
+        self.channel = channel
+        self.queue_size = queue_size
+        self._queues: Dict[int, Set[asyncio.Queue]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @asynccontextmanager
+    async def subscribe(self, tool_id: int) -> AsyncIterator[asyncio.Queue]:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._listen())
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._queues.setdefault(tool_id, set()).add(queue)
+        TOOL_EVENT_SUBSCRIBERS.inc()
+        try:
+            yield queue
+        finally:
+            TOOL_EVENT_SUBSCRIBERS.dec()
+            queues = self._queues.get(tool_id, set())
+            queues.discard(queue)
+            if not queues:
+                self._queues.pop(tool_id, None)
+
+    def _offer(self, queue: asyncio.Queue, event: dict) -> None:
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(RESYNC)
+        TOOL_EVENTS_DELIVERED.inc()
+
+    def _dispatch(self, event: dict) -> None:
+        for queue in list(self._queues.get(event.get("tool_id"), ())):
+            self._offer(queue, event)
+
+    async def _listen(self) -> None:
+        failures = 0
+        while True:
+            client = aioredis.from_url(settings.redis_url)
+            try:
+                async with client.pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    if failures:
+                        for queues in list(self._queues.values()):
+                            for queue in list(queues):
+                                self._offer(queue, RESYNC)
+                    failures = 0
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self._dispatch(json.loads(message["data"]))
+            except (RedisError, OSError, ValueError) as exc:
+                logger.warning("Tool event subscription lost (%s), reconnecting", exc)
+            finally:
+                await client.aclose()
+            failures += 1
+            await asyncio.sleep(min(30, 2 ** min(failures, 5)))
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+hub = ToolEventHub(settings.tool_events_channel, settings.tool_events_queue_size)
+
+
+async def follow_tool_events(tool_id: int) -> AsyncIterator[str]:
+    """Server-sent events for one tool, starting with a resync; runs until the client disconnects."""
+    async with hub.subscribe(tool_id) as queue:
+        yield f"event: resync\ndata: {json.dumps(RESYNC)}\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), settings.tool_events_keepalive_seconds)
+            except asyncio.TimeoutError:
+                # Keeps proxies from closing an idle stream.
+                yield ": keepalive\n\n"
+                continue
+            yield f"event: {event['kind']}\ndata: {json.dumps(event)}\n\n"
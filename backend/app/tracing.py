@@ -0,0 +1,87 @@
+import os
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+from .metrics import PHASE_SECONDS
+
+# W3C trace context: version-trace_id-parent_id-flags.
+TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+_traceparent: ContextVar[Optional[str]] = ContextVar("traceparent", default=None)
+_queued_seconds: ContextVar[Optional[float]] = ContextVar("queued_seconds", default=None)
+
+
+def trace_id_of(traceparent: Optional[str]) -> Optional[str]:
+    match = TRACEPARENT.match(traceparent or "")
+    return match.group(1) if match else None
+
+
+def new_traceparent(trace_id: Optional[str] = None) -> str:
+    """A traceparent for a new span, in the given trace or a new one."""
+    return f"00-{trace_id or os.urandom(16).hex()}-{os.urandom(8).hex()}-01"
+
+
+def current_traceparent() -> Optional[str]:
+    return _traceparent.get()
+
+
+def current_trace_id() -> Optional[str]:
+    return trace_id_of(_traceparent.get())
+
+
+def child_traceparent() -> str:
+    """The traceparent to send downstream: a new span in the current trace, or a new trace."""
+    return new_traceparent(current_trace_id())
+
+
+def set_traceparent(traceparent: Optional[str]):
+    """Make ``traceparent`` (or a new trace, if it is missing or malformed) current; returns the reset token."""
+    return _traceparent.set(traceparent if trace_id_of(traceparent) else new_traceparent())
+
+
+def reset_traceparent(token) -> None:
+    _traceparent.reset(token)
+
+
+def set_queued_seconds(seconds: Optional[float]):
+    return _queued_seconds.set(seconds)
+
+
+def queued_seconds() -> Optional[float]:
+    """How long the current Celery task waited in its queue, if the publisher stamped it."""
+    return _queued_seconds.get()
+
+
+class PhaseTimer:
+    """Wall-clock seconds per phase of one build or run, also observed in ``sheetify_phase_seconds``."""
+
+    def __init__(self, operation: str) -> None:
+        self.operation = operation
+        self.timings: Dict[str, float] = {}
+        self._started = time.monotonic()
+
+    def record(self, phase: str, seconds: Optional[float]) -> None:
+        if seconds is None:
+            return
+        self.timings[phase] = round(self.timings.get(phase, 0.0) + seconds, 3)
+        PHASE_SECONDS.labels(self.operation, phase).observe(seconds)
+
+    def merge(self, timings: Optional[Dict[str, float]]) -> None:
+        """Record phases measured elsewhere, e.g. by the runner."""
+        for phase, seconds in (timings or {}).items():
+            self.record(phase, seconds)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record(name, time.monotonic() - started)
+
+    def finish(self) -> Dict[str, float]:
+        self.record("total", time.monotonic() - self._started)
+        return dict(self.timings)
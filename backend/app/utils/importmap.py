@@ -0,0 +1,40 @@
+import sys
+from typing import Optional
+
+# Top-level import names whose distribution on PyPI is named differently.
+IMPORT_DISTRIBUTIONS = {
+    "attr": "attrs",
+    "bs4": "beautifulsoup4",
+    "cv2": "opencv-python-headless",
+    "dateutil": "python-dateutil",
+    "docx": "python-docx",
+    "dotenv": "python-dotenv",
+    "fitz": "PyMuPDF",
+    "jose": "python-jose",
+    "jwt": "PyJWT",
+    "magic": "python-magic",
+    "MySQLdb": "mysqlclient",
+    "OpenSSL": "pyOpenSSL",
+    "PIL": "Pillow",
+    "pptx": "python-pptx",
+    "psycopg2": "psycopg2-binary",
+    "serial": "pyserial",
+    "skimage": "scikit-image",
+    "sklearn": "scikit-learn",
+    "slugify": "python-slugify",
+    "st_aggrid": "streamlit-aggrid",
+    "streamlit_option_menu": "streamlit-option-menu",
+    "yaml": "PyYAML",
+    "zmq": "pyzmq",
+}
+
+
+def distribution_for(module: str) -> Optional[str]:
+    """The distribution providing top-level ``module``, or ``None`` for the standard library.
+
+    Unknown modules map to a distribution of the same name, which covers the
+    common case; the resolver reports anything that doesn't exist.
+    """
+    if module in sys.stdlib_module_names or module == "__future__":
+        return None
+    return IMPORT_DISTRIBUTIONS.get(module, module)
@@ -1,34 +1,70 @@
 import ast
-import io
+import tarfile
+import tempfile
 import zipfile
-from pathlib import Path
-from typing import Tuple
+from dataclasses import dataclass, field
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO, Dict, List, Optional, Set
+
+from .importmap import distribution_for
 
 DANGEROUS_IMPORTS = {"subprocess", "os.system", "socket", "paramiko"}
 
+# Archive entries that are never part of an app.
+IGNORED_PARTS = {"__MACOSX", "__pycache__", ".git", ".DS_Store"}
+# Members smaller than this are too small for their compression ratio to matter.
+RATIO_CHECK_MIN_BYTES = 1024 * 1024
+
 
 class PackagingError(Exception):
     pass
 
 
-def _infer_requirements(source: str) -> str:
-    tree = ast.parse(source)
+@dataclass(frozen=True)
+class ArchiveLimits:
+    max_members: int = 1000
+    max_total_bytes: int = 200 * 1024 * 1024
+    max_ratio: float = 100.0
+    max_source_bytes: int = 1024 * 1024
+
+
+@dataclass
+class VersionPayload:
+    app_py: str
+    requirements_txt: str
+    # Tar of the whole app directory on disk, for archives with more than app.py and requirements.txt.
+    bundle: Optional[Path] = None
+    files: List[str] = field(default_factory=list)
+
+    def cleanup(self) -> None:
+        if self.bundle is not None:
+            self.bundle.unlink(missing_ok=True)
+
+
+def _imported_modules(source: str) -> Set[str]:
+    try:
+        tree = ast.parse(source)
+    except SyntaxError as exc:
+        raise PackagingError(f"Invalid Python source: {exc}")
     modules = set()
     for node in ast.walk(tree):
         if isinstance(node, ast.Import):
             for alias in node.names:
                 modules.add(alias.name.split(".")[0])
         elif isinstance(node, ast.ImportFrom):
-            if node.module:
+            # Relative imports (level > 0) are the app's own modules.
+            if node.module and not node.level:
                 modules.add(node.module.split(".")[0])
-    safe_modules = sorted(
-        module
-        for module in modules
-        if module not in {"streamlit", "os", "sys", "math", "json", "datetime", "pathlib"}
-    )
+    return modules
+
+
+def _infer_requirements(*sources: str, local: Set[str] = frozenset()) -> str:
+    """Unpinned requirements for the third-party modules ``sources`` import; the build pins them."""
+    modules = set().union(*(_imported_modules(source) for source in sources))
+    distributions = {distribution_for(module) for module in modules - set(local)} - {None, "streamlit"}
     requirements = ["streamlit>=1.32"]
-    for module in safe_modules:
-        requirements.append(module)
+    for distribution in sorted(distributions, key=str.lower):
+        requirements.append(distribution)
     return "\n".join(requirements)
 
 
@@ -38,31 +74,108 @@ def _detect_dangerous(source: str) -> None:
             raise PackagingError(f"Dangerous import detected: {banned}")
 
 
-def load_version_payload(filename: str, data: bytes) -> Tuple[str, str]:
-    """Return (app_py, requirements_txt)."""
-    suffix = Path(filename).suffix.lower()
+def _member_path(info: zipfile.ZipInfo) -> Optional[PurePosixPath]:
+    """The member's normalised path, ``None`` for entries to skip; rejects paths escaping the archive."""
+    if info.is_dir():
+        return None
+    path = PurePosixPath(info.filename.replace("\\", "/"))
+    if path.is_absolute() or ".." in path.parts:
+        raise PackagingError(f"Unsafe path in archive: {info.filename}")
+    if IGNORED_PARTS.intersection(path.parts) or path.suffix == ".pyc":
+        return None
+    return path
+
+
+def _check_limits(members: Dict[PurePosixPath, zipfile.ZipInfo], limits: ArchiveLimits) -> None:
+    if len(members) > limits.max_members:
+        raise PackagingError(f"Archive has more than {limits.max_members} files")
+    if sum(info.file_size for info in members.values()) > limits.max_total_bytes:
+        raise PackagingError(f"Archive expands to more than {limits.max_total_bytes // (1024 * 1024)} MB")
+    for path, info in members.items():
+        if info.file_size >= RATIO_CHECK_MIN_BYTES and info.file_size > limits.max_ratio * max(info.compress_size, 1):
+            raise PackagingError(f"{path} is compressed suspiciously well")
+
+
+def _read_text(zf: zipfile.ZipFile, info: zipfile.ZipInfo, limits: ArchiveLimits) -> str:
+    if info.file_size > limits.max_source_bytes:
+        raise PackagingError(f"{info.filename} is larger than {limits.max_source_bytes // 1024} KB")
+    try:
+        return zf.read(info).decode("utf-8")
+    except UnicodeDecodeError:
+        raise PackagingError(f"{info.filename} is not UTF-8 text")
+
+
+def _write_bundle(zf: zipfile.ZipFile, members: Dict[PurePosixPath, zipfile.ZipInfo]) -> Path:
+    """Copy ``members`` (paths relative to the app directory) into a tar on disk, one member at a time."""
+    with tempfile.NamedTemporaryFile(suffix=".tar", delete=False) as tmp:
+        try:
+            with tarfile.open(fileobj=tmp, mode="w") as bundle:
+                for path, info in sorted(members.items()):
+                    entry = tarfile.TarInfo(str(path))
+                    entry.size = info.file_size
+                    entry.mode = 0o644
+                    with zf.open(info) as source:
+                        bundle.addfile(entry, source)
+        except BaseException:
+            Path(tmp.name).unlink(missing_ok=True)
+            raise
+    return Path(tmp.name)
+
+
+def _load_archive(data: BinaryIO, limits: ArchiveLimits) -> VersionPayload:
+    try:
+        zf = zipfile.ZipFile(data)
+    except zipfile.BadZipFile:
+        raise PackagingError("Invalid zip archive")
+    with zf:
+        members = {path: info for info in zf.infolist() if (path := _member_path(info)) is not None}
+        _check_limits(members, limits)
+        apps = sorted((path for path in members if path.name == "app.py"), key=lambda path: len(path.parts))
+        if not apps:
+            raise PackagingError("Archive must contain app.py")
+        # Everything under the directory holding the top-most app.py is the app; its paths become relative to it.
+        root = apps[0].parent
+        app_files = {
+            path.relative_to(root): info
+            for path, info in members.items()
+            if root == PurePosixPath(".") or root in path.parents
+        }
+        # Only Python sources and requirements.txt are read; everything else is copied through unopened.
+        sources = {path: _read_text(zf, info, limits) for path, info in app_files.items() if path.suffix == ".py"}
+        for source in sources.values():
+            _detect_dangerous(source)
+        app_source = sources[PurePosixPath("app.py")]
+        requirements_info = app_files.get(PurePosixPath("requirements.txt"))
+        if requirements_info is not None:
+            requirements = _read_text(zf, requirements_info, limits)
+        else:
+            local = {path.parts[0].removesuffix(".py") for path in sources}
+            requirements = _infer_requirements(*sources.values(), local=local)
+        payload = VersionPayload(app_source, requirements, files=sorted(str(path) for path in app_files))
+        if set(app_files) - {PurePosixPath("app.py"), PurePosixPath("requirements.txt")}:
+            payload.bundle = _write_bundle(zf, app_files)
+        return payload
+
+
+def load_version_payload(filename: str, data: BinaryIO, limits: ArchiveLimits = ArchiveLimits()) -> VersionPayload:
+    """Read an uploaded ``.py`` file or ``.zip`` app from a seekable file object.
+
+    Zip members are inspected lazily: limits are checked against the central
+    directory before anything is decompressed, and only Python sources and
+    requirements.txt are read into memory.
+    """
+    suffix = Path(filename or "").suffix.lower()
     if suffix == ".py":
-        source = data.decode("utf-8")
-        _detect_dangerous(source)
-        requirements = _infer_requirements(source)
-        return source, requirements
+        source = data.read(limits.max_source_bytes + 1)
+        if len(source) > limits.max_source_bytes:
+            raise PackagingError(f"{filename} is larger than {limits.max_source_bytes // 1024} KB")
+        try:
+            app_py = source.decode("utf-8")
+        except UnicodeDecodeError:
+            raise PackagingError(f"{filename} is not UTF-8 text")
+        _detect_dangerous(app_py)
+        return VersionPayload(app_py, _infer_requirements(app_py), files=["app.py"])
     if suffix == ".zip":
-        with zipfile.ZipFile(io.BytesIO(data)) as zf:
-            app_source = None
-            requirements = None
-            for name in zf.namelist():
-                if name.endswith("/"):
-                    continue
-                path = Path(name)
-                content = zf.read(name).decode("utf-8")
-                if path.name == "app.py":
-                    _detect_dangerous(content)
-                    app_source = content
-                elif path.name == "requirements.txt":
-                    requirements = content
-            if app_source is None:
-                raise PackagingError("Archive must contain app.py")
-            if requirements is None:
-                requirements = _infer_requirements(app_source)
-            return app_source, requirements
+        return _load_archive(data, limits)
     raise PackagingError("Unsupported file type. Upload .py or .zip")
+
@@ -0,0 +1,64 @@
+import asyncio
+import contextvars
+import os
+import threading
+from typing import Awaitable, Optional, TypeVar
+
+from .database import dispose_engine, get_engine
+from .runner import close_runner_client
+from .toolevents import close_event_publisher
+
+T = TypeVar("T")
+
+
+class WorkerRuntime:
+    """A long-lived event loop, engine, runner client and event publisher for one Celery worker process.
+
+    The loop runs in a background thread and tasks submit coroutines to it, so
+    the same runtime serves prefork children (one task at a time) and the
+    ``threads`` pool, where many I/O-bound tasks share one loop concurrently.
+    """
+
+    def __init__(self) -> None:
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        with self._lock:
+            if self.loop is not None and self._pid == os.getpid():
+                return
+            self.loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self.loop.run_forever, name="worker-loop", daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+        get_engine()
+
+    def run(self, coro: Awaitable[T]) -> T:
+        self.start()
+        # The task's context variables (e.g. its trace) follow the coroutine onto the loop thread.
+        context = contextvars.copy_context()
+        return asyncio.run_coroutine_threadsafe(self._in_context(coro, context), self.loop).result()
+
+    @staticmethod
+    async def _in_context(coro: Awaitable[T], context: contextvars.Context) -> T:
+        return await asyncio.get_running_loop().create_task(coro, context=context)
+
+    def stop(self) -> None:
+        with self._lock:
+            if self.loop is None or self._pid != os.getpid():
+                return
+            loop, self.loop = self.loop, None
+        asyncio.run_coroutine_threadsafe(self._shutdown(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        self._thread.join()
+        loop.close()
+
+    async def _shutdown(self) -> None:
+        await close_runner_client()
+        await close_event_publisher()
+        await dispose_engine()
+
+
+runtime = WorkerRuntime()
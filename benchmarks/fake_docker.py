@@ -0,0 +1,368 @@
+"""In-memory stand-in for the docker SDK, so several runners can share one machine without Docker.
+
+``services.py`` installs it in place of ``docker.from_env`` before importing
+the runner. Containers are not real processes: each one answers Streamlit's
+health check from a small HTTP server bound to its own loopback address
+(``127.x.y.z:8501``), which is enough for the runner's build, lifecycle,
+routing and placement code to run unchanged. Loopback addresses beyond
+127.0.0.1 need Linux. ``SHEETIFY_FAKE_BUILD_SECONDS`` and
+``SHEETIFY_FAKE_BOOT_SECONDS`` add the latency of each image build and of
+Streamlit's startup.
+"""
+import hashlib
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from docker import errors as docker_errors
+
+FAKE_CPUS = float(os.getenv("SHEETIFY_FAKE_CPUS", "4"))
+FAKE_MEMORY_MB = int(os.getenv("SHEETIFY_FAKE_MEMORY_MB", "8192"))
+FAKE_BUILD_SECONDS = float(os.getenv("SHEETIFY_FAKE_BUILD_SECONDS", "0"))
+FAKE_BOOT_SECONDS = float(os.getenv("SHEETIFY_FAKE_BOOT_SECONDS", "0"))
+FAKE_BASE_PACKAGES = [
+    {"name": "streamlit", "version": "1.32.2"},
+    {"name": "pandas", "version": "2.2.1"},
+    {"name": "numpy", "version": "1.26.4"},
+    {"name": "altair", "version": "5.2.0"},
+    {"name": "pyarrow", "version": "15.0.2"},
+]
+
+ExecResult = namedtuple("ExecResult", ["exit_code", "output"])
+
+
+class _HealthHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if time.monotonic() < self.server.ready_at:
+            # Still "booting": Streamlit's health check fails until it is up.
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+# The second octet comes from the pid so fake runners on one host rarely try the same addresses.
+_addresses = (f"127.{os.getpid() % 254 + 1}.{n // 254}.{n % 254 + 1}" for n in itertools.count())
+
+
+class FakeImage:
+    def __init__(self, images: "FakeImages", image_id: str, labels: Dict[str, str], size: int = 0) -> None:
+        self._images = images
+        self.id = image_id
+        self.labels = labels
+        self.tags: List[str] = []
+        self.size = size
+        self.created = int(time.time())
+
+    def tag(self, repository: str, tag: str) -> bool:
+        self._images.register(f"{repository}:{tag}", self)
+        return True
+
+
+class FakeContainer:
+    def __init__(
+        self,
+        client: "FakeDockerClient",
+        name: str,
+        image: FakeImage,
+        labels: Dict[str, str],
+        network: str,
+        limits: Optional[dict] = None,
+    ):
+        self.client = client
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.image = image
+        self.labels = dict(image.labels, **labels)
+        self.status = "created"
+        self.network = network or "bridge"
+        self.files: Dict[str, bytes] = {}
+        self.limits: dict = {}
+        self.exit_code = 0
+        self.update(**(limits or {}))
+        self._address: Optional[str] = None
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def attrs(self) -> dict:
+        return {
+            "State": {"Status": self.status, "ExitCode": self.exit_code, "OOMKilled": False},
+            "NetworkSettings": {"Networks": {self.network: {"IPAddress": self._address or ""}}},
+            "HostConfig": {
+                "CpuPeriod": self.limits.get("cpu_period", 0),
+                "CpuQuota": self.limits.get("cpu_quota", 0),
+                "Memory": self.limits.get("mem_limit", 0),
+                "PidsLimit": self.limits.get("pids_limit", 0),
+            },
+        }
+
+    def update(self, **kwargs) -> dict:
+        self.limits.update((key, value) for key, value in kwargs.items() if value is not None)
+        return {"Warnings": []}
+
+    def reload(self) -> None:
+        if self.id not in self.client.containers._by_id:
+            raise docker_errors.NotFound(f"No such container: {self.id}")
+
+    def start(self) -> None:
+        if self.status == "running":
+            return
+        while True:
+            address = self._address or next(_addresses)
+            try:
+                self._server = ThreadingHTTPServer((address, 8501), _HealthHandler)
+                break
+            except OSError:
+                self._address = None
+        self._address = address
+        self._server.ready_at = time.monotonic() + FAKE_BOOT_SECONDS
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        self.status = "running"
+
+    def stop(self, timeout: int = 10) -> None:
+        self._exit(0)
+
+    def kill(self, signal: str = "SIGKILL") -> None:
+        """Simulate a crash: the runner sees a ``die`` event it did not ask for."""
+        self._exit(137)
+
+    def _exit(self, exit_code: int) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self.status == "running":
+            self.exit_code = exit_code
+            attributes = {"name": self.name, "exitCode": str(exit_code)}
+            self.client.emit({"Type": "container", "Action": "die", "Actor": {"ID": self.id, "Attributes": attributes}})
+        self.status = "exited"
+
+    def remove(self, force: bool = False) -> None:
+        if self.status == "running" and not force:
+            raise docker_errors.APIError(f"Container {self.name} is running")
+        self.stop()
+        self.client.containers._by_id.pop(self.id, None)
+
+    def rename(self, name: str) -> None:
+        self.name = name
+
+    def put_archive(self, path: str, data: bytes) -> bool:
+        self.files[path] = data
+        return True
+
+    def exec_run(self, cmd, **kwargs) -> ExecResult:
+        return ExecResult(0, b"")
+
+    def stats(self, stream: bool = False, one_shot: bool = False) -> dict:
+        return {"cpu_stats": {"cpu_usage": {"total_usage": 0}}, "networks": {"eth0": {"rx_bytes": 0, "tx_bytes": 0}}}
+
+    def logs(self, stream: bool = False, **kwargs):
+        return iter(()) if stream else b""
+
+
+class FakeContainers:
+    def __init__(self, client: "FakeDockerClient") -> None:
+        self.client = client
+        self._by_id: Dict[str, FakeContainer] = {}
+        self._lock = threading.Lock()
+
+    def run(self, image, command=None, name=None, detach=False, labels=None, network=None, remove=False, **kwargs):
+        for volume in kwargs.get("volumes") or {}:
+            self.client.volumes.get_or_create(volume)
+        if not detach:
+            # Foreground commands list the base image's packages (warm pool) or sweep a tool cache volume.
+            if kwargs.get("volumes"):
+                return json.dumps({"bytes": 0, "files": 0, "evicted_files": 0, "evicted_bytes": 0}).encode()
+            return json.dumps(FAKE_BASE_PACKAGES).encode() if command and "list" in command else b""
+        with self._lock:
+            if name and any(container.name == name for container in self._by_id.values()):
+                raise docker_errors.APIError(f"Conflict: container name {name} is already in use")
+            container = FakeContainer(
+                self.client,
+                name or uuid.uuid4().hex[:12],
+                self.client.images.get(image),
+                labels or {},
+                network,
+                {key: kwargs[key] for key in ("cpu_period", "cpu_quota", "mem_limit", "pids_limit") if key in kwargs},
+            )
+            self._by_id[container.id] = container
+        container.start()
+        return container
+
+    def get(self, container_id: str) -> FakeContainer:
+        for container in list(self._by_id.values()):
+            if container.id == container_id or container.name == container_id:
+                return container
+        raise docker_errors.NotFound(f"No such container: {container_id}")
+
+    def list(self, all: bool = False, filters: Optional[dict] = None) -> List[FakeContainer]:
+        filters = filters or {}
+        found = []
+        for container in list(self._by_id.values()):
+            if not all and container.status != "running":
+                continue
+            if "status" in filters and container.status != filters["status"]:
+                continue
+            if "name" in filters and filters["name"] not in container.name:
+                continue
+            if "label" in filters:
+                key, _, value = filters["label"].partition("=")
+                if key not in container.labels or (value and container.labels[key] != value):
+                    continue
+            found.append(container)
+        return found
+
+
+class FakeImages:
+    def __init__(self) -> None:
+        self._by_ref: Dict[str, FakeImage] = {}
+
+    def register(self, ref: str, image: FakeImage) -> None:
+        if ":" not in ref:
+            ref += ":latest"
+        previous = self._by_ref.get(ref)
+        if previous is not None and ref in previous.tags:
+            previous.tags.remove(ref)
+        self._by_ref[ref] = image
+        image.tags.append(ref)
+
+    def get(self, ref) -> FakeImage:
+        if isinstance(ref, FakeImage):
+            return ref
+        image = self._by_ref.get(ref if ":" in ref else f"{ref}:latest")
+        if image is None:
+            image = next((image for image in self._by_ref.values() if image.id == ref), None)
+        if image is None:
+            raise docker_errors.ImageNotFound(f"No such image: {ref}")
+        return image
+
+    def list(self, **kwargs) -> List[FakeImage]:
+        return list({image.id: image for image in self._by_ref.values()}.values())
+
+    def remove(self, image: str, force: bool = False, **kwargs) -> None:
+        target = self.get(image)
+        ref = image if ":" in image else f"{image}:latest"
+        # Like Docker, removing one of several tags only untags the image.
+        refs = [ref] if ref in target.tags and len(target.tags) > 1 else list(target.tags)
+        for ref in refs:
+            self._by_ref.pop(ref, None)
+            target.tags.remove(ref)
+
+    def prune(self, filters: Optional[dict] = None) -> dict:
+        # Untagged fake images are unreachable already, so there is never anything to prune.
+        return {"ImagesDeleted": None, "SpaceReclaimed": 0}
+
+
+class FakeVolume:
+    def __init__(self, volumes: "FakeVolumes", name: str, labels: Dict[str, str]) -> None:
+        self._volumes = volumes
+        self.name = name
+        self.id = name
+        self.attrs = {"Name": name, "Labels": labels, "CreatedAt": time.strftime("%Y-%m-%dT%H:%M:%SZ")}
+
+    def remove(self, force: bool = False) -> None:
+        self._volumes._by_name.pop(self.name, None)
+
+
+class FakeVolumes:
+    def __init__(self) -> None:
+        self._by_name: Dict[str, FakeVolume] = {}
+
+    def create(self, name: str, labels: Optional[Dict[str, str]] = None, **kwargs) -> FakeVolume:
+        volume = FakeVolume(self, name, dict(labels or {}))
+        self._by_name[name] = volume
+        return volume
+
+    def get(self, name: str) -> FakeVolume:
+        try:
+            return self._by_name[name]
+        except KeyError:
+            raise docker_errors.NotFound(f"No such volume: {name}")
+
+    def get_or_create(self, name: str) -> FakeVolume:
+        # Like Docker, mounting a named volume that does not exist creates it, unlabelled.
+        return self._by_name.get(name) or self.create(name)
+
+    def list(self, filters: Optional[dict] = None) -> List[FakeVolume]:
+        key, _, value = ((filters or {}).get("label") or "").partition("=")
+        return [
+            volume
+            for volume in list(self._by_name.values())
+            if not key or (key in volume.attrs["Labels"] and (not value or volume.attrs["Labels"][key] == value))
+        ]
+
+
+class FakeAPI:
+    def __init__(self, images: FakeImages) -> None:
+        self.images = images
+
+    def build(self, path: str, tag: str, labels: Optional[Dict[str, str]] = None, **kwargs) -> Iterator[dict]:
+        digest = hashlib.sha256()
+        size = 0
+        for file in sorted(Path(path).rglob("*")):
+            if file.is_file():
+                digest.update(str(file.relative_to(path)).encode())
+                digest.update(file.read_bytes())
+                size += file.stat().st_size
+        yield {"stream": f"Step 1/1 : fake build of {tag}\n"}
+        time.sleep(FAKE_BUILD_SECONDS)
+        image = FakeImage(self.images, f"sha256:{digest.hexdigest()}", dict(labels or {}), size)
+        self.images.register(tag, image)
+        yield {"stream": f"Successfully tagged {tag}\n"}
+
+
+class FakeDockerClient:
+    def __init__(self, base_image: str) -> None:
+        self.images = FakeImages()
+        base_id = f"sha256:{hashlib.sha256(base_image.encode()).hexdigest()}"
+        self.images.register(base_image, FakeImage(self.images, base_id, {}))
+        self.containers = FakeContainers(self)
+        self.volumes = FakeVolumes()
+        self.api = FakeAPI(self.images)
+        self._events: "queue.Queue[dict]" = queue.Queue()
+
+    def emit(self, event: dict) -> None:
+        self._events.put(event)
+
+    def events(self, decode: bool = False, filters: Optional[dict] = None) -> Iterator[dict]:
+        while True:
+            yield self._events.get()
+
+    def df(self) -> dict:
+        images = self.images.list()
+        in_use = [container.image.id for container in self.containers.list(all=True)]
+        return {
+            "LayersSize": sum(image.size for image in images),
+            "Images": [
+                {
+                    "Id": image.id,
+                    "RepoTags": list(image.tags),
+                    "Created": image.created,
+                    "Size": image.size,
+                    "SharedSize": 0,
+                    "Containers": in_use.count(image.id),
+                }
+                for image in images
+            ],
+        }
+
+    def info(self) -> dict:
+        return {"NCPU": FAKE_CPUS, "MemTotal": FAKE_MEMORY_MB * 1024 * 1024}
+
+    def ping(self) -> bool:
+        return True
@@ -0,0 +1,358 @@
+"""Load scenarios and latency bookkeeping for the benchmark.
+
+Every request is labelled ``METHOD /route/template``, the same label the API
+uses for its query counts, so client latencies and server statement counts
+join per endpoint. Lifecycle operations that span several requests (a build
+from ``POST /build`` until it succeeds, say) are recorded under their own
+``... (end-to-end)`` labels.
+"""
+import asyncio
+import io
+import itertools
+import math
+import time
+import zipfile
+from collections import Counter, defaultdict
+from typing import Callable, Dict, List, Optional, Sequence
+
+import httpx
+
+PASSWORD = "bench-password"
+
+
+def percentile(samples: Sequence[float], fraction: float) -> float:
+    """Nearest-rank percentile of ``samples``."""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class Recorder:
+    """Latencies and failures per label for one scenario."""
+
+    def __init__(self) -> None:
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Counter = Counter()
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)
+
+    def add(self, label: str, seconds: float, ok: bool = True, status: Optional[int] = None) -> None:
+        self.latencies[label].append(seconds)
+        if status is not None:
+            self.statuses[label][status] += 1
+        if not ok:
+            self.errors[label] += 1
+
+    def summary(self, elapsed: float, server: Dict[str, dict]) -> Dict[str, dict]:
+        endpoints = {}
+        for label, samples in sorted(self.latencies.items()):
+            stats = server.get(label)
+            endpoints[label] = {
+                "count": len(samples),
+                "errors": self.errors[label],
+                "throughput": len(samples) / elapsed if elapsed else 0.0,
+                "p50_ms": percentile(samples, 0.5) * 1000,
+                "p99_ms": percentile(samples, 0.99) * 1000,
+                "statuses": {str(status): count for status, count in sorted(self.statuses[label].items())},
+                "queries_per_request": stats["queries"] / stats["requests"] if stats and stats["requests"] else None,
+            }
+        return endpoints
+
+
+class Client:
+    """An API client that times every call into the current ``recorder``."""
+
+    def __init__(self, base_url: str) -> None:
+        self.http = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=httpx.Timeout(120.0),
+            limits=httpx.Limits(max_connections=1000, max_keepalive_connections=1000),
+        )
+        self.recorder = Recorder()
+        self.token: Optional[str] = None
+
+    async def call(
+        self,
+        method: str,
+        template: str,
+        *,
+        path_params: Optional[dict] = None,
+        expect: Sequence[int] = (200,),
+        auth: bool = True,
+        **kwargs,
+    ) -> Optional[httpx.Response]:
+        headers = dict(kwargs.pop("headers", {}))
+        if auth and self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        label = f"{method} {template}"
+        started = time.perf_counter()
+        try:
+            resp = await self.http.request(method, template.format(**(path_params or {})), headers=headers, **kwargs)
+        except httpx.HTTPError:
+            self.recorder.add(label, time.perf_counter() - started, ok=False)
+            return None
+        self.recorder.add(label, time.perf_counter() - started, resp.status_code in expect, resp.status_code)
+        return resp
+
+    async def register(self, email: str) -> None:
+        await self.call("POST", "/v1/auth/register", json={"email": email, "password": PASSWORD}, auth=False)
+
+    async def login(self, email: str) -> Optional[str]:
+        resp = await self.call("POST", "/v1/auth/token", data={"username": email, "password": PASSWORD}, auth=False)
+        return resp.json()["access_token"] if resp is not None and resp.status_code == 200 else None
+
+    async def create_tool(self, name: str) -> int:
+        resp = await self.call("POST", "/v1/tools", json={"name": name, "description": "Benchmark tool"})
+        if resp is None or resp.status_code != 200:
+            raise RuntimeError(f"Could not create tool {name}: {resp.text if resp is not None else 'no response'}")
+        return resp.json()["id"]
+
+    async def upload(self, tool_id: int, filename: str, content: bytes) -> Optional[int]:
+        resp = await self.call(
+            "POST",
+            "/v1/tools/{tool_id}/versions",
+            path_params={"tool_id": tool_id},
+            files={"file": (filename, content)},
+        )
+        return resp.json()["version_id"] if resp is not None and resp.status_code == 200 else None
+
+    async def aclose(self) -> None:
+        await self.http.aclose()
+
+
+def app_source(tag: str) -> bytes:
+    return (
+        "import pandas as pd\n"
+        "import streamlit as st\n\n"
+        f"st.title('Benchmark {tag}')\n"
+        "st.dataframe(pd.DataFrame({'x': range(100)}))\n"
+    ).encode("utf-8")
+
+
+def app_archive(tag: str, data_kb: int) -> bytes:
+    """A multi-file app: app.py, requirements.txt and a CSV of about ``data_kb`` KB."""
+    rows = ["date,item,qty,price"]
+    size = 0
+    for index in itertools.count():
+        if size >= data_kb * 1024:
+            break
+        rows.append(f"2024-01-{index % 28 + 1:02d},item-{index},{index % 97},{index * 0.37:.2f}")
+        size += len(rows[-1]) + 1
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("app.py", app_source(tag))
+        archive.writestr("requirements.txt", "streamlit\npandas\n")
+        # Stored uncompressed, so the archive stays well inside the upload's compression-ratio limit.
+        archive.writestr("data/sample.csv", "\n".join(rows) + "\n", compress_type=zipfile.ZIP_STORED)
+    return buffer.getvalue()
+
+
+class Scenario:
+    """One load pattern: ``setup`` is not measured, ``run`` is."""
+
+    name = ""
+
+    def __init__(self, client: Client) -> None:
+        self.client = client
+
+    async def setup(self) -> None:
+        pass
+
+    async def run(self) -> None:
+        raise NotImplementedError
+
+
+class Logins(Scenario):
+    """``total`` password logins spread over ``users`` accounts, ``concurrency`` at a time."""
+
+    name = "logins"
+
+    def __init__(self, client: Client, users: int, total: int, concurrency: int) -> None:
+        super().__init__(client)
+        self.emails = [f"bench-login-{index}@example.com" for index in range(users)]
+        self.total = total
+        self.concurrency = concurrency
+
+    async def setup(self) -> None:
+        await asyncio.gather(*(self.client.register(email) for email in self.emails))
+
+    async def run(self) -> None:
+        counter = itertools.count()
+
+        async def worker() -> None:
+            while (index := next(counter)) < self.total:
+                await self.client.login(self.emails[index % len(self.emails)])
+
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+
+
+class DetailPolling(Scenario):
+    """``concurrency`` dashboards polling tools with long histories for ``seconds``.
+
+    Even-numbered pollers revalidate with ``If-None-Match`` like a browser
+    cache, odd ones always fetch the full view; every fifth poll also pages
+    through the run history.
+    """
+
+    name = "polling"
+
+    def __init__(
+        self, client: Client, seed: Callable, tools: int, versions: int, runs: int, concurrency: int, seconds: float
+    ) -> None:
+        super().__init__(client)
+        self.seed = seed
+        self.tools = tools
+        self.versions = versions
+        self.runs = runs
+        self.concurrency = concurrency
+        self.seconds = seconds
+        self.tool_ids: List[int] = []
+
+    async def setup(self) -> None:
+        self.tool_ids = [await self.client.create_tool(f"history-{index}") for index in range(self.tools)]
+        await self.seed(self.tool_ids, self.versions, self.runs)
+
+    async def run(self) -> None:
+        deadline = time.monotonic() + self.seconds
+
+        async def poller(index: int) -> None:
+            tool_id = self.tool_ids[index % len(self.tool_ids)]
+            path_params = {"tool_id": tool_id}
+            etag = None
+            for poll in itertools.count(1):
+                if time.monotonic() >= deadline:
+                    return
+                headers = {"If-None-Match": etag} if etag and index % 2 == 0 else {}
+                resp = await self.client.call(
+                    "GET", "/v1/tools/{tool_id}", path_params=path_params, headers=headers, expect=(200, 304)
+                )
+                if resp is not None and resp.status_code == 200:
+                    etag = resp.headers.get("etag")
+                if poll % 5 == 0:
+                    params = {"limit": 50}
+                    for _ in range(3):
+                        resp = await self.client.call(
+                            "GET", "/v1/tools/{tool_id}/runs", path_params=path_params, params=params
+                        )
+                        if resp is None or resp.status_code != 200 or not resp.json()["next_cursor"]:
+                            break
+                        params["cursor"] = resp.json()["next_cursor"]
+
+        await asyncio.gather(*(poller(index) for index in range(self.concurrency)))
+
+
+class UploadBursts(Scenario):
+    """``bursts`` waves of ``size`` simultaneous uploads, alternating ``.py`` files and ``.zip`` apps."""
+
+    name = "uploads"
+
+    def __init__(self, client: Client, bursts: int, size: int, data_kb: int) -> None:
+        super().__init__(client)
+        self.bursts = bursts
+        self.size = size
+        self.data_kb = data_kb
+        self.tool_ids: List[int] = []
+
+    async def setup(self) -> None:
+        self.tool_ids = [await self.client.create_tool(f"upload-{index}") for index in range(self.size)]
+
+    async def run(self) -> None:
+        for burst in range(self.bursts):
+            uploads = []
+            for index, tool_id in enumerate(self.tool_ids):
+                tag = f"{burst}-{index}"
+                if index % 2:
+                    uploads.append(self.client.upload(tool_id, "app.zip", app_archive(tag, self.data_kb)))
+                else:
+                    uploads.append(self.client.upload(tool_id, "app.py", app_source(tag)))
+            await asyncio.gather(*uploads)
+
+
+class LifecycleStorm(Scenario):
+    """``tools`` tools each going through ``cycles`` of upload, build, run and stop at the same time.
+
+    Progress is watched by polling the tool detail view every ``poll_interval``
+    seconds, as the dashboard did before server-sent events.
+    """
+
+    name = "storm"
+
+    def __init__(self, client: Client, tools: int, cycles: int, poll_interval: float, timeout: float) -> None:
+        super().__init__(client)
+        self.tools = tools
+        self.cycles = cycles
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.tool_ids: List[int] = []
+
+    async def setup(self) -> None:
+        self.tool_ids = [await self.client.create_tool(f"storm-{index}") for index in range(self.tools)]
+
+    async def _until(self, label: str, tool_id: int, outcome: Callable[[dict], Optional[bool]]) -> bool:
+        """Poll the tool until ``outcome`` returns True (done) or False (failed); recorded under ``label``."""
+        started = time.perf_counter()
+        deadline = time.monotonic() + self.timeout
+        result = False
+        while time.monotonic() < deadline:
+            resp = await self.client.call("GET", "/v1/tools/{tool_id}", path_params={"tool_id": tool_id})
+            verdict = outcome(resp.json()) if resp is not None and resp.status_code == 200 else None
+            if verdict is not None:
+                result = verdict
+                break
+            await asyncio.sleep(self.poll_interval)
+        self.client.recorder.add(f"{label} (end-to-end)", time.perf_counter() - started, result)
+        return result
+
+    async def _lifecycle(self, tool_id: int) -> None:
+        path_params = {"tool_id": tool_id}
+        for cycle in range(self.cycles):
+            version_id = await self.client.upload(tool_id, "app.py", app_source(f"storm-{tool_id}-{cycle}"))
+            if version_id is None:
+                return
+
+            def built(tool: dict) -> Optional[bool]:
+                latest = tool["builds"][0] if tool["builds"] else None
+                if latest is None or latest["version_id"] != version_id:
+                    return None
+                if latest["status"] not in ("success", "failed"):
+                    return None
+                return latest["status"] == "success"
+
+            await self.client.call(
+                "POST", "/v1/tools/{tool_id}/build", path_params=path_params, json={"version_id": version_id}
+            )
+            if not await self._until("build", tool_id, built):
+                return
+            await self.client.call("POST", "/v1/tools/{tool_id}/run", path_params=path_params)
+            started = {"running": True, "error": False}
+            if not await self._until("run", tool_id, lambda tool: started.get(tool["status"])):
+                return
+            await self.client.call("POST", "/v1/tools/{tool_id}/stop", path_params=path_params)
+            if not await self._until("stop", tool_id, lambda tool: True if tool["status"] == "idle" else None):
+                return
+
+    async def run(self) -> None:
+        await asyncio.gather(*(self._lifecycle(tool_id) for tool_id in self.tool_ids))
+
+
+def format_report(results: Dict[str, dict], tasks: Dict[str, dict]) -> str:
+    lines = []
+    header = f"{'endpoint':<48} {'count':>7} {'errors':>6} {'req/s':>8} {'p50 ms':>9} {'p99 ms':>9} {'queries':>8}"
+    for name, result in results.items():
+        total = sum(endpoint["count"] for endpoint in result["endpoints"].values())
+        lines.append(f"== {name}: {result['seconds']:.1f}s, {total} samples ==")
+        lines.append(header)
+        for label, endpoint in result["endpoints"].items():
+            queries = "-" if endpoint["queries_per_request"] is None else f"{endpoint['queries_per_request']:.1f}"
+            lines.append(
+                f"{label:<48} {endpoint['count']:>7} {endpoint['errors']:>6} {endpoint['throughput']:>8.1f} "
+                f"{endpoint['p50_ms']:>9.1f} {endpoint['p99_ms']:>9.1f} {queries:>8}"
+            )
+        lines.append("")
+    if tasks:
+        lines.append("== Celery tasks ==")
+        lines.append(f"{'task':<48} {'count':>7} {'p50 ms':>9} {'p99 ms':>9} {'queries':>8}")
+        for name, task in sorted(tasks.items()):
+            lines.append(
+                f"{name:<48} {task['count']:>7} {task['p50_ms']:>9.1f} {task['p99_ms']:>9.1f} "
+                f"{task['queries_per_task']:>8.1f}"
+            )
+    return "\n".join(lines)
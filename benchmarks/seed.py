@@ -0,0 +1,77 @@
+"""Database setup for the benchmark: a fresh schema and long tool histories, written directly with the ORM.
+
+Imports the backend, so ``run.py`` puts ``backend/`` on ``sys.path`` and sets
+``DATABASE_URL`` before importing this module.
+"""
+import hashlib
+from typing import Sequence
+
+from sqlalchemy import update
+
+from app.database import AsyncSessionLocal, Base, get_engine
+from app.models import BuildStatus, RunStatus, Tool, ToolBuild, ToolReplica, ToolRun, ToolVersion
+
+_RUN_LOG = "Starting replica 1\nReplica 1 is healthy\nStopped by user\n" * 20
+
+
+def _digest(*parts) -> str:
+    return hashlib.sha256(repr(parts).encode("utf-8")).hexdigest()
+
+
+async def reset_database() -> None:
+    """Drop and recreate every table."""
+    async with get_engine().begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+
+async def seed_history(tool_ids: Sequence[int], versions: int, runs: int, replicas: int = 2) -> None:
+    """Give each tool ``versions`` versions with one successful build each and ``runs`` stopped runs."""
+    async with AsyncSessionLocal() as session:
+        for tool_id in tool_ids:
+            version_rows = [
+                ToolVersion(
+                    tool_id=tool_id,
+                    app_digest=_digest(tool_id, "app", index),
+                    requirements_digest=_digest("requirements"),
+                    metadata_={"files": ["app.py"]},
+                )
+                for index in range(versions)
+            ]
+            session.add_all(version_rows)
+            await session.flush()
+            builds = [
+                ToolBuild(
+                    version_id=version.id,
+                    status=BuildStatus.SUCCESS,
+                    image_ref=f"sheetify-tool-{tool_id}:v{version.id}",
+                    cache_status="partial",
+                    runner_job_id=f"seed-{version.id}",
+                    phase_timings={"queue": 0.1, "lock": 0.4, "app_image": 2.0, "total": 2.6},
+                )
+                for version in version_rows
+            ]
+            session.add_all(builds)
+            await session.flush()
+            session.add_all(
+                ToolRun(
+                    tool_id=tool_id,
+                    build_id=builds[index % len(builds)].id,
+                    status=RunStatus.STOPPED,
+                    url=f"/t/{tool_id}",
+                    ready_seconds=1.5,
+                    phase_timings={"queue": 0.1, "start": 0.3, "boot": 1.2, "total": 1.6},
+                    logs=_RUN_LOG,
+                    replicas=[
+                        ToolReplica(replica=replica, status=RunStatus.STOPPED, start_mode="cold", startup_seconds=1.2)
+                        for replica in range(1, replicas + 1)
+                    ],
+                )
+                for index in range(runs)
+            )
+            await session.execute(
+                update(Tool)
+                .where(Tool.id == tool_id)
+                .values(current_image_ref=builds[-1].image_ref, current_version_id=version_rows[-1].id)
+            )
+            await session.commit()
@@ -0,0 +1,249 @@
+"""The Sheetify services as the benchmark runs them: ``python services.py api|worker|runner [options]``.
+
+Each role is the production code with instrumentation around it, configured
+by the environment ``run.py`` builds:
+
+* ``api`` serves ``backend/app/main.py`` and counts the SQL statements each
+  request executes, per route template, served at ``/__bench__/stats``.
+* ``worker`` is a Celery worker for ``backend/app/tasks.py``; it counts
+  statements and wall time per task and writes them to ``BENCH_STATS_DIR``
+  when it shuts down.
+* ``runner`` serves ``runner/service.py`` on the fake Docker client
+  (``fake_docker.py``). pip is
+  simulated too: resolving a lock takes ``BENCH_RESOLVE_SECONDS`` and the
+  first wheel download for a requirements set ``BENCH_PIP_SECONDS``.
+
+With the default ``filesystem://`` broker, messages are files under
+``BENCH_BROKER_DIR``, so the suite needs neither Redis nor Docker.
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+
+_queries: ContextVar[Optional[List[int]]] = ContextVar("bench_queries", default=None)
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany) -> None:
+    counter = _queries.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+def _count_queries() -> None:
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    # SQLAlchemy runs async statements in a greenlet that inherits the caller's context.
+    event.listen(Engine, "before_cursor_execute", _count_query)
+
+
+def _configure_broker(celery_app) -> None:
+    if not celery_app.conf.broker_url.startswith("filesystem"):
+        return
+    folder = Path(os.environ["BENCH_BROKER_DIR"])
+    (folder / "processed").mkdir(parents=True, exist_ok=True)
+    celery_app.conf.broker_transport_options = {
+        "data_folder_in": str(folder),
+        "data_folder_out": str(folder),
+        "processed_folder": str(folder / "processed"),
+        # Exchange tables, which otherwise land in the working directory.
+        "control_folder": str(folder / "control"),
+        "store_processed": False,
+        "polling_interval": 0.05,
+    }
+
+
+class QueryStats:
+    """Requests, SQL statements and server seconds per ``METHOD /route/template``; ``?reset=1`` clears them."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+        self.endpoints: Dict[str, Dict[str, float]] = defaultdict(lambda: {"requests": 0, "queries": 0, "seconds": 0.0})
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if scope["path"] == "/__bench__/stats":
+            await self._serve(scope, send)
+            return
+        counter = [0]
+        token = _queries.set(counter)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _queries.reset(token)
+            route = scope.get("route")
+            stats = self.endpoints[f"{scope['method']} {route.path if route else 'unmatched'}"]
+            stats["requests"] += 1
+            stats["queries"] += counter[0]
+            stats["seconds"] += time.perf_counter() - started
+
+    async def _serve(self, scope, send) -> None:
+        body = json.dumps(self.endpoints).encode("utf-8")
+        if b"reset=1" in scope.get("query_string", b""):
+            self.endpoints.clear()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+
+def serve_api(port: int) -> None:
+    import uvicorn
+
+    sys.path.insert(0, str(ROOT / "backend"))
+    from app.main import app
+    from app.tasks import celery_app
+
+    _configure_broker(celery_app)
+    _count_queries()
+    uvicorn.run(QueryStats(app), host="127.0.0.1", port=port, log_level="warning")
+
+
+def serve_worker(argv: List[str]) -> None:
+    sys.path.insert(0, str(ROOT / "backend"))
+    from celery.signals import task_postrun, task_prerun, worker_process_shutdown, worker_shutdown
+
+    from app.tasks import celery_app
+
+    _configure_broker(celery_app)
+    _count_queries()
+    tasks: Dict[str, Dict[str, list]] = defaultdict(lambda: {"seconds": [], "queries": []})
+    started: Dict[str, tuple] = {}
+    lock = threading.Lock()
+
+    @task_prerun.connect(weak=False)
+    def _task_started(task_id=None, **_) -> None:
+        counter = [0]
+        # WorkerRuntime.run copies this context onto its event loop, so the task's statements land in ``counter``.
+        _queries.set(counter)
+        started[task_id] = (time.perf_counter(), counter)
+
+    @task_postrun.connect(weak=False)
+    def _task_finished(task_id=None, task=None, **_) -> None:
+        began, counter = started.pop(task_id, (None, None))
+        _queries.set(None)
+        if began is not None:
+            with lock:
+                tasks[task.name]["seconds"].append(time.perf_counter() - began)
+                tasks[task.name]["queries"].append(counter[0])
+
+    @worker_process_shutdown.connect(weak=False)
+    @worker_shutdown.connect(weak=False)
+    def _write_stats(**_) -> None:
+        with lock:
+            if not tasks:
+                return
+            folder = Path(os.environ["BENCH_STATS_DIR"])
+            folder.mkdir(parents=True, exist_ok=True)
+            (folder / f"worker-{os.getpid()}.json").write_text(json.dumps(tasks))
+
+    celery_app.worker_main(
+        ["worker", "--loglevel=WARNING", "--without-gossip", "--without-mingle", "--without-heartbeat", *argv]
+    )
+
+
+def _simulated_resolve_lock(seconds: float):
+    from packaging.requirements import Requirement
+    from packaging.utils import canonicalize_name
+
+    from resolver import environment
+
+    markers = {
+        "python_full_version": platform.python_version(),
+        "implementation_name": sys.implementation.name,
+        "sys_platform": sys.platform,
+        "platform_machine": platform.machine(),
+    }
+
+    def resolve_lock(requirements_txt: str, sandbox=None, base_packages: Optional[Dict[str, str]] = None) -> dict:
+        time.sleep(seconds)
+        pins = {}
+        for line in requirements_txt.splitlines():
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            requirement = Requirement(line)
+            name = canonicalize_name(requirement.name)
+            pinned = [spec.version for spec in requirement.specifier if spec.operator == "=="]
+            pins[name] = pinned[0] if pinned else (base_packages or {}).get(name, "1.0.0")
+        return {
+            "lock": "".join(f"{name}=={version}\n" for name, version in sorted(pins.items())),
+            "packages": len(pins),
+            "base_constrained": bool(base_packages),
+            "environment": environment(markers),
+        }
+
+    return resolve_lock
+
+
+def serve_runner(port: int) -> None:
+    import uvicorn
+
+    sys.path.insert(0, str(ROOT / "runner"))
+    from wheelhouse import WHEELHOUSE_DIR, Wheelhouse
+
+    class SimulatedWheelhouse(Wheelhouse):
+        """Downloads nothing: the first resolve of a requirements set takes ``seconds``, later ones are hits."""
+
+        def __init__(self, seconds: float) -> None:
+            super().__init__(WHEELHOUSE_DIR, 0)
+            self.seconds = seconds
+            self._resolved = set()
+
+        def resolve(self, requirements_txt: str, sandbox=None):
+            key = hashlib.sha256(requirements_txt.encode("utf-8")).hexdigest()
+            with self._lock_for(key):
+                if key in self._resolved:
+                    yield "Wheelhouse hit: 0 cached wheels"
+                    return []
+                yield f"Downloading wheels for {len(requirements_txt.splitlines())} requirement(s) (simulated)"
+                time.sleep(self.seconds)
+                self._resolved.add(key)
+            return []
+
+    import docker
+
+    from fake_docker import FakeDockerClient
+
+    # The runner creates its client at import.
+    docker.from_env = lambda **_: FakeDockerClient(os.getenv("SHEETIFY_BASE_IMAGE", "sheetify-base:latest"))
+    import service
+
+    service.wheelhouse = SimulatedWheelhouse(float(os.getenv("BENCH_PIP_SECONDS", "0")))
+    service.resolve_lock = _simulated_resolve_lock(float(os.getenv("BENCH_RESOLVE_SECONDS", "0")))
+    uvicorn.run(service.app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("role", choices=["api", "worker", "runner"])
+    parser.add_argument("--port", type=int, default=0)
+    args, rest = parser.parse_known_args()
+    if args.role == "api":
+        serve_api(args.port)
+    elif args.role == "worker":
+        serve_worker(rest)
+    else:
+        serve_runner(args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import api from './api';
+
+export interface ServerEvent {
+  event: string;
+  id?: string;
+  data: any;
+}
+
+// EventSource cannot send an Authorization header, so server-sent events are read from a fetch stream.
+export async function streamEvents(
+  path: string,
+  token: string,
+  onEvent: (event: ServerEvent) => void,
+  signal: AbortSignal
+) {
+  const resp = await fetch(`${api.defaults.baseURL}${path}`, {
+    headers: { Authorization: `Bearer ${token}`, Accept: 'text/event-stream' },
+    signal
+  });
+  if (!resp.ok || !resp.body) {
+    throw new Error(`Event stream failed with status ${resp.status}`);
+  }
+  const reader = resp.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    const blocks = buffer.split('\n\n');
+    buffer = blocks.pop() ?? '';
+    for (const block of blocks) {
+      const parsed: ServerEvent = { event: 'message', data: null };
+      for (const line of block.split('\n')) {
+        if (line.startsWith('event: ')) parsed.event = line.slice(7);
+        else if (line.startsWith('id: ')) parsed.id = line.slice(4);
+        else if (line.startsWith('data: ')) parsed.data = JSON.parse(line.slice(6));
+      }
+      onEvent(parsed);
+    }
+  }
+}
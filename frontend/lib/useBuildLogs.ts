@@ -0,0 +1,26 @@
+import { useEffect, useState } from 'react';
+import { streamEvents } from './sse';
+
+const MAX_LOG_CHARS = 200_000;
+
+export function useBuildLogs(toolId?: string, buildId?: number, token?: string | null) {
+  const [logs, setLogs] = useState('');
+
+  useEffect(() => {
+    if (!toolId || !buildId || !token) return;
+    setLogs('');
+    const controller = new AbortController();
+    streamEvents(
+      `/v1/tools/${toolId}/builds/${buildId}/logs?follow=true`,
+      token,
+      (event) => {
+        if (event.event !== 'message') return;
+        setLogs((current) => (current + event.data.text + '\n').slice(-MAX_LOG_CHARS));
+      },
+      controller.signal
+    ).catch(() => undefined);
+    return () => controller.abort();
+  }, [toolId, buildId, token]);
+
+  return logs;
+}
@@ -0,0 +1,42 @@
+import { useEffect, useRef } from 'react';
+import { ServerEvent, streamEvents } from './sse';
+
+const RECONNECT_DELAY_MS = 3000;
+
+export interface ToolEvent {
+  kind: 'resync' | 'build' | 'run' | 'replicas' | 'tool';
+  tool_id?: number;
+  id?: number;
+  status?: string;
+  tool_status?: string;
+  ready_seconds?: number;
+}
+
+// Follows a tool's status events, reconnecting whenever the stream drops. The server opens every stream with a resync.
+export function useToolEvents(toolId: string | undefined, token: string | null | undefined, onEvent: (event: ToolEvent) => void) {
+  const handler = useRef(onEvent);
+  handler.current = onEvent;
+
+  useEffect(() => {
+    if (!toolId || !token) return;
+    const controller = new AbortController();
+    const follow = async () => {
+      while (!controller.signal.aborted) {
+        try {
+          await streamEvents(
+            `/v1/tools/${toolId}/events`,
+            token,
+            (event: ServerEvent) => event.data && handler.current(event.data as ToolEvent),
+            controller.signal
+          );
+        } catch {
+          // Reconnect below unless the page went away.
+        }
+        if (controller.signal.aborted) return;
+        await new Promise((resolve) => setTimeout(resolve, RECONNECT_DELAY_MS));
+      }
+    };
+    follow();
+    return () => controller.abort();
+  }, [toolId, token]);
+}
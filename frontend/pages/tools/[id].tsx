@@ -4,26 +4,41 @@ import useSWR from 'swr';
 import { useMemo, useState } from 'react';
 import api from '../../lib/api';
 import { useAuth } from '../../components/AuthContext';
+import { useBuildLogs } from '../../lib/useBuildLogs';
+import { useToolEvents } from '../../lib/useToolEvents';
 
 interface Build {
   id: number;
+  version_id: number;
   status: string;
-  logs?: string;
   image_ref?: string;
+  cache_status?: string;
+  phase_timings?: Record<string, number>;
   created_at: string;
 }
 
+interface Replica {
+  replica: number;
+  container_id?: string;
+  status: string;
+  start_mode?: string;
+  startup_seconds?: number;
+}
+
 interface Run {
   id: number;
+  build_id: number;
   status: string;
   url?: string;
-  logs?: string;
+  ready_seconds?: number;
+  phase_timings?: Record<string, number>;
+  replicas: Replica[];
+  created_at: string;
 }
 
 interface Version {
   id: number;
   created_at: string;
-  builds: Build[];
 }
 
 interface ToolDetail {
@@ -32,7 +47,10 @@ interface ToolDetail {
   description?: string;
   status: string;
   current_image_ref?: string;
+  min_replicas: number;
+  max_replicas: number;
   versions: Version[];
+  builds: Build[];
   runs: Run[];
 }
 
@@ -43,11 +61,17 @@ const fetcher = async (url: string, token: string) => {
   return data;
 };
 
+const formatPhases = (phases: Record<string, number>) =>
+  Object.entries(phases)
+    .map(([phase, seconds]) => `${phase} ${seconds.toFixed(1)}s`)
+    .join(', ');
+
 export default function ToolDetailPage() {
   const router = useRouter();
   const { id } = router.query as { id?: string };
   const { token } = useAuth();
   const [busy, setBusy] = useState(false);
+  const [runLogs, setRunLogs] = useState<Record<number, string>>({});
 
   if (!token) {
     return (
@@ -59,8 +83,11 @@ export default function ToolDetailPage() {
     );
   }
 
-  const { data: tool, mutate } = useSWR(id && token ? [`/v1/tools/${id}`, token] : null, ([url, t]) => fetcher(url, t), {
-    refreshInterval: 4000
+  // Refetch when the server announces a status change instead of polling every few seconds.
+  const { data: tool, mutate } = useSWR(id && token ? [`/v1/tools/${id}`, token] : null, ([url, t]) => fetcher(url, t));
+
+  useToolEvents(id, token, () => {
+    mutate();
   });
 
   const latestVersion = useMemo(() => {
@@ -69,9 +96,11 @@ export default function ToolDetailPage() {
   }, [tool]);
 
   const latestBuild = useMemo(() => {
-    if (!latestVersion?.builds?.length) return undefined;
-    return [...latestVersion.builds].sort((a, b) => b.id - a.id)[0];
-  }, [latestVersion]);
+    if (!tool?.builds?.length) return undefined;
+    return [...tool.builds].sort((a, b) => b.id - a.id)[0];
+  }, [tool]);
+
+  const buildLogs = useBuildLogs(id, latestBuild?.id, token);
 
   const latestRun = useMemo(() => {
     if (!tool?.runs?.length) return undefined;
@@ -115,7 +144,26 @@ export default function ToolDetailPage() {
     }
   };
 
-  const shareUrl = latestRun?.url ? `${process.env.NEXT_PUBLIC_TOOL_HOST || 'http://localhost'}${latestRun.url}` : null;
+  const toggleRunLogs = async (runId: number) => {
+    if (!token || !id) return;
+    if (runId in runLogs) {
+      const { [runId]: _, ...rest } = runLogs;
+      setRunLogs(rest);
+      return;
+    }
+    const { data } = await api.get<string>(`/v1/tools/${id}/runs/${runId}/logs`, {
+      headers: { Authorization: `Bearer ${token}` },
+      responseType: 'text'
+    });
+    setRunLogs((current) => ({ ...current, [runId]: data }));
+  };
+
+  // Runs on a node with its own proxy carry an absolute URL; the rest are relative to the main one.
+  const shareUrl = latestRun?.url
+    ? /^https?:\/\//.test(latestRun.url)
+      ? latestRun.url
+      : `${process.env.NEXT_PUBLIC_TOOL_HOST || 'http://localhost'}${latestRun.url}`
+    : null;
 
   return (
     <main className="min-h-screen bg-slate-950 px-6 py-12 text-slate-100">
@@ -142,12 +190,14 @@ export default function ToolDetailPage() {
                 Queue build
               </button>
             </div>
-            <div className="mt-4 h-64 overflow-y-auto rounded-md border border-slate-800 bg-slate-950 p-4 text-sm font-mono">
-              {latestBuild?.logs ? latestBuild.logs : 'Build logs will appear here after the first build runs.'}
-            </div>
+            <pre className="mt-4 h-64 overflow-y-auto whitespace-pre-wrap rounded-md border border-slate-800 bg-slate-950 p-4 text-sm font-mono">
+              {buildLogs || 'Build logs will appear here after the first build runs.'}
+            </pre>
             {latestBuild && (
               <p className="mt-3 text-xs text-slate-400">
                 Build #{latestBuild.id} • Status: {latestBuild.status}
+                {latestBuild.cache_status && <> • Cache: {latestBuild.cache_status}</>}
+                {latestBuild.phase_timings && <> • {formatPhases(latestBuild.phase_timings)}</>}
               </p>
             )}
           </div>
@@ -190,11 +240,26 @@ export default function ToolDetailPage() {
                 <div key={run.id} className="rounded-md border border-slate-800 bg-slate-950 p-3 text-sm">
                   <div className="flex items-center justify-between">
                     <span className="font-semibold text-white">Run #{run.id}</span>
-                    <span className="rounded-full bg-slate-800 px-3 py-1 text-xs uppercase tracking-wide text-slate-300">
-                      {run.status}
-                    </span>
+                    <div className="flex items-center gap-3">
+                      <button onClick={() => toggleRunLogs(run.id)} className="text-xs text-indigo-300 hover:text-indigo-200">
+                        {run.id in runLogs ? 'Hide logs' : 'Logs'}
+                      </button>
+                      <span className="rounded-full bg-slate-800 px-3 py-1 text-xs uppercase tracking-wide text-slate-300">
+                        {run.status}
+                      </span>
+                    </div>
                   </div>
-                  {run.logs && <pre className="mt-2 whitespace-pre-wrap text-xs text-slate-400">{run.logs}</pre>}
+                  {run.replicas?.length > 0 && (
+                    <p className="mt-1 text-xs text-slate-400">
+                      {run.replicas.filter((replica) => replica.status === 'running').length} of {run.replicas.length}{' '}
+                      replicas running
+                      {run.ready_seconds != null && ` · ready in ${run.ready_seconds.toFixed(1)}s`}
+                      {run.phase_timings && ` · ${formatPhases(run.phase_timings)}`}
+                    </p>
+                  )}
+                  {run.id in runLogs && (
+                    <pre className="mt-2 whitespace-pre-wrap text-xs text-slate-400">{runLogs[run.id] || 'No logs.'}</pre>
+                  )}
                 </div>
               ))
             ) : (
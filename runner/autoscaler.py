@@ -0,0 +1,126 @@
+import logging
+import math
+import os
+import threading
+import time
+from typing import Callable, Dict, Tuple
+
+from containers import STREAMLIT_PORT, tool_containers
+from deployments import Deployment, DeploymentStore
+from metrics import AUTOSCALE_EVENTS
+
+AUTOSCALE_INTERVAL_SECONDS = int(os.getenv("RUNNER_AUTOSCALE_INTERVAL_SECONDS", "15"))
+AUTOSCALE_TARGET_CPU = float(os.getenv("RUNNER_AUTOSCALE_TARGET_CPU", "0.7"))
+AUTOSCALE_TARGET_SESSIONS = int(os.getenv("RUNNER_AUTOSCALE_TARGET_SESSIONS", "20"))
+AUTOSCALE_SCALE_DOWN_DELAY_SECONDS = int(os.getenv("RUNNER_AUTOSCALE_SCALE_DOWN_DELAY_SECONDS", "300"))
+
+logger = logging.getLogger(__name__)
+
+_TCP_ESTABLISHED = "01"
+
+
+def cpu_seconds(container) -> float:
+    stats = container.stats(stream=False, one_shot=True)
+    return stats["cpu_stats"]["cpu_usage"]["total_usage"] / 1e9
+
+
+def active_sessions(container) -> int:
+    """Established connections to Streamlit's port inside the container.
+
+    Each browser session holds one websocket open, so this tracks sessions
+    closely enough to size a deployment by.
+    """
+    result = container.exec_run(["cat", "/proc/net/tcp", "/proc/net/tcp6"])
+    if result.exit_code != 0:
+        return 0
+    port = f"{STREAMLIT_PORT:04X}"
+    sessions = 0
+    for line in result.output.decode().splitlines()[1:]:
+        fields = line.split()
+        if len(fields) > 3 and fields[1].endswith(f":{port}") and fields[3] == _TCP_ESTABLISHED:
+            sessions += 1
+    return sessions
+
+
+class Autoscaler(threading.Thread):
+    """Resizes running deployments between their min and max replicas.
+
+    A deployment wants enough replicas to keep each below the CPU and session
+    targets; Streamlit runs a script on one core, so CPU is measured in cores.
+    Scale-up is immediate, scale-down waits until the lower count has held for
+    the scale-down delay, so a brief lull does not cut sessions.
+    """
+
+    def __init__(
+        self,
+        client,
+        store: DeploymentStore,
+        scale: Callable[[int, int], None],
+        interval: int,
+        target_cpu: float,
+        target_sessions: int,
+        scale_down_delay: int,
+    ) -> None:
+        super().__init__(name="autoscaler", daemon=True)
+        self.client = client
+        self.store = store
+        self.scale = scale
+        self.interval = interval
+        self.target_cpu = target_cpu
+        self.target_sessions = target_sessions
+        self.scale_down_delay = scale_down_delay
+        self._cpu: Dict[str, Tuple[float, float]] = {}
+        self._low_since: Dict[int, float] = {}
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception:  # pragma: no cover
+                logger.exception("Autoscale sweep failed")
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def _cores(self, container) -> float:
+        now, used = time.monotonic(), cpu_seconds(container)
+        previous = self._cpu.get(container.id)
+        self._cpu[container.id] = (used, now)
+        if previous is None or now <= previous[1]:
+            return 0.0
+        return max(0.0, (used - previous[0]) / (now - previous[1]))
+
+    def desired_replicas(self, deployment: Deployment, containers) -> int:
+        if deployment.min_replicas >= deployment.max_replicas:
+            return deployment.min_replicas
+        cores = sum(self._cores(container) for container in containers)
+        sessions = sum(active_sessions(container) for container in containers)
+        wanted = max(math.ceil(cores / self.target_cpu), math.ceil(sessions / self.target_sessions), 1)
+        return deployment.clamp(wanted)
+
+    def sweep(self) -> None:
+        now = time.monotonic()
+        live = set()
+        for deployment in self.store.all():
+            containers = tool_containers(self.client, deployment.tool_id)
+            if not containers:
+                # Stopped or hibernated: nothing to size until it wakes.
+                self._low_since.pop(deployment.tool_id, None)
+                continue
+            live.update(container.id for container in containers)
+            desired, current = self.desired_replicas(deployment, containers), len(containers)
+            if desired > current:
+                self._low_since.pop(deployment.tool_id, None)
+                AUTOSCALE_EVENTS.labels("up").inc()
+                self.scale(deployment.tool_id, desired)
+            elif desired < current:
+                since = self._low_since.setdefault(deployment.tool_id, now)
+                if now - since >= self.scale_down_delay:
+                    self._low_since.pop(deployment.tool_id, None)
+                    AUTOSCALE_EVENTS.labels("down").inc()
+                    self.scale(deployment.tool_id, desired)
+            else:
+                self._low_since.pop(deployment.tool_id, None)
+        for container_id in set(self._cpu) - live:
+            del self._cpu[container_id]
@@ -6,4 +6,10 @@ iptables -F OUTPUT || true
 iptables -A OUTPUT -o lo -j ACCEPT || true
 iptables -A OUTPUT -m conntrack --ctstate ESTABLISHED,RELATED -j ACCEPT || true
 
+# The runner mounts the tool's persistent cache volume here; keep Streamlit's persist="disk" cache on it.
+if [ -n "${SHEETIFY_CACHE_DIR:-}" ]; then
+  mkdir -p "$SHEETIFY_CACHE_DIR/streamlit" "$HOME/.streamlit"
+  [ -e "$HOME/.streamlit/cache" ] || ln -s "$SHEETIFY_CACHE_DIR/streamlit" "$HOME/.streamlit/cache"
+fi
+
 exec "$@"
@@ -0,0 +1,45 @@
+"""Pre-boot a Streamlit process and wait for the runner to hand it an app.
+
+Pooled containers run this instead of ``streamlit run`` so the interpreter,
+Streamlit and its heavy dependencies are already imported when a tool is
+assigned. The runner copies the app into /workspace and then writes
+``launch.json``, which carries the flags ``streamlit run`` would have had.
+A restarted container finds the file already there and starts straight away.
+"""
+import json
+import time
+from pathlib import Path
+
+import altair  # noqa: F401
+import numpy  # noqa: F401
+import pandas  # noqa: F401
+import pyarrow  # noqa: F401
+import streamlit  # noqa: F401
+from streamlit.web import bootstrap
+
+WORKSPACE = Path("/workspace")
+LAUNCH_FILE = WORKSPACE / ".sheetify" / "launch.json"
+
+
+def wait_for_launch(poll_seconds: float = 0.05) -> dict:
+    while True:
+        try:
+            return json.loads(LAUNCH_FILE.read_text())
+        except (FileNotFoundError, ValueError):
+            # Missing, or caught mid-copy: look again shortly.
+            time.sleep(poll_seconds)
+
+
+def main() -> None:
+    launch = wait_for_launch()
+    flag_options = {
+        "server_headless": True,
+        "server_port": launch.get("port", 8501),
+        "server_baseUrlPath": launch["base_url_path"],
+    }
+    bootstrap.load_config_options(flag_options=flag_options)
+    bootstrap.run(str(WORKSPACE / launch.get("main", "app.py")), False, [], flag_options)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import hashlib
+import os
+import tempfile
+import zlib
+from pathlib import Path
+
+from controlplane import backend_http
+
+BLOB_CACHE_DIR = Path(os.getenv("SHEETIFY_BLOB_CACHE_DIR", "/var/lib/sheetify/blob-cache"))
+
+
+class BlobError(Exception):
+    pass
+
+
+class BlobCache:
+    """Local cache of the backend's content-addressed blobs.
+
+    Blobs are immutable, so a cached copy never needs revalidating; each fetch
+    is checked against its digest before it is cached.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+
+    def path_for(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest
+
+    def fetch(self, digest: str) -> Path:
+        path = self.path_for(digest)
+        if path.exists():
+            return path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        hasher = hashlib.sha256()
+        decompressor = zlib.decompressobj()
+        with tempfile.NamedTemporaryFile(dir=path.parent, delete=False) as tmp:
+            try:
+                with backend_http.stream("GET", f"/internal/blobs/{digest}") as resp:
+                    if resp.status_code != 200:
+                        raise BlobError(f"Blob {digest} unavailable: HTTP {resp.status_code}")
+                    for chunk in resp.iter_bytes():
+                        data = decompressor.decompress(chunk)
+                        hasher.update(data)
+                        tmp.write(data)
+                data = decompressor.flush()
+                hasher.update(data)
+                tmp.write(data)
+                if hasher.hexdigest() != digest:
+                    raise BlobError(f"Blob {digest} failed verification")
+            except BaseException:
+                os.unlink(tmp.name)
+                raise
+        os.replace(tmp.name, path)
+        return path
+
+    def read_text(self, digest: str) -> str:
+        return self.fetch(digest).read_text(encoding="utf-8")
+
+
+blobs = BlobCache(BLOB_CACHE_DIR)
@@ -0,0 +1,77 @@
+import io
+import tarfile
+import time
+from pathlib import PurePosixPath
+from typing import Dict, List, Optional, Tuple
+
+TOOL_CONTAINER_PREFIX = "sheetify-tool-"
+TOOL_PATH_PREFIX = "/t/"
+STREAMLIT_PORT = 8501
+
+
+def replica_container_name(tool_id: int, replica: int) -> str:
+    return f"{TOOL_CONTAINER_PREFIX}{tool_id}-{replica}"
+
+
+def tool_path(tool_id: int) -> str:
+    return f"{TOOL_PATH_PREFIX}{tool_id}"
+
+
+def parse_replica_name(name: str) -> Optional[Tuple[int, int]]:
+    """``(tool_id, replica)`` for a tool container name; ``None`` for anything else, e.g. pool containers.
+
+    Names rather than labels identify replicas because a pooled container is
+    only renamed to its tool when it is claimed.
+    """
+    if not name.startswith(TOOL_CONTAINER_PREFIX):
+        return None
+    tool_id, _, replica = name[len(TOOL_CONTAINER_PREFIX):].partition("-")
+    if not (tool_id.isdigit() and replica.isdigit()):
+        return None
+    return int(tool_id), int(replica)
+
+
+def tool_id_of(container) -> Optional[int]:
+    parsed = parse_replica_name(container.name)
+    return parsed[0] if parsed else None
+
+
+def replica_of(container) -> Optional[int]:
+    parsed = parse_replica_name(container.name)
+    return parsed[1] if parsed else None
+
+
+def tool_containers(client, tool_id: int, all: bool = False) -> List:
+    """Replica containers of one tool, ordered by replica number."""
+    containers = client.containers.list(all=all, filters={"name": f"{TOOL_CONTAINER_PREFIX}{tool_id}-"})
+    return sorted((c for c in containers if tool_id_of(c) == tool_id), key=replica_of)
+
+
+def container_address(container) -> str:
+    container.reload()
+    networks = container.attrs["NetworkSettings"]["Networks"]
+    return next(network["IPAddress"] for network in networks.values() if network.get("IPAddress"))
+
+
+# Hardening applied to every tool container, cold-started or pooled.
+CONTAINER_OPTIONS = {"security_opt": ["no-new-privileges"], "cap_drop": ["NET_RAW"]}
+
+
+def tar_files(files: Dict[str, str]) -> bytes:
+    """Pack text files into an in-memory tar for ``container.put_archive``."""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as archive:
+        directories = sorted({str(PurePosixPath(name).parent) for name in files} - {"."})
+        for directory in directories:
+            info = tarfile.TarInfo(directory)
+            info.type = tarfile.DIRTYPE
+            info.mode = 0o755
+            archive.addfile(info)
+        for name, content in files.items():
+            data = content.encode("utf-8")
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mode = 0o644
+            info.mtime = int(time.time())
+            archive.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
@@ -0,0 +1,28 @@
+import logging
+import os
+from typing import List
+
+import httpx
+
+BACKEND_URL = os.getenv("SHEETIFY_BACKEND_URL", "http://backend:8000")
+INTERNAL_TOKEN = os.getenv("SHEETIFY_INTERNAL_TOKEN", "internal-secret")
+
+logger = logging.getLogger(__name__)
+
+backend_http = httpx.Client(base_url=BACKEND_URL, headers={"X-Sheetify-Internal-Token": INTERNAL_TOKEN}, timeout=30)
+
+
+def report_tool_state(tool_id: int, state: str, **details) -> None:
+    """Tell the backend about a lifecycle change the runner made on its own (e.g. hibernation)."""
+    try:
+        backend_http.post(f"/internal/tools/{tool_id}/state", json={"state": state, **details}).raise_for_status()
+    except httpx.HTTPError as exc:
+        logger.warning("Could not report state %s for tool %s: %s", state, tool_id, exc)
+
+
+def report_replicas(tool_id: int, replicas: List[dict]) -> None:
+    """Tell the backend which replicas a tool is running after a scale change."""
+    try:
+        backend_http.post(f"/internal/tools/{tool_id}/replicas", json={"replicas": replicas}).raise_for_status()
+    except httpx.HTTPError as exc:
+        logger.warning("Could not report replicas for tool %s: %s", tool_id, exc)
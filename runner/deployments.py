@@ -0,0 +1,67 @@
+import json
+import os
+import threading
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+DEPLOYMENTS_DIR = Path(os.getenv("RUNNER_DEPLOYMENTS_DIR", "/var/lib/sheetify/deployments"))
+
+
+@dataclass
+class Deployment:
+    tool_id: int
+    image_ref: str
+    min_replicas: int = 1
+    max_replicas: int = 1
+    resources: dict = field(default_factory=dict)
+
+    def clamp(self, replicas: int) -> int:
+        return max(self.min_replicas, min(self.max_replicas, replicas))
+
+
+class DeploymentStore:
+    """What each deployed tool should run, kept on disk so it survives runner restarts.
+
+    Pooled replicas carry no image or scaling labels, so the containers alone
+    cannot say how to add another replica.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self._lock = threading.Lock()
+        self._cache: Optional[Dict[int, Deployment]] = None
+
+    def _load(self) -> Dict[int, Deployment]:
+        if self._cache is None:
+            self._cache = {}
+            if self.root.exists():
+                for path in self.root.glob("*.json"):
+                    deployment = Deployment(**json.loads(path.read_text()))
+                    self._cache[deployment.tool_id] = deployment
+        return self._cache
+
+    def get(self, tool_id: int) -> Optional[Deployment]:
+        with self._lock:
+            return self._load().get(tool_id)
+
+    def all(self) -> List[Deployment]:
+        with self._lock:
+            return list(self._load().values())
+
+    def put(self, deployment: Deployment) -> None:
+        with self._lock:
+            self.root.mkdir(parents=True, exist_ok=True)
+            path = self.root / f"{deployment.tool_id}.json"
+            tmp = path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(asdict(deployment)))
+            os.replace(tmp, path)
+            self._load()[deployment.tool_id] = deployment
+
+    def delete(self, tool_id: int) -> None:
+        with self._lock:
+            (self.root / f"{tool_id}.json").unlink(missing_ok=True)
+            self._load().pop(tool_id, None)
+
+
+deployments = DeploymentStore(DEPLOYMENTS_DIR)
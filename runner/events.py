@@ -0,0 +1,75 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, Set
+
+from containers import parse_replica_name
+
+logger = logging.getLogger(__name__)
+
+# Expected stops whose ``die`` event never arrived (e.g. the container had already exited) are forgotten after this.
+EXPECTED_STOP_TTL_SECONDS = 300
+
+
+class ContainerWatcher(threading.Thread):
+    """Follows Docker's event stream and reports tool replicas that exit on their own.
+
+    Stops the runner makes itself (hibernation, scale-down, redeploys) are
+    announced with ``expect_stop`` first and ignored. Docker emits ``oom``
+    before the ``die`` of an OOM-killed container, so the kill is remembered
+    and passed along with the exit code.
+    """
+
+    def __init__(self, client, on_exit: Callable[[int, int, str, int, bool], None]) -> None:
+        super().__init__(name="container-watcher", daemon=True)
+        self.client = client
+        self.on_exit = on_exit
+        self._lock = threading.Lock()
+        self._expected: Dict[str, float] = {}
+        self._oom_killed: Set[str] = set()
+        self._stopped = threading.Event()
+
+    def expect_stop(self, container_id: str) -> None:
+        with self._lock:
+            now = time.monotonic()
+            for stale in [cid for cid, at in self._expected.items() if now - at > EXPECTED_STOP_TTL_SECONDS]:
+                del self._expected[stale]
+            self._expected[container_id] = now
+
+    def run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                for event in self.client.events(decode=True, filters={"type": "container", "event": ["die", "oom"]}):
+                    self.handle(event)
+                    if self._stopped.is_set():
+                        return
+            except Exception:  # pragma: no cover
+                logger.exception("Docker event stream failed, reconnecting")
+            self._stopped.wait(1)
+
+    def handle(self, event: dict) -> None:
+        actor = event.get("Actor") or {}
+        attributes = actor.get("Attributes") or {}
+        parsed = parse_replica_name(attributes.get("name", ""))
+        if parsed is None:
+            return
+        container_id = actor.get("ID") or event.get("id", "")
+        action = event.get("Action") or event.get("status")
+        with self._lock:
+            if action == "oom":
+                self._oom_killed.add(container_id)
+                return
+            if action != "die":
+                return
+            oom_killed = container_id in self._oom_killed
+            self._oom_killed.discard(container_id)
+            if self._expected.pop(container_id, None) is not None:
+                return
+        tool_id, replica = parsed
+        try:
+            self.on_exit(tool_id, replica, container_id, int(attributes.get("exitCode", 0)), oom_killed)
+        except Exception:  # pragma: no cover
+            logger.exception("Handling exit of %s failed", attributes.get("name"))
+
+    def stop(self) -> None:
+        self._stopped.set()
@@ -0,0 +1,92 @@
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List
+
+from containers import tool_id_of
+
+IDLE_TIMEOUT_SECONDS = int(os.getenv("RUNNER_IDLE_TIMEOUT_SECONDS", "1800"))
+IDLE_CHECK_INTERVAL_SECONDS = int(os.getenv("RUNNER_IDLE_CHECK_INTERVAL_SECONDS", "60"))
+
+logger = logging.getLogger(__name__)
+
+
+def network_bytes(container) -> int:
+    stats = container.stats(stream=False, one_shot=True)
+    return sum(
+        network.get("rx_bytes", 0) + network.get("tx_bytes", 0)
+        for network in (stats.get("networks") or {}).values()
+    )
+
+
+class ActivityTracker:
+    """Last activity per tool, judged by movement in its replicas' network counters.
+
+    An open Streamlit session keeps its websocket busy, so any change in bytes
+    between samples counts as activity.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._bytes: Dict[int, int] = {}
+        self._last_active: Dict[int, float] = {}
+
+    def touch(self, tool_id: int) -> None:
+        with self._lock:
+            self._last_active[tool_id] = time.time()
+
+    def forget(self, tool_id: int) -> None:
+        with self._lock:
+            self._bytes.pop(tool_id, None)
+            self._last_active.pop(tool_id, None)
+
+    def observe(self, tool_id: int, total_bytes: int) -> float:
+        """Record a traffic sample and return when the tool was last active."""
+        with self._lock:
+            now = time.time()
+            if self._bytes.get(tool_id) != total_bytes:
+                self._bytes[tool_id] = total_bytes
+                self._last_active[tool_id] = now
+            return self._last_active.setdefault(tool_id, now)
+
+    def last_active(self) -> Dict[int, float]:
+        with self._lock:
+            return dict(self._last_active)
+
+
+class IdleReaper(threading.Thread):
+    """Periodically hibernates tools whose replicas have all been idle past the timeout."""
+
+    def __init__(self, client, tracker: ActivityTracker, hibernate: Callable, timeout: int, interval: int) -> None:
+        super().__init__(name="idle-reaper", daemon=True)
+        self.client = client
+        self.tracker = tracker
+        self.hibernate = hibernate
+        self.timeout = timeout
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception:  # pragma: no cover
+                logger.exception("Idle sweep failed")
+
+    def sweep(self) -> None:
+        now = time.time()
+        replicas: Dict[int, List] = {}
+        for container in self.client.containers.list(
+            filters={"label": "sheetify.managed=true", "status": "running"}
+        ):
+            tool_id = tool_id_of(container)
+            if tool_id is not None:
+                replicas.setdefault(tool_id, []).append(container)
+        for tool_id, containers in replicas.items():
+            total = sum(network_bytes(container) for container in containers)
+            if now - self.tracker.observe(tool_id, total) >= self.timeout:
+                self.hibernate(tool_id)
+
+    def stop(self) -> None:
+        self._stopped.set()
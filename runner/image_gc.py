@@ -0,0 +1,215 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from docker import errors as docker_errors
+
+from metrics import IMAGE_DISK_BYTES, IMAGE_GC_FREED_BYTES
+
+IMAGE_GC_INTERVAL_SECONDS = int(os.getenv("RUNNER_IMAGE_GC_INTERVAL_SECONDS", "600"))
+IMAGE_KEEP_VERSIONS = int(os.getenv("RUNNER_IMAGE_KEEP_VERSIONS", "3"))
+IMAGE_DISK_BUDGET_MB = int(os.getenv("RUNNER_IMAGE_DISK_BUDGET_MB", "20480"))
+IMAGE_GC_MIN_AGE_SECONDS = int(os.getenv("RUNNER_IMAGE_GC_MIN_AGE_SECONDS", "3600"))
+IMAGE_GC_DRY_RUN = os.getenv("RUNNER_IMAGE_GC_DRY_RUN", "false").lower() in {"1", "true", "yes"}
+IMAGE_USAGE_PATH = Path(os.getenv("RUNNER_IMAGE_USAGE_PATH", "/var/lib/sheetify/state/image-usage.json"))
+
+VERSION_TAG = re.compile(r"^sheetify-tool-(\d+):v(\d+)$")
+
+logger = logging.getLogger(__name__)
+
+
+class ImageUsage:
+    """When each image was last built or started, by image ID, persisted across restarts.
+
+    Docker records when an image was created or tagged but not when it was
+    last used, which is what LRU eviction needs.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            self._last_used: Dict[str, float] = json.loads(path.read_text())
+        except (OSError, ValueError):
+            self._last_used = {}
+
+    def touch(self, image_id: str) -> None:
+        with self._lock:
+            self._last_used[image_id] = time.time()
+            self._save()
+
+    def last_used(self, image_id: str) -> Optional[float]:
+        return self._last_used.get(image_id)
+
+    def forget(self, image_ids: Iterable[str]) -> None:
+        with self._lock:
+            for image_id in image_ids:
+                self._last_used.pop(image_id, None)
+            self._save()
+
+    def _save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f".{self.path.name}.tmp")
+        tmp.write_text(json.dumps(self._last_used))
+        os.replace(tmp, self.path)
+
+
+def _tags(image: dict) -> List[str]:
+    return [tag for tag in image.get("RepoTags") or [] if tag != "<none>:<none>"]
+
+
+def _unique_bytes(image: dict) -> int:
+    # SharedSize is -1 when Docker did not compute it.
+    return image.get("Size", 0) - max(image.get("SharedSize", 0), 0)
+
+
+class ImageCollector(threading.Thread):
+    """Keeps the runner's tool images within a disk budget.
+
+    An image is kept if a container uses it, a deployment or ``protected()``
+    refers to it, it is one of the newest ``keep_versions`` versions of its
+    tool, or it was used within ``min_age`` seconds (so in-flight builds keep
+    their cache images). Everything else tagged with one of ``repositories``
+    is evicted least recently used first, only while total image usage is
+    over budget. Dangling layers older than ``min_age`` are always pruned.
+    """
+
+    def __init__(
+        self,
+        client,
+        usage: ImageUsage,
+        protected: Callable[[], Set[str]],
+        repositories: Iterable[str],
+        keep_versions: int,
+        budget_bytes: int,
+        min_age: int,
+        interval: int,
+        dry_run: bool = False,
+    ) -> None:
+        super().__init__(name="image-gc", daemon=True)
+        self.client = client
+        self.usage = usage
+        self.protected = protected
+        self.repositories = tuple(repositories)
+        self.keep_versions = max(1, keep_versions)
+        self.budget_bytes = budget_bytes
+        self.min_age = min_age
+        self.interval = interval
+        self.dry_run = dry_run
+        self.last_report: Optional[dict] = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                self.collect()
+            except Exception:  # pragma: no cover
+                logger.exception("Image GC failed")
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def _managed(self, image: dict) -> bool:
+        tags = _tags(image)
+        return bool(tags) and all(tag.startswith(self.repositories) for tag in tags)
+
+    def _last_used(self, image: dict) -> float:
+        return self.usage.last_used(image["Id"]) or float(image.get("Created", 0))
+
+    def _retained(self, images: List[dict]) -> Set[str]:
+        """IDs of the images the retention rules keep regardless of disk usage."""
+        protected_refs = {ref if ":" in ref else f"{ref}:latest" for ref in self.protected()}
+        newest: Dict[int, List[tuple]] = {}
+        retained = set()
+        now = time.time()
+        for image in images:
+            tags = _tags(image)
+            if image.get("Containers", 0) > 0 or protected_refs.intersection(tags):
+                retained.add(image["Id"])
+            if now - self._last_used(image) < self.min_age:
+                retained.add(image["Id"])
+            for tag in tags:
+                match = VERSION_TAG.match(tag)
+                if match:
+                    newest.setdefault(int(match.group(1)), []).append((int(match.group(2)), image["Id"]))
+        for versions in newest.values():
+            retained.update(image_id for _, image_id in sorted(versions, reverse=True)[: self.keep_versions])
+        return retained
+
+    def disk_usage(self) -> dict:
+        """Image bytes on this node: the total against the budget and each tool's versions."""
+        df = self.client.df()
+        tools: Dict[int, dict] = {}
+        for image in df.get("Images") or []:
+            for tag in _tags(image):
+                match = VERSION_TAG.match(tag)
+                if match:
+                    tool = tools.setdefault(int(match.group(1)), {"versions": [], "bytes": 0, "unique_bytes": 0})
+                    tool["versions"].append(int(match.group(2)))
+                    tool["bytes"] += image.get("Size", 0)
+                    tool["unique_bytes"] += _unique_bytes(image)
+        total = df.get("LayersSize", 0)
+        IMAGE_DISK_BYTES.set(total)
+        return {"total_bytes": total, "budget_bytes": self.budget_bytes, "tools": tools}
+
+    def plan(self) -> List[dict]:
+        """The images a GC pass would evict right now, without removing or recording anything."""
+        return self._sweep(dry_run=True)["evicted"]
+
+    def collect(self, dry_run: Optional[bool] = None) -> dict:
+        """Prune dangling layers and evict LRU images until within budget; reports what was (or would be) removed."""
+        self.last_report = self._sweep(self.dry_run if dry_run is None else dry_run)
+        return self.last_report
+
+    def _sweep(self, dry_run: bool) -> dict:
+        with self._lock:
+            df = self.client.df()
+            images = df.get("Images") or []
+            total = df.get("LayersSize", 0)
+            IMAGE_DISK_BYTES.set(total)
+            retained = self._retained(images)
+            candidates = sorted(
+                (image for image in images if self._managed(image) and image["Id"] not in retained),
+                key=self._last_used,
+            )
+            evicted = []
+            for image in candidates:
+                if total <= self.budget_bytes:
+                    break
+                if not dry_run:
+                    try:
+                        for tag in _tags(image):
+                            self.client.images.remove(tag)
+                    except docker_errors.APIError as exc:
+                        # Typically a cache image other images are still built on; it goes once they do.
+                        logger.info("Keeping image %s: %s", image["Id"], exc)
+                        continue
+                total -= _unique_bytes(image)
+                evicted.append(
+                    {
+                        "id": image["Id"],
+                        "tags": _tags(image),
+                        "bytes": _unique_bytes(image),
+                        "last_used": self._last_used(image),
+                    }
+                )
+            dangling = [image for image in images if not _tags(image) and image.get("Containers", 0) <= 0]
+            if not dry_run:
+                self.usage.forget(image["id"] for image in evicted)
+                self.client.images.prune(filters={"dangling": True, "until": f"{self.min_age}s"})
+                IMAGE_GC_FREED_BYTES.inc(sum(image["bytes"] for image in evicted))
+            return {
+                "dry_run": dry_run,
+                "finished_at": time.time(),
+                "total_bytes": total,
+                "budget_bytes": self.budget_bytes,
+                "evicted": evicted,
+                "freed_bytes": sum(image["bytes"] for image in evicted),
+                "dangling": len(dangling),
+            }
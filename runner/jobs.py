@@ -0,0 +1,188 @@
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, Generator, Iterator, List, Optional
+
+from tracing import reset_traceparent, set_traceparent
+
+BUILD_SLOTS = int(os.getenv("RUNNER_BUILD_SLOTS", str(max(1, (os.cpu_count() or 2) // 2))))
+BUILD_QUEUE_DEPTH = int(os.getenv("RUNNER_BUILD_QUEUE_DEPTH", "32"))
+JOB_EVENT_BUFFER = int(os.getenv("RUNNER_JOB_EVENT_BUFFER", "5000"))
+JOB_RETENTION_SECONDS = int(os.getenv("RUNNER_JOB_RETENTION_SECONDS", "3600"))
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = {SUCCEEDED, FAILED, CANCELLED}
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class JobNotFound(Exception):
+    pass
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    status: str = QUEUED
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    # The submitting request's trace, continued by the job's thread.
+    traceparent: Optional[str] = None
+    events: Deque[dict] = field(default_factory=lambda: deque(maxlen=JOB_EVENT_BUFFER))
+    next_seq: int = 1
+    cancel_requested: threading.Event = field(default_factory=threading.Event)
+    changed: threading.Condition = field(default_factory=threading.Condition)
+
+    def describe(self) -> dict:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "traceparent": self.traceparent,
+        }
+
+
+class JobManager:
+    """Runs long jobs such as image builds on a fixed pool of slots.
+
+    Each job keeps a bounded buffer of its most recent events so callers can
+    follow it (and reconnect) without the runner holding entire build logs.
+    """
+
+    def __init__(self, slots: int, max_queued: int) -> None:
+        self.slots = slots
+        self.max_queued = max_queued
+        self._executor = ThreadPoolExecutor(max_workers=slots, thread_name_prefix="job")
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(
+        self,
+        kind: str,
+        work: Callable[[], Generator[dict, None, None]],
+        job_id: Optional[str] = None,
+        traceparent: Optional[str] = None,
+    ) -> Job:
+        """Queue ``work`` and return its job; resubmitting a known ``job_id`` returns the existing job."""
+        with self._lock:
+            self._prune()
+            if job_id and job_id in self._jobs:
+                return self._jobs[job_id]
+            if sum(1 for job in self._jobs.values() if job.status == QUEUED) >= self.max_queued:
+                raise JobQueueFull(f"{self.max_queued} jobs already queued")
+            job = Job(id=job_id or uuid.uuid4().hex, kind=kind, traceparent=traceparent)
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, work)
+        return job
+
+    def get(self, job_id: str) -> Job:
+        job = self._jobs.get(job_id)
+        if job is None:
+            raise JobNotFound(job_id)
+        return job
+
+    def cancel(self, job_id: str) -> Job:
+        job = self.get(job_id)
+        job.cancel_requested.set()
+        with job.changed:
+            if job.status == QUEUED:
+                self._finish(job, CANCELLED)
+        return job
+
+    def stats(self) -> dict:
+        jobs = list(self._jobs.values())
+        return {
+            "slots": self.slots,
+            "max_queued": self.max_queued,
+            "queued": sum(1 for job in jobs if job.status == QUEUED),
+            "running": sum(1 for job in jobs if job.status == RUNNING),
+        }
+
+    def follow(self, job_id: str, after: int = 0, heartbeat: float = 15.0) -> Iterator[dict]:
+        """Yield ``{"seq": n, ...}`` events after ``after`` until the job finishes, then its final state."""
+        job = self.get(job_id)
+        while True:
+            with job.changed:
+                pending: List[dict] = [event for event in job.events if event["seq"] > after]
+                if not pending and job.status not in FINISHED:
+                    job.changed.wait(heartbeat)
+                    pending = [event for event in job.events if event["seq"] > after]
+                finished = job.status in FINISHED
+            for event in pending:
+                after = event["seq"]
+                yield event
+            if finished and not any(event["seq"] > after for event in job.events):
+                yield {"status": job.status, "result": job.result, "error": job.error}
+                return
+            if not pending:
+                yield {"heartbeat": time.time()}
+
+    def _append(self, job: Job, event: dict) -> None:
+        with job.changed:
+            job.events.append({"seq": job.next_seq, **event})
+            job.next_seq += 1
+            job.changed.notify_all()
+
+    def _finish(self, job: Job, status: str, error: Optional[str] = None) -> None:
+        job.status = status
+        job.error = error
+        job.finished_at = time.time()
+        job.changed.notify_all()
+
+    def _run(self, job: Job, work: Callable[[], Generator[dict, None, None]]) -> None:
+        with job.changed:
+            if job.status != QUEUED:
+                return
+            job.status = RUNNING
+            job.started_at = time.time()
+        token = set_traceparent(job.traceparent)
+        events = work()
+        try:
+            for event in events:
+                if job.cancel_requested.is_set():
+                    break
+                if "result" in event:
+                    job.result = event["result"]
+                else:
+                    self._append(job, event)
+        except Exception as exc:  # pragma: no cover
+            with job.changed:
+                self._finish(job, FAILED, str(exc))
+            return
+        finally:
+            events.close()
+            reset_traceparent(token)
+        with job.changed:
+            if job.cancel_requested.is_set():
+                self._finish(job, CANCELLED, "Cancelled")
+            else:
+                self._finish(job, SUCCEEDED)
+
+    def _prune(self) -> None:
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        for job_id in [
+            job.id for job in self._jobs.values() if job.finished_at is not None and job.finished_at < cutoff
+        ]:
+            del self._jobs[job_id]
+
+
+build_jobs = JobManager(BUILD_SLOTS, BUILD_QUEUE_DEPTH)
@@ -0,0 +1,147 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterator, List, Optional
+
+RUN_LOG_BUFFER_LINES = int(os.getenv("RUNNER_LOG_BUFFER_LINES", "5000"))
+RUN_LOG_LINE_BYTES = int(os.getenv("RUNNER_LOG_LINE_BYTES", "4096"))
+RUN_LOG_RETENTION_SECONDS = int(os.getenv("RUNNER_LOG_RETENTION_SECONDS", "3600"))
+
+
+class LogRing:
+    """The newest ``capacity`` lines a tool's replicas wrote, numbered so readers can resume.
+
+    Lines that fall off the front are gone; ``first_seq`` tells readers how
+    many they missed.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        self.lines: deque = deque(maxlen=capacity)
+        self.next_seq = 1
+        self.closed_at: Optional[float] = None
+        self.changed = threading.Condition()
+
+    @property
+    def first_seq(self) -> int:
+        return self.lines[0]["seq"] if self.lines else self.next_seq
+
+    def append(self, replica: int, text: str) -> None:
+        with self.changed:
+            self.lines.append({"seq": self.next_seq, "ts": time.time(), "replica": replica, "text": text})
+            self.next_seq += 1
+            self.changed.notify_all()
+
+    def close(self) -> None:
+        with self.changed:
+            if self.closed_at is None:
+                self.closed_at = time.time()
+            self.changed.notify_all()
+
+    def read(self, after: int = 0, since: Optional[float] = None, tail: Optional[int] = None) -> List[dict]:
+        with self.changed:
+            lines = [line for line in self.lines if line["seq"] > after and (since is None or line["ts"] >= since)]
+        return lines[-tail:] if tail else lines
+
+    def describe(self, after: int = 0, since: Optional[float] = None, tail: Optional[int] = None) -> dict:
+        return {
+            "first_seq": self.first_seq,
+            "next_seq": self.next_seq,
+            "closed": self.closed_at is not None,
+            "lines": self.read(after, since, tail),
+        }
+
+    def follow(self, after: int = 0, heartbeat: float = 15.0) -> Iterator[dict]:
+        """Yield lines after ``after`` as they are written, until the tool is stopped."""
+        while True:
+            with self.changed:
+                if self.next_seq - 1 <= after and self.closed_at is None:
+                    self.changed.wait(heartbeat)
+                closed = self.closed_at is not None
+            pending = self.read(after)
+            for line in pending:
+                after = line["seq"]
+                yield line
+            if closed and after >= self.next_seq - 1:
+                yield {"end": True, "next_seq": self.next_seq}
+                return
+            if not pending:
+                yield {"heartbeat": time.time()}
+
+
+class ToolLogs:
+    """A ring buffer of runtime output per deployed tool, fed by one follower thread per replica.
+
+    ``reset`` starts a fresh buffer for a new run and ``close`` marks the run
+    stopped. Closed buffers stay readable for ``retention`` seconds so the
+    backend can archive them, then are dropped.
+    """
+
+    def __init__(self, capacity: int, line_bytes: int, retention: int) -> None:
+        self.capacity = capacity
+        self.line_bytes = line_bytes
+        self.retention = retention
+        self._rings: Dict[int, LogRing] = {}
+        self._lock = threading.Lock()
+
+    def get(self, tool_id: int) -> Optional[LogRing]:
+        with self._lock:
+            return self._rings.get(tool_id)
+
+    def reset(self, tool_id: int) -> LogRing:
+        ring = LogRing(self.capacity)
+        with self._lock:
+            previous = self._rings.get(tool_id)
+            self._rings[tool_id] = ring
+            self._expire()
+        if previous is not None:
+            previous.close()
+        return ring
+
+    def close(self, tool_id: int) -> None:
+        with self._lock:
+            ring = self._rings.get(tool_id)
+            self._expire()
+        if ring is not None:
+            ring.close()
+
+    def attach(self, tool_id: int, replica: int, container, since: Optional[float] = None) -> None:
+        """Copy a replica's stdout and stderr into the tool's buffer until the container stops."""
+        ring = self.get(tool_id)
+        if ring is None:
+            ring = self.reset(tool_id)
+        threading.Thread(
+            target=self._follow,
+            args=(ring, replica, container, since),
+            name=f"logs-{container.name}",
+            daemon=True,
+        ).start()
+
+    def _follow(self, ring: LogRing, replica: int, container, since: Optional[float]) -> None:
+        kwargs = {"stream": True, "follow": True, "stdout": True, "stderr": True}
+        if since is not None:
+            kwargs["since"] = since
+        pending = b""
+        try:
+            for chunk in container.logs(**kwargs):
+                pending += chunk
+                *complete, pending = pending.split(b"\n")
+                for line in complete:
+                    ring.append(replica, line[: self.line_bytes].decode("utf-8", "replace").rstrip("\r"))
+                if len(pending) > self.line_bytes:
+                    ring.append(replica, pending[: self.line_bytes].decode("utf-8", "replace"))
+                    pending = b""
+        except Exception:  # pragma: no cover
+            # The container was removed under us; whatever it wrote is already in the buffer.
+            pass
+        if pending:
+            ring.append(replica, pending[: self.line_bytes].decode("utf-8", "replace"))
+
+    def _expire(self) -> None:
+        cutoff = time.time() - self.retention
+        for tool_id, ring in list(self._rings.items()):
+            if ring.closed_at is not None and ring.closed_at < cutoff:
+                del self._rings[tool_id]
+
+
+tool_logs = ToolLogs(RUN_LOG_BUFFER_LINES, RUN_LOG_LINE_BYTES, RUN_LOG_RETENTION_SECONDS)
@@ -0,0 +1,69 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+TOOL_START_SECONDS = Histogram(
+    "sheetify_runner_tool_start_seconds",
+    "Time from starting a tool container until Streamlit reports healthy.",
+    ["mode"],
+    buckets=(0.5, 1, 2, 3, 5, 8, 13, 21, 34, 60),
+)
+IDLE_RECLAIMED = Counter(
+    "sheetify_runner_idle_reclaimed_total",
+    "Tool containers stopped after exceeding the idle timeout.",
+)
+HIBERNATED_TOOLS = Gauge(
+    "sheetify_runner_hibernated_tools",
+    "Tools currently hibernated and waiting for a request to wake them.",
+)
+WARM_POOL_IDLE = Gauge(
+    "sheetify_runner_warm_pool_idle",
+    "Pre-booted base containers waiting in the warm pool.",
+)
+TOOL_REPLICAS = Gauge(
+    "sheetify_runner_tool_replicas",
+    "Running replicas per tool.",
+    ["tool_id"],
+)
+AUTOSCALE_EVENTS = Counter(
+    "sheetify_runner_autoscale_events_total",
+    "Replica count changes made by the autoscaler.",
+    ["direction"],
+)
+REPLICA_EXITS = Counter(
+    "sheetify_runner_replica_exits_total",
+    "Tool replicas that exited without the runner stopping them.",
+    ["cause"],
+)
+IMAGE_DISK_BYTES = Gauge(
+    "sheetify_runner_image_disk_bytes",
+    "Disk used by image layers on this node, as of the last image GC or usage report.",
+)
+IMAGE_GC_FREED_BYTES = Counter(
+    "sheetify_runner_image_gc_freed_bytes_total",
+    "Bytes of tool and cache images removed by image GC.",
+)
+TOOL_CACHE_BYTES = Gauge(
+    "sheetify_runner_tool_cache_bytes",
+    "Size of each tool's cache volume as of the last sweep.",
+    ["tool_id"],
+)
+TOOL_CACHE_STARTS = Counter(
+    "sheetify_runner_tool_cache_starts_total",
+    "Runs that kept their tool's cache volume (hit) or started with an empty one (miss, invalidated).",
+    ["tool_id", "result"],
+)
+TOOL_CACHE_EVICTED_BYTES = Counter(
+    "sheetify_runner_tool_cache_evicted_bytes_total",
+    "Bytes of least recently used files deleted from tool cache volumes over quota.",
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "sheetify_runner_http_request_seconds",
+    "Runner API request latency until the response starts, by route template.",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+PHASE_SECONDS = Histogram(
+    "sheetify_runner_phase_seconds",
+    "Time spent in each phase of a build or run on this runner.",
+    ["operation", "phase"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600),
+)
@@ -0,0 +1,89 @@
+import logging
+import os
+import socket
+import threading
+from typing import Callable
+
+import httpx
+
+from containers import tool_id_of
+from controlplane import backend_http
+from resources import container_usage
+
+NODE_NAME = os.getenv("RUNNER_NODE_NAME", socket.gethostname())
+NODE_URL = os.getenv("RUNNER_PUBLIC_URL", f"http://{socket.gethostname()}:8001")
+# Where browsers reach this node's Traefik, which is the only proxy its tool routes are published to.
+# Empty for a node behind the main public proxy, whose tool URLs stay relative to it.
+NODE_TOOL_URL = os.getenv("RUNNER_PUBLIC_TOOL_URL", "")
+HEARTBEAT_SECONDS = int(os.getenv("RUNNER_HEARTBEAT_SECONDS", "10"))
+
+logger = logging.getLogger(__name__)
+
+
+def node_report(client, admission) -> dict:
+    """Capacity, usage and cache contents of this node, as sent in each heartbeat.
+
+    Free CPU and memory are what admission control would still accept, so the
+    backend packs against reservations rather than momentary load.
+    """
+    capacity = admission.snapshot()
+    images, requirements = set(), set()
+    for image in client.images.list():
+        images.update(tag for tag in image.tags if tag.startswith("sheetify-tool-"))
+        digest = (image.labels or {}).get("sheetify.requirements-digest")
+        if digest:
+            requirements.add(digest)
+    containers = [
+        container
+        for container in client.containers.list(filters={"label": "sheetify.managed=true"})
+        if tool_id_of(container) is not None
+    ]
+    return {
+        "name": NODE_NAME,
+        "url": NODE_URL,
+        "tool_url": NODE_TOOL_URL or None,
+        "cpu_total": capacity["cpu_allocatable"],
+        "cpu_free": max(0.0, capacity["cpu_allocatable"] - capacity["cpu_reserved"]),
+        "memory_total": capacity["memory_allocatable"],
+        "memory_free": max(0, capacity["memory_allocatable"] - capacity["memory_reserved"]),
+        "running_tools": sorted({tool_id_of(container) for container in containers}),
+        "images": sorted(images),
+        "requirements_digests": sorted(requirements),
+        "usage": [container_usage(container) for container in containers],
+    }
+
+
+class NodeReporter(threading.Thread):
+    """Heartbeats this runner into the backend's node registry and remembers whether it is draining."""
+
+    def __init__(self, report: Callable[[], dict], interval: int) -> None:
+        super().__init__(name="node-reporter", daemon=True)
+        self.report = report
+        self.interval = interval
+        self.status = "active"
+        self._stopped = threading.Event()
+
+    @property
+    def draining(self) -> bool:
+        return self.status == "draining"
+
+    def run(self) -> None:
+        while True:
+            try:
+                self.beat()
+            except Exception:  # pragma: no cover
+                logger.exception("Heartbeat failed")
+            if self._stopped.wait(self.interval):
+                return
+
+    def beat(self) -> None:
+        try:
+            resp = backend_http.post("/internal/nodes/heartbeat", json=self.report())
+            resp.raise_for_status()
+        except httpx.HTTPError as exc:
+            logger.warning("Could not send heartbeat for node %s: %s", NODE_NAME, exc)
+            return
+        self.status = resp.json().get("status", self.status)
+
+    def stop(self) -> None:
+        self._stopped.set()
@@ -0,0 +1,90 @@
+import json
+import tempfile
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from packaging.utils import canonicalize_name
+
+from sandbox import SANDBOX_WHEELHOUSE, Sandbox, SandboxError
+from wheelhouse import WHEELHOUSE_OFFLINE, wheelhouse
+
+RESOLVE_TIMEOUT_SECONDS = 300
+
+
+class ResolutionError(Exception):
+    pass
+
+
+def environment(markers: Dict[str, str]) -> Dict[str, str]:
+    """What a lock was resolved for, from the marker values pip reports for the base image's Python."""
+    return {
+        "python": markers.get("python_full_version", ""),
+        "implementation": markers.get("implementation_name", ""),
+        "platform": f"{markers.get('sys_platform', '')}-{markers.get('platform_machine', '')}",
+    }
+
+
+def _pip_resolve(
+    requirements_txt: str, constraints: Optional[Dict[str, str]], sandbox: Sandbox
+) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """Resolve in ``sandbox``, since pip builds sdists to read their metadata; returns the pins and environment."""
+    files = {"requirements.txt": requirements_txt}
+    cmd = [
+        "pip",
+        "install",
+        "--dry-run",
+        "--ignore-installed",
+        "--quiet",
+        "--report",
+        "out/report.json",
+        "--find-links",
+        f"{SANDBOX_WHEELHOUSE}/{wheelhouse.wheels_dir.name}",
+        "-r",
+        "requirements.txt",
+    ]
+    if constraints:
+        files["constraints.txt"] = "".join(f"{name}=={version}\n" for name, version in sorted(constraints.items()))
+        cmd += ["-c", "constraints.txt"]
+    if WHEELHOUSE_OFFLINE:
+        cmd.append("--no-index")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        out = Path(tmpdir)
+        try:
+            for _ in sandbox.run(cmd, files, collect=out, timeout=RESOLVE_TIMEOUT_SECONDS):
+                pass
+        except SandboxError as exc:
+            raise ResolutionError(str(exc)[-2000:] or "pip could not resolve")
+        try:
+            report = json.loads((out / "report.json").read_text())
+        except (OSError, ValueError):
+            raise ResolutionError("pip did not write a resolution report")
+    pins = {
+        canonicalize_name(item["metadata"]["name"]): item["metadata"]["version"] for item in report.get("install", [])
+    }
+    return pins, environment(report.get("environment", {}))
+
+
+def resolve_lock(requirements_txt: str, sandbox: Sandbox, base_packages: Optional[Dict[str, str]] = None) -> dict:
+    """Pin ``requirements_txt`` and all of its dependencies to exact versions.
+
+    Resolution first prefers the versions already installed in the base image,
+    which keeps the dependency layer small and warm starts possible. Only
+    requirements that conflict with the base fall back to an unconstrained
+    resolve. The lock lists one ``name==version`` per line in canonical-name
+    order, so equal environments produce byte-identical locks. pip runs in
+    ``sandbox``, on the Python that tool images install into.
+    """
+    constrained = bool(base_packages)
+    try:
+        pins, env = _pip_resolve(requirements_txt, base_packages, sandbox)
+    except ResolutionError:
+        if not base_packages:
+            raise
+        constrained = False
+        pins, env = _pip_resolve(requirements_txt, None, sandbox)
+    return {
+        "lock": "".join(f"{name}=={version}\n" for name, version in sorted(pins.items())),
+        "packages": len(pins),
+        "base_constrained": constrained,
+        "environment": env,
+    }
@@ -0,0 +1,146 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Iterator, List, Optional, Tuple
+
+from containers import replica_of, tool_id_of
+
+RESERVED_CPUS = float(os.getenv("RUNNER_RESERVED_CPUS", "0.5"))
+RESERVED_MEMORY_MB = int(os.getenv("RUNNER_RESERVED_MEMORY_MB", "1024"))
+CPU_OVERCOMMIT = float(os.getenv("RUNNER_CPU_OVERCOMMIT", "1.0"))
+ADMISSION_WAIT_SECONDS = int(os.getenv("RUNNER_ADMISSION_WAIT_SECONDS", "30"))
+
+CPU_PERIOD = 100_000
+MB = 1024 * 1024
+
+
+class AdmissionRefused(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class ResourceRequest:
+    cpus: float = 1.0
+    memory_mb: int = 1024
+    pids: int = 256
+
+    @classmethod
+    def from_payload(cls, payload: Optional[dict]) -> "ResourceRequest":
+        return cls(**payload) if payload else cls()
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+    def update_kwargs(self) -> dict:
+        """Limits that ``container.update`` can apply to a running container."""
+        return {
+            "cpu_period": CPU_PERIOD,
+            "cpu_quota": int(self.cpus * CPU_PERIOD),
+            "cpu_shares": int(self.cpus * 1024),
+            "mem_limit": self.memory_mb * MB,
+            # Equal to the memory limit: no swap, so an oversized tool is OOM-killed instead of thrashing the host.
+            "memswap_limit": self.memory_mb * MB,
+        }
+
+    def run_kwargs(self) -> dict:
+        return {**self.update_kwargs(), "pids_limit": self.pids}
+
+
+def reservation(container) -> Tuple[float, int]:
+    """CPUs and memory bytes a container is limited to, read back from Docker."""
+    host = container.attrs.get("HostConfig") or {}
+    quota, period = host.get("CpuQuota") or 0, host.get("CpuPeriod") or CPU_PERIOD
+    cpus = quota / period if quota > 0 else (host.get("NanoCpus") or 0) / 1e9
+    return cpus, host.get("Memory") or 0
+
+
+def container_usage(container) -> dict:
+    stats = container.stats(stream=False, one_shot=True)
+    memory = stats.get("memory_stats") or {}
+    cpus, memory_limit = reservation(container)
+    return {
+        "tool_id": tool_id_of(container),
+        "replica": replica_of(container),
+        "container_id": container.id,
+        "cpu_seconds": ((stats.get("cpu_stats") or {}).get("cpu_usage") or {}).get("total_usage", 0) / 1e9,
+        "cpu_limit": cpus,
+        "memory_bytes": memory.get("usage", 0),
+        "memory_peak_bytes": memory.get("max_usage", 0),
+        "memory_limit_bytes": memory_limit,
+        "pids": (stats.get("pids_stats") or {}).get("current", 0),
+    }
+
+
+class Admission:
+    """Admits tool replicas only while the host's CPU and memory reservations have room.
+
+    Reservations are the limits of running tool containers, read back from
+    Docker so they survive runner restarts, plus starts still in flight. A
+    start that does not fit waits for capacity to free up, then is refused.
+    """
+
+    def __init__(self, client, cpus: float, memory_bytes: int, wait_seconds: int) -> None:
+        self.client = client
+        self.cpus = cpus
+        self.memory_bytes = memory_bytes
+        self.wait_seconds = wait_seconds
+        self._pending: List[ResourceRequest] = []
+        self._changed = threading.Condition()
+
+    def reserved(self) -> Tuple[float, int]:
+        cpus, memory = 0.0, 0
+        for container in self.client.containers.list(filters={"label": "sheetify.managed=true"}):
+            if tool_id_of(container) is not None:
+                container_cpus, container_memory = reservation(container)
+                cpus, memory = cpus + container_cpus, memory + container_memory
+        for request in self._pending:
+            cpus, memory = cpus + request.cpus, memory + request.memory_mb * MB
+        return cpus, memory
+
+    def fits(self, request: ResourceRequest) -> bool:
+        cpus, memory = self.reserved()
+        return cpus + request.cpus <= self.cpus and memory + request.memory_mb * MB <= self.memory_bytes
+
+    @contextmanager
+    def reserve(self, request: ResourceRequest) -> Iterator[None]:
+        """Hold room for ``request`` while its container starts."""
+        deadline = time.monotonic() + self.wait_seconds
+        with self._changed:
+            while not self.fits(request):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise AdmissionRefused(
+                        f"Not enough capacity for {request.cpus} CPUs and {request.memory_mb} MB on this runner"
+                    )
+                # Containers can also exit on their own, so re-check periodically rather than only on release.
+                self._changed.wait(min(remaining, 1.0))
+            self._pending.append(request)
+        try:
+            yield
+        finally:
+            with self._changed:
+                self._pending.remove(request)
+                self._changed.notify_all()
+
+    def released(self) -> None:
+        with self._changed:
+            self._changed.notify_all()
+
+    def snapshot(self) -> dict:
+        cpus, memory = self.reserved()
+        return {
+            "cpu_allocatable": self.cpus,
+            "cpu_reserved": cpus,
+            "memory_allocatable": self.memory_bytes,
+            "memory_reserved": memory,
+        }
+
+
+def host_allocatable(client) -> Tuple[float, int]:
+    """CPUs and memory bytes tools may reserve: host capacity, less the runner's own share."""
+    info = client.info()
+    cpus = float(info.get("NCPU") or os.cpu_count() or 1) * CPU_OVERCOMMIT - RESERVED_CPUS
+    memory = int(info.get("MemTotal") or 0) - RESERVED_MEMORY_MB * MB
+    return max(cpus, 0.0), max(memory, 0)
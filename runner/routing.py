@@ -0,0 +1,63 @@
+import json
+import os
+from pathlib import Path
+from typing import Sequence
+
+from containers import TOOL_PATH_PREFIX
+
+DYNAMIC_CONFIG_DIR = Path(os.getenv("TRAEFIK_DYNAMIC_CONFIG_DIR", "/var/lib/sheetify/traefik"))
+TRAEFIK_ENTRYPOINT = os.getenv("TRAEFIK_ENTRYPOINT", "web")
+
+
+def _route_path(tool_id: int) -> Path:
+    return DYNAMIC_CONFIG_DIR / f"tool-{tool_id}.yml"
+
+
+def publish_route(tool_id: int, servers: Sequence[str]) -> None:
+    """Point ``/t/<tool_id>`` at its replicas' ``servers`` through Traefik's file provider.
+
+    Routes live in files rather than container labels because labels are fixed
+    at creation, while a pooled container only learns which tool it serves
+    when it is claimed. JSON is valid YAML, so Traefik reads the files as-is.
+    """
+    name = f"tool{tool_id}"
+    path = f"{TOOL_PATH_PREFIX}{tool_id}"
+    config = {
+        "http": {
+            "routers": {
+                name: {
+                    # Anchored on "/" so /t/1 never claims /t/12 while tool 12 has no route of its own.
+                    "rule": f"Path(`{path}`) || PathPrefix(`{path}/`)",
+                    "entryPoints": [TRAEFIK_ENTRYPOINT],
+                    "service": name,
+                }
+            },
+            "services": {
+                name: {
+                    "loadBalancer": {
+                        # Streamlit keeps session state in the process serving the websocket,
+                        # so each browser is pinned to one replica.
+                        "sticky": {"cookie": {"name": f"sheetify_{name}", "httpOnly": True, "sameSite": "lax"}},
+                        "servers": [{"url": url} for url in servers],
+                        # Backstop for the runner's own crash handling: Traefik stops sending
+                        # traffic to a replica as soon as its health check fails.
+                        "healthCheck": {
+                            "path": f"{path}/_stcore/health",
+                            "interval": "10s",
+                            "timeout": "3s",
+                        },
+                    }
+                }
+            },
+        }
+    }
+    DYNAMIC_CONFIG_DIR.mkdir(parents=True, exist_ok=True)
+    target = _route_path(tool_id)
+    # Traefik ignores files without a YAML/TOML extension, so the temp file is never read half-written.
+    tmp = target.with_name(f".{target.name}.tmp")
+    tmp.write_text(json.dumps(config, indent=2))
+    os.replace(tmp, target)
+
+
+def withdraw_route(tool_id: int) -> None:
+    _route_path(tool_id).unlink(missing_ok=True)
@@ -0,0 +1,126 @@
+import os
+import tarfile
+import tempfile
+import threading
+from collections import deque
+from pathlib import Path, PurePosixPath
+from typing import Deque, Dict, Generator, Iterable, List, Optional
+
+from docker import errors as docker_errors
+
+from containers import CONTAINER_OPTIONS, tar_files
+
+SANDBOX_TIMEOUT_SECONDS = int(os.getenv("RUNNER_SANDBOX_TIMEOUT_SECONDS", "1800"))
+SANDBOX_MEMORY_MB = int(os.getenv("RUNNER_SANDBOX_MEMORY_MB", "2048"))
+SANDBOX_PIDS_LIMIT = int(os.getenv("RUNNER_SANDBOX_PIDS_LIMIT", "512"))
+SANDBOX_WORKDIR = "/work"
+SANDBOX_WHEELHOUSE = "/wheelhouse"
+
+
+class SandboxError(Exception):
+    pass
+
+
+def _lines(chunks: Iterable[bytes]) -> Iterable[str]:
+    pending = b""
+    for chunk in chunks:
+        pending += chunk
+        *complete, pending = pending.split(b"\n")
+        for line in complete:
+            yield line.decode("utf-8", "replace").rstrip()
+    if pending:
+        yield pending.decode("utf-8", "replace").rstrip()
+
+
+class Sandbox:
+    """Runs pip over user requirements in a throwaway container from the base image.
+
+    Building an sdist, even just to read its metadata, runs the package's own
+    build code, so that never happens in the runner process, which can reach
+    the Docker socket. The container gets the base image's Python (the one
+    tool images install into), the wheelhouse read-only at ``/wheelhouse`` for
+    ``--find-links``, and the network only when ``offline`` is off. Nothing
+    else is mounted.
+    """
+
+    def __init__(
+        self, client, image: str, wheelhouse_volume: str, offline: bool, memory_mb: int, pids_limit: int
+    ) -> None:
+        self.client = client
+        self.image = image
+        self.wheelhouse_volume = wheelhouse_volume
+        self.offline = offline
+        self.memory_mb = memory_mb
+        self.pids_limit = pids_limit
+
+    def run(
+        self,
+        command: List[str],
+        files: Dict[str, str],
+        collect: Optional[Path] = None,
+        timeout: int = SANDBOX_TIMEOUT_SECONDS,
+    ) -> Generator[str, None, None]:
+        """Run ``command`` in ``/work`` holding ``files``, yielding its output lines.
+
+        Raises ``SandboxError`` with the last lines if it fails or outlives
+        ``timeout``. With ``collect``, the files the command left in
+        ``/work/out`` are copied there afterwards.
+        """
+        container = self.client.containers.create(
+            self.image,
+            command,
+            entrypoint=[],
+            working_dir=SANDBOX_WORKDIR,
+            network_disabled=self.offline,
+            volumes={self.wheelhouse_volume: {"bind": SANDBOX_WHEELHOUSE, "mode": "ro"}},
+            mem_limit=f"{self.memory_mb}m",
+            pids_limit=self.pids_limit,
+            labels={"sheetify.managed": "true", "sheetify.sandbox": "true"},
+            **CONTAINER_OPTIONS,
+        )
+        timed_out = threading.Event()
+
+        def expire() -> None:
+            timed_out.set()
+            try:
+                container.kill()
+            except docker_errors.APIError:
+                pass
+
+        timer = threading.Timer(timeout, expire)
+        try:
+            workdir = SANDBOX_WORKDIR.lstrip("/")
+            container.put_archive("/", tar_files({f"{workdir}/{name}": text for name, text in files.items()}))
+            container.start()
+            timer.start()
+            tail: Deque[str] = deque(maxlen=20)
+            for line in _lines(container.logs(stream=True, follow=True)):
+                if line:
+                    tail.append(line)
+                    yield line
+            status = container.wait()["StatusCode"]
+            if timed_out.is_set():
+                raise SandboxError(f"Stopped after {timeout}s" + "".join(f"\n{line}" for line in tail))
+            if status != 0:
+                raise SandboxError("\n".join(tail) or f"Exited with code {status}")
+            if collect is not None:
+                self._collect(container, collect)
+        finally:
+            timer.cancel()
+            container.remove(force=True)
+
+    def _collect(self, container, target: Path) -> None:
+        try:
+            stream, _ = container.get_archive(f"{SANDBOX_WORKDIR}/out")
+        except docker_errors.NotFound:
+            return
+        target.mkdir(parents=True, exist_ok=True)
+        with tempfile.TemporaryFile() as tmp:
+            for chunk in stream:
+                tmp.write(chunk)
+            tmp.seek(0)
+            with tarfile.open(fileobj=tmp) as archive:
+                for member in archive.getmembers():
+                    if member.isfile():
+                        member.name = PurePosixPath(member.name).name
+                        archive.extract(member, target, filter="data")
@@ -1,53 +1,371 @@
+import asyncio
+import hashlib
+import json
+import logging
 import os
+import shutil
+import tarfile
 import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Dict, Generator, Iterator, List, Optional, Sequence, Set, TypeVar
 
 import docker
+import httpx
 from docker import errors as docker_errors
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import RedirectResponse, StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+from autoscaler import (
+    AUTOSCALE_INTERVAL_SECONDS,
+    AUTOSCALE_SCALE_DOWN_DELAY_SECONDS,
+    AUTOSCALE_TARGET_CPU,
+    AUTOSCALE_TARGET_SESSIONS,
+    Autoscaler,
+)
+from blobs import blobs
+from containers import (
+    CONTAINER_OPTIONS,
+    STREAMLIT_PORT,
+    container_address,
+    replica_container_name,
+    replica_of,
+    tar_files,
+    tool_containers,
+    tool_id_of,
+    tool_path,
+)
+from controlplane import report_replicas, report_tool_state
+from deployments import Deployment, deployments
+from events import ContainerWatcher
+from image_gc import (
+    IMAGE_DISK_BUDGET_MB,
+    IMAGE_GC_DRY_RUN,
+    IMAGE_GC_INTERVAL_SECONDS,
+    IMAGE_GC_MIN_AGE_SECONDS,
+    IMAGE_KEEP_VERSIONS,
+    IMAGE_USAGE_PATH,
+    ImageCollector,
+    ImageUsage,
+)
+from idle import IDLE_CHECK_INTERVAL_SECONDS, IDLE_TIMEOUT_SECONDS, ActivityTracker, IdleReaper
+from jobs import JobNotFound, JobQueueFull, build_jobs
+from logtail import tool_logs
+from metrics import (
+    HIBERNATED_TOOLS,
+    HTTP_REQUEST_SECONDS,
+    IDLE_RECLAIMED,
+    REPLICA_EXITS,
+    TOOL_REPLICAS,
+    TOOL_START_SECONDS,
+)
+from node import HEARTBEAT_SECONDS, NodeReporter, node_report
+from resources import (
+    ADMISSION_WAIT_SECONDS,
+    Admission,
+    AdmissionRefused,
+    ResourceRequest,
+    container_usage,
+    host_allocatable,
+)
+from resolver import ResolutionError, resolve_lock
+from routing import publish_route, withdraw_route
+from sandbox import SANDBOX_MEMORY_MB, SANDBOX_PIDS_LIMIT, Sandbox
+from toolcache import (
+    TOOL_CACHE_MAX_IDLE_DAYS,
+    TOOL_CACHE_MB,
+    TOOL_CACHE_STATS_PATH,
+    TOOL_CACHE_SWEEP_SECONDS,
+    ToolCaches,
+)
+from tracing import PhaseTimer, current_traceparent, reset_traceparent, set_traceparent
+from warmpool import WARM_POOL_REFILL_SECONDS, WARM_POOL_SIZE, WarmPool
+from wheelhouse import WHEELHOUSE_OFFLINE, WHEELHOUSE_VOLUME, wheelhouse
 
 BASE_IMAGE = os.getenv("SHEETIFY_BASE_IMAGE", "sheetify-base:latest")
 TRAEFIK_NETWORK = os.getenv("TRAEFIK_NETWORK", "web")
-TRAEFIK_ENTRYPOINT = os.getenv("TRAEFIK_ENTRYPOINT", "web")
+DEPS_REPOSITORY = os.getenv("SHEETIFY_DEPS_REPOSITORY", "sheetify-deps")
+APP_REPOSITORY = os.getenv("SHEETIFY_APP_REPOSITORY", "sheetify-app")
+READY_TIMEOUT_SECONDS = int(os.getenv("RUNNER_READY_TIMEOUT_SECONDS", "60"))
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
 
 client = docker.from_env()
 app = FastAPI(title="Sheetify Runner")
 
+activity = ActivityTracker()
+_hibernated: Set[int] = set()
+_hibernated_lock = threading.Lock()
+_tool_locks: Dict[int, threading.Lock] = {}
+# Containers still inside ``_start_replica``/``_wake``; those report their own failures.
+_starting: Set[str] = set()
+admission = Admission(client, *host_allocatable(client), ADMISSION_WAIT_SECONDS)
+reporter = NodeReporter(lambda: node_report(client, admission), HEARTBEAT_SECONDS)
+watcher = ContainerWatcher(client, lambda *exited: _replica_exited(*exited))
+image_usage = ImageUsage(IMAGE_USAGE_PATH)
+image_gc = ImageCollector(
+    client,
+    image_usage,
+    lambda: {BASE_IMAGE} | {deployment.image_ref for deployment in deployments.all()},
+    ("sheetify-tool-", f"{DEPS_REPOSITORY}:", f"{APP_REPOSITORY}:"),
+    IMAGE_KEEP_VERSIONS,
+    IMAGE_DISK_BUDGET_MB * 1024 * 1024,
+    IMAGE_GC_MIN_AGE_SECONDS,
+    IMAGE_GC_INTERVAL_SECONDS,
+    IMAGE_GC_DRY_RUN,
+)
+tool_caches = ToolCaches(
+    client,
+    BASE_IMAGE,
+    lambda: {deployment.tool_id for deployment in deployments.all()},
+    TOOL_CACHE_MB * 1024 * 1024,
+    TOOL_CACHE_SWEEP_SECONDS,
+    TOOL_CACHE_MAX_IDLE_DAYS * 24 * 3600,
+    TOOL_CACHE_STATS_PATH,
+)
+sandbox = Sandbox(client, BASE_IMAGE, WHEELHOUSE_VOLUME, WHEELHOUSE_OFFLINE, SANDBOX_MEMORY_MB, SANDBOX_PIDS_LIMIT)
+warm_pool: Optional[WarmPool] = None
+
+
+class StartupFailed(Exception):
+    pass
+
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Continue the backend's trace and time the request by route template."""
+    token = set_traceparent(request.headers.get("traceparent"))
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.labels(
+            request.method, route.path if route else "unmatched", str(response.status_code)
+        ).observe(time.perf_counter() - started)
+        response.headers["traceparent"] = current_traceparent()
+        return response
+    finally:
+        reset_traceparent(token)
+
 
-def _build_image(tool_id: int, version_id: int, app_py: str, requirements_txt: str) -> dict:
+def _cache_key(*parts: str) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _find_image(ref: str):
+    try:
+        return client.images.get(ref)
+    except docker_errors.ImageNotFound:
+        return None
+
+
+def _docker_build(
+    files: Dict[str, str],
+    dockerfile: str,
+    tag: str,
+    labels: Dict[str, str],
+    wheels: Sequence[Path] = (),
+    bundle: Optional[Path] = None,
+) -> Generator[str, None, None]:
     with tempfile.TemporaryDirectory() as tmpdir:
         tmp = Path(tmpdir)
-        (tmp / "app.py").write_text(app_py)
-        (tmp / "requirements.txt").write_text(requirements_txt)
-        dockerfile = tmp / "Dockerfile"
-        dockerfile.write_text(
-            f"FROM {BASE_IMAGE}\n"
-            "WORKDIR /workspace\n"
-            "COPY requirements.txt requirements.txt\n"
-            "RUN pip install --no-cache-dir -r requirements.txt\n"
-            "COPY app.py app.py\n"
+        for name, content in files.items():
+            (tmp / name).write_text(content)
+        if bundle is not None:
+            # Multi-file apps arrive as a tar of the app directory, unpacked straight from the blob cache.
+            with tarfile.open(bundle) as archive:
+                archive.extractall(tmp / "app", filter="data")
+        (tmp / "wheels").mkdir()
+        for wheel in wheels:
+            shutil.copyfile(wheel, tmp / "wheels" / wheel.name)
+        (tmp / "Dockerfile").write_text(dockerfile)
+        for chunk in client.api.build(path=tmpdir, tag=tag, labels=labels, rm=True, decode=True):
+            if "error" in chunk:
+                raise docker_errors.BuildError(chunk["error"].strip(), [])
+            line = chunk.get("stream")
+            if line and line.strip():
+                yield line.rstrip()
+
+
+def _log_events(lines: Generator[str, None, T]) -> Generator[dict, None, T]:
+    while True:
+        try:
+            line = next(lines)
+        except StopIteration as stop:
+            return stop.value
+        yield {"log": line}
+
+
+def _build_image(
+    tool_id: int,
+    version_id: int,
+    app_digest: str,
+    requirements_digest: str,
+    bundle_digest: Optional[str] = None,
+    timer: Optional[PhaseTimer] = None,
+) -> Iterator[dict]:
+    """Build the tool image, reusing cached dependency and app layers.
+
+    Sources arrive as blob digests. Dependency images are keyed by the base
+    image digest plus the requirements digest, app images by the dependency key
+    plus the app digest (or the bundle digest for multi-file apps, which are
+    copied into ``/workspace`` whole), so a full cache hit never fetches the
+    sources. Yields
+    ``{"log": line}`` events as the build progresses and finishes with a
+    ``{"result": ...}`` event whose ``cache`` is ``hit`` (app image reused),
+    ``partial`` (dependency image reused) or ``miss``, and whose ``phases``
+    times the steps that ran.
+    """
+    timer = timer or PhaseTimer("build")
+    base_digest = client.images.get(BASE_IMAGE).id
+    deps_key = _cache_key(base_digest, requirements_digest)
+    app_key = _cache_key(deps_key, bundle_digest or app_digest)
+    deps_ref = f"{DEPS_REPOSITORY}:{deps_key}"
+    app_ref = f"{APP_REPOSITORY}:{app_key}"
+    repository, version_tag = f"sheetify-tool-{tool_id}", f"v{version_id}"
+    tag = f"{repository}:{version_tag}"
+
+    cached = _find_image(app_ref)
+    if cached is not None:
+        image_usage.touch(cached.id)
+        cached.tag(repository, version_tag)
+        yield {"log": f"Build cache hit: reusing {app_ref}"}
+        yield {"result": {"image_ref": tag, "cache": "hit", "phases": timer.timings}}
+        return
+
+    cache = "partial"
+    deps_image = _find_image(deps_ref)
+    if deps_image is None:
+        cache = "miss"
+        requirements_txt = blobs.read_text(requirements_digest)
+        with timer.phase("wheels"):
+            wheels = yield from _log_events(wheelhouse.resolve(requirements_txt, sandbox))
+        with timer.phase("deps_image"):
+            yield from _log_events(
+                _docker_build(
+                    {"requirements.txt": requirements_txt},
+                    f"FROM {BASE_IMAGE} AS wheels\n"
+                    "COPY requirements.txt /tmp/requirements.txt\n"
+                    "COPY wheels /tmp/wheels\n"
+                    "RUN pip install --no-cache-dir --no-index --find-links /tmp/wheels "
+                    "--prefix /install -r /tmp/requirements.txt\n"
+                    f"FROM {BASE_IMAGE}\n"
+                    "WORKDIR /workspace\n"
+                    "COPY --from=wheels /install /usr/local\n"
+                    "COPY requirements.txt requirements.txt\n",
+                    deps_ref,
+                    {
+                        "sheetify.cache-key": deps_key,
+                        "sheetify.base-digest": base_digest,
+                        "sheetify.requirements-digest": requirements_digest,
+                    },
+                    wheels=wheels,
+                )
+            )
+    else:
+        image_usage.touch(deps_image.id)
+        yield {"log": f"Build cache partial hit: reusing {deps_ref}"}
+    labels = {
+        "sheetify.cache-key": app_key,
+        "sheetify.deps-key": deps_key,
+        "sheetify.app-digest": app_digest,
+        "sheetify.requirements-digest": requirements_digest,
+    }
+    if bundle_digest:
+        labels["sheetify.bundle-digest"] = bundle_digest
+        app_build = _docker_build(
+            {},
+            f"FROM {deps_ref}\nWORKDIR /workspace\nCOPY app/ ./\n",
+            app_ref,
+            labels,
+            bundle=blobs.fetch(bundle_digest),
         )
-        tag = f"sheetify-tool-{tool_id}:v{version_id}"
-        logs = []
-        image, build_logs = client.images.build(path=tmpdir, tag=tag, rm=True)
-        for chunk in build_logs:
-            line = chunk.get("stream") or chunk.get("error")
-            if line:
-                logs.append(line.strip())
-        return {"image_ref": tag, "logs": "\n".join(logs)}
-
-
-def _run_container(tool_id: int, image_ref: str) -> dict:
-    tool_path = f"/t/{tool_id}"
-    name = f"sheetify-tool-{tool_id}"
+    else:
+        app_build = _docker_build(
+            {"app.py": blobs.read_text(app_digest)},
+            f"FROM {deps_ref}\nWORKDIR /workspace\nCOPY app.py app.py\n",
+            app_ref,
+            labels,
+        )
+    with timer.phase("app_image"):
+        yield from _log_events(app_build)
+    built = client.images.get(app_ref)
+    image_usage.touch(built.id)
+    built.tag(repository, version_tag)
+    yield {"result": {"image_ref": tag, "cache": cache, "phases": timer.timings}}
+
+
+def _ndjson(events: Iterator[dict]) -> Iterator[str]:
+    for event in events:
+        yield json.dumps(event) + "\n"
+
+
+def _logs_tail(container, lines: int = 20) -> str:
     try:
-        existing = client.containers.get(name)
-        existing.remove(force=True)
-    except docker_errors.NotFound:
-        pass
-    container = client.containers.run(
+        tail = container.logs(tail=lines).decode("utf-8", "replace").strip()
+    except docker_errors.APIError:
+        return ""
+    return f"\n{tail}" if tail else ""
+
+
+def _exited(container) -> bool:
+    container.reload()
+    return container.status in {"exited", "dead"}
+
+
+def _wait_until_ready(container, path: str, timeout: float = READY_TIMEOUT_SECONDS) -> float:
+    """Poll Streamlit's health endpoint until it answers, returning the seconds waited.
+
+    Raises ``StartupFailed`` with the container's last log lines if it exits
+    first or is still not healthy after ``timeout``.
+    """
+    started = time.monotonic()
+    if _exited(container):
+        raise StartupFailed(f"{container.name} exited during startup{_logs_tail(container)}")
+    url = f"http://{container_address(container)}:{STREAMLIT_PORT}{path}/_stcore/health"
+    while True:
+        try:
+            if httpx.get(url, timeout=2).status_code == 200:
+                return time.monotonic() - started
+        except httpx.HTTPError:
+            pass
+        if _exited(container):
+            state = container.attrs.get("State", {})
+            cause = "was OOM-killed" if state.get("OOMKilled") else f"exited with code {state.get('ExitCode')}"
+            raise StartupFailed(f"{container.name} {cause} during startup{_logs_tail(container)}")
+        if time.monotonic() - started > timeout:
+            raise StartupFailed(f"{container.name} was not ready after {timeout}s{_logs_tail(container)}")
+        time.sleep(0.25)
+
+
+def _discard(container) -> None:
+    """Force-remove a container the runner is giving up on, without reporting its exit as a crash."""
+    watcher.expect_stop(container.id)
+    container.remove(force=True)
+
+
+def _retire(container, remove: bool = True) -> None:
+    """Stop (and by default remove) a replica the runner is taking down on purpose."""
+    watcher.expect_stop(container.id)
+    container.stop()
+    if remove:
+        container.remove()
+
+
+def _start_cold(tool_id: int, replica: int, image_ref: str, request: ResourceRequest):
+    return client.containers.run(
         image_ref,
-        name=name,
+        name=replica_container_name(tool_id, replica),
         command=[
             "streamlit",
             "run",
@@ -55,61 +373,581 @@ def _run_container(tool_id: int, image_ref: str) -> dict:
             "--server.headless",
             "true",
             "--server.baseUrlPath",
-            tool_path,
+            tool_path(tool_id),
             "--server.port",
-            "8501",
+            str(STREAMLIT_PORT),
         ],
         detach=True,
         network=TRAEFIK_NETWORK if TRAEFIK_NETWORK else None,
         labels={
-            "traefik.enable": "true",
-            f"traefik.http.routers.tool{tool_id}.rule": f"PathPrefix(`{tool_path}`)",
-            f"traefik.http.routers.tool{tool_id}.entrypoints": TRAEFIK_ENTRYPOINT,
-            f"traefik.http.routers.tool{tool_id}.service": f"tool{tool_id}",
-            f"traefik.http.services.tool{tool_id}.loadbalancer.server.port": "8501",
+            "sheetify.managed": "true",
+            "sheetify.tool-id": str(tool_id),
+            "sheetify.image-ref": image_ref,
         },
-        security_opt=["no-new-privileges"],
-        cap_drop=["NET_RAW"],
+        **CONTAINER_OPTIONS,
+        **request.run_kwargs(),
+        **tool_caches.run_kwargs(tool_id),
     )
+
+
+def _start_warm(tool_id: int, replica: int, image_ref: str, request: ResourceRequest):
+    """Hand the tool's app to a pooled container, or return ``None`` if it needs its own image.
+
+    Only images whose requirements the base image already satisfies qualify;
+    their labels carry the source digests, so the app (or a multi-file app's
+    whole bundle) is copied in from the blob cache rather than out of the image.
+    Pooled containers were created without the tool's cache volume, and Docker
+    only mounts volumes at creation, so none qualify while tool caches are on
+    (and the pool is kept empty then).
+    """
+    if warm_pool is None or tool_caches.enabled:
+        return None
+    labels = client.images.get(image_ref).labels or {}
+    app_digest = labels.get("sheetify.app-digest")
+    requirements_digest = labels.get("sheetify.requirements-digest")
+    if not app_digest or not requirements_digest:
+        return None
+    if not warm_pool.can_serve(blobs.read_text(requirements_digest)):
+        return None
+    container = warm_pool.claim()
+    if container is None:
+        return None
+    try:
+        container.rename(replica_container_name(tool_id, replica))
+        container.update(**request.update_kwargs())
+        bundle_digest = labels.get("sheetify.bundle-digest")
+        if bundle_digest:
+            with blobs.fetch(bundle_digest).open("rb") as bundle:
+                container.put_archive("/workspace", bundle)
+        else:
+            container.put_archive("/workspace", tar_files({"app.py": blobs.read_text(app_digest)}))
+        # The launch file goes last: the boot script starts Streamlit as soon as it appears.
+        launch = {"main": "app.py", "base_url_path": tool_path(tool_id), "port": STREAMLIT_PORT}
+        container.put_archive("/workspace", tar_files({".sheetify/launch.json": json.dumps(launch)}))
+    except Exception:
+        _discard(container)
+        raise
+    return container
+
+
+def _start_replica(tool_id: int, replica: int, image_ref: str, request: ResourceRequest) -> dict:
+    """Start one replica, from the warm pool when possible, and wait until it is healthy."""
+    started, claimed_at = time.monotonic(), time.time()
+    with admission.reserve(request):
+        container, mode = _start_warm(tool_id, replica, image_ref, request), "warm"
+        if container is None:
+            container, mode = _start_cold(tool_id, replica, image_ref, request), "cold"
+    created = time.monotonic()
+    _starting.add(container.id)
+    # A pooled container's earlier output is the pool's, not the tool's.
+    tool_logs.attach(tool_id, replica, container, since=claimed_at if mode == "warm" else None)
+    try:
+        _wait_until_ready(container, tool_path(tool_id))
+    except Exception:
+        _discard(container)
+        admission.released()
+        raise
+    finally:
+        _starting.discard(container.id)
+    elapsed = time.monotonic() - started
+    TOOL_START_SECONDS.labels(mode).observe(elapsed)
     return {
+        "replica": replica,
         "container_id": container.id,
-        "url": f"/t/{tool_id}",
-        "logs": "Container started",
+        "start_mode": mode,
+        "startup_seconds": round(elapsed, 3),
+        # Admission and container creation (or warm claim), then Streamlit booting until healthy.
+        "phases": {"start": round(created - started, 3), "boot": round(time.monotonic() - created, 3)},
     }
 
 
+def _start_replicas(
+    tool_id: int, image_ref: str, replicas: Sequence[int], request: ResourceRequest
+) -> List[dict]:
+    """Start ``replicas`` in parallel; if any fails, the ones that came up are removed and its error raised."""
+    if not replicas:
+        return []
+    with ThreadPoolExecutor(max_workers=len(replicas)) as pool:
+        futures = [pool.submit(_start_replica, tool_id, replica, image_ref, request) for replica in replicas]
+    started, error = [], None
+    for future in futures:
+        try:
+            started.append(future.result())
+        except Exception as exc:
+            error = error or exc
+    if error is None:
+        return started
+    for replica in started:
+        try:
+            _discard(client.containers.get(replica["container_id"]))
+        except docker_errors.NotFound:
+            pass
+    admission.released()
+    raise error
+
+
+def _publish(tool_id: int) -> List[dict]:
+    """Route the tool to its running replicas (or withdraw it if none are left) and describe them."""
+    containers = tool_containers(client, tool_id)
+    if containers:
+        publish_route(tool_id, [f"http://{container_address(c)}:{STREAMLIT_PORT}" for c in containers])
+    else:
+        withdraw_route(tool_id)
+    TOOL_REPLICAS.labels(str(tool_id)).set(len(containers))
+    return [{"replica": replica_of(c), "container_id": c.id} for c in containers]
+
+
+def _tool_lock(tool_id: int) -> threading.Lock:
+    return _tool_locks.setdefault(tool_id, threading.Lock())
+
+
+def _ensure_image(tool_id: int, image_ref: str, source: Optional[dict]) -> None:
+    """Build a tool image this node has never seen, from the version's stored sources."""
+    if source is None or _find_image(image_ref) is not None:
+        return
+    for _ in _build_image(
+        tool_id,
+        source["version_id"],
+        source["app_digest"],
+        source["requirements_digest"],
+        source.get("bundle_digest"),
+    ):
+        pass
+
+
+def _run_container(
+    tool_id: int,
+    image_ref: str,
+    min_replicas: int = 1,
+    max_replicas: int = 1,
+    source: Optional[dict] = None,
+    resources: Optional[dict] = None,
+) -> dict:
+    started = time.monotonic()
+    timer = PhaseTimer("run")
+    with timer.phase("image"):
+        _ensure_image(tool_id, image_ref, source)
+    image_usage.touch(client.images.get(image_ref).id)
+    request = ResourceRequest.from_payload(resources)
+    min_replicas = max(1, min_replicas)
+    deployment = Deployment(tool_id, image_ref, min_replicas, max(min_replicas, max_replicas), request.as_dict())
+    with _tool_lock(tool_id):
+        for existing in tool_containers(client, tool_id, all=True):
+            _discard(existing)
+        admission.released()
+        withdraw_route(tool_id)
+        _set_hibernated(tool_id, False)
+        cache = tool_caches.prepare(tool_id, image_ref)
+        tool_logs.reset(tool_id)
+        try:
+            replicas = _start_replicas(tool_id, image_ref, range(deployment.min_replicas), request)
+        except Exception:
+            # Whatever ran before was discarded above, so the tool is now not deployed at all.
+            deployments.delete(tool_id)
+            tool_logs.close(tool_id)
+            TOOL_REPLICAS.labels(str(tool_id)).set(0)
+            raise
+        # Saved only once every replica is healthy, so the autoscaler and image GC never see a half-started tool.
+        deployments.put(deployment)
+        # Replicas start in parallel, so the run waited for the slowest of each phase.
+        for phase in ("start", "boot"):
+            timer.record(phase, max(replica["phases"][phase] for replica in replicas))
+        # The route only goes live once every replica answers its health check.
+        with timer.phase("route"):
+            _publish(tool_id)
+    ready_seconds = round(time.monotonic() - started, 3)
+    activity.touch(tool_id)
+    summary = ", ".join(
+        f"replica {r['replica']}: {r['start_mode']} start, ready in {r['startup_seconds']:.1f}s" for r in replicas
+    )
+    return {
+        "container_id": replicas[0]["container_id"],
+        "url": tool_path(tool_id),
+        "replicas": replicas,
+        "ready_seconds": ready_seconds,
+        "phases": timer.timings,
+        "logs": f"Started {len(replicas)} replica(s) in {ready_seconds:.1f}s ({summary})"
+        + (f"; tool cache {cache}" if cache else ""),
+    }
+
+
+def _scale(tool_id: int, replicas: int) -> List[dict]:
+    """Add or remove replicas of a running tool, within its deployment's bounds.
+
+    New replicas join the route once healthy. Removed replicas leave the route
+    before they are stopped, so no new sessions land on them.
+    """
+    deployment = deployments.get(tool_id)
+    if deployment is None:
+        raise KeyError(tool_id)
+    with _tool_lock(tool_id):
+        containers = tool_containers(client, tool_id)
+        if not containers:
+            # Hibernated or stopped: the count is applied when it next starts.
+            return []
+        target = deployment.clamp(replicas)
+        if target > len(containers):
+            taken = {replica_of(c) for c in tool_containers(client, tool_id, all=True)}
+            free = [n for n in range(target + len(taken)) if n not in taken][: target - len(containers)]
+            request = ResourceRequest.from_payload(deployment.resources)
+            _start_replicas(tool_id, deployment.image_ref, free, request)
+        elif target < len(containers):
+            keep, drop = containers[:target], containers[target:]
+            publish_route(tool_id, [f"http://{container_address(c)}:{STREAMLIT_PORT}" for c in keep])
+            for container in drop:
+                _retire(container)
+            admission.released()
+        described = _publish(tool_id)
+    report_replicas(tool_id, described)
+    return described
+
+
 def _stop_container(tool_id: int) -> dict:
-    name = f"sheetify-tool-{tool_id}"
-    try:
-        container = client.containers.get(name)
-    except docker_errors.NotFound:
-        raise HTTPException(status_code=404, detail="Container not running")
-    container.stop()
-    container.remove()
+    with _tool_lock(tool_id):
+        containers = tool_containers(client, tool_id, all=True)
+        if not containers:
+            raise HTTPException(status_code=404, detail="Container not running")
+        withdraw_route(tool_id)
+        for container in containers:
+            _retire(container)
+        admission.released()
+        deployments.delete(tool_id)
+        _publish(tool_id)
+        tool_logs.close(tool_id)
+    _set_hibernated(tool_id, False)
+    activity.forget(tool_id)
     return {"status": "stopped"}
 
 
-@app.post("/build")
+def _set_hibernated(tool_id: int, hibernated: bool) -> None:
+    with _hibernated_lock:
+        if hibernated:
+            _hibernated.add(tool_id)
+        else:
+            _hibernated.discard(tool_id)
+        HIBERNATED_TOOLS.set(len(_hibernated))
+
+
+def _hibernate(tool_id: int) -> None:
+    with _tool_lock(tool_id):
+        # Drop the route first so requests fall through to the wake handler rather than stopped replicas.
+        withdraw_route(tool_id)
+        for container in tool_containers(client, tool_id):
+            _retire(container, remove=False)
+        admission.released()
+        TOOL_REPLICAS.labels(str(tool_id)).set(0)
+    _set_hibernated(tool_id, True)
+    IDLE_RECLAIMED.inc()
+    report_tool_state(tool_id, "hibernated")
+
+
+def _wake(tool_id: int) -> bool:
+    """Start a hibernated tool's replicas and wait until they are healthy.
+
+    Returns False if the tool was already running.
+    """
+    with _tool_lock(tool_id):
+        containers = tool_containers(client, tool_id, all=True)
+        if not containers:
+            raise docker_errors.NotFound(f"Tool {tool_id} is not deployed")
+        if any(container.status == "running" for container in containers):
+            return False
+        deployment = deployments.get(tool_id)
+        request = ResourceRequest.from_payload(deployment.resources if deployment else None)
+        started = time.monotonic()
+        _starting.update(container.id for container in containers)
+        try:
+            for container in containers:
+                resumed_at = time.time()
+                with admission.reserve(request):
+                    container.start()
+                # Output from before hibernation is already in the buffer.
+                tool_logs.attach(tool_id, replica_of(container), container, since=resumed_at)
+            for container in containers:
+                _wait_until_ready(container, tool_path(tool_id))
+        finally:
+            _starting.difference_update(container.id for container in containers)
+        TOOL_START_SECONDS.labels("wake").observe(time.monotonic() - started)
+        described = _publish(tool_id)
+    _set_hibernated(tool_id, False)
+    activity.touch(tool_id)
+    report_tool_state(tool_id, "running", container_id=described[0]["container_id"])
+    report_replicas(tool_id, described)
+    return True
+
+
+def _replica_exited(tool_id: int, replica: int, container_id: str, exit_code: int, oom_killed: bool) -> None:
+    """Take a replica that crashed or was OOM-killed out of the route and report it to the backend.
+
+    The backend fails the run once none of its replicas are left; until then
+    the autoscaler tops the tool back up to its minimum replica count.
+    """
+    if container_id in _starting:
+        return
+    with _tool_lock(tool_id):
+        try:
+            container = client.containers.get(container_id)
+        except docker_errors.NotFound:
+            return
+        tail = _logs_tail(container)
+        container.remove(force=True)
+        admission.released()
+        _publish(tool_id)
+    cause = "was OOM-killed at its memory limit" if oom_killed else f"exited with code {exit_code}"
+    REPLICA_EXITS.labels("oom" if oom_killed else "crash").inc()
+    logger.warning("Replica %s of tool %s %s", replica, tool_id, cause)
+    report_tool_state(
+        tool_id, "failed", container_id=container_id, replica=replica, reason=f"Replica {replica} {cause}{tail}"
+    )
+
+
+@app.on_event("startup")
+def start_background_workers() -> None:
+    global warm_pool
+    running, exited = set(), set()
+    for container in client.containers.list(all=True, filters={"label": "sheetify.managed=true"}):
+        tool_id = tool_id_of(container)
+        if tool_id is not None:
+            (running if container.status == "running" else exited).add(tool_id)
+            if container.status == "running":
+                tool_logs.attach(tool_id, replica_of(container), container, since=time.time())
+    for tool_id in exited - running:
+        _set_hibernated(tool_id, True)
+    if IDLE_TIMEOUT_SECONDS > 0:
+        IdleReaper(client, activity, _hibernate, IDLE_TIMEOUT_SECONDS, IDLE_CHECK_INTERVAL_SECONDS).start()
+    if WARM_POOL_SIZE > 0:
+        # Pooled containers are created before they know their tool, so they can never mount its cache volume:
+        # with caches on the pool keeps no containers (and removes a previous process's), only base_packages.
+        size = 0 if tool_caches.enabled else WARM_POOL_SIZE
+        if size < WARM_POOL_SIZE:
+            logger.warning(
+                "RUNNER_WARM_POOL_SIZE=%d is ignored while tool caches are on (RUNNER_TOOL_CACHE_MB=%d): "
+                "every start is cold. Set RUNNER_TOOL_CACHE_MB=0 for warm starts.",
+                WARM_POOL_SIZE,
+                TOOL_CACHE_MB,
+            )
+        warm_pool = WarmPool(client, BASE_IMAGE, size, TRAEFIK_NETWORK or None, WARM_POOL_REFILL_SECONDS)
+        warm_pool.start()
+    reporter.start()
+    watcher.start()
+    if IMAGE_GC_INTERVAL_SECONDS > 0:
+        image_gc.start()
+    if tool_caches.enabled and TOOL_CACHE_SWEEP_SECONDS > 0:
+        tool_caches.start()
+    Autoscaler(
+        client,
+        deployments,
+        _scale,
+        AUTOSCALE_INTERVAL_SECONDS,
+        AUTOSCALE_TARGET_CPU,
+        AUTOSCALE_TARGET_SESSIONS,
+        AUTOSCALE_SCALE_DOWN_DELAY_SECONDS,
+    ).start()
+
+
+@app.post("/build", status_code=202)
 def build(payload: dict):
-    try:
+    if reporter.draining:
+        raise HTTPException(status_code=409, detail="Node is draining")
+
+    submitted = time.monotonic()
+
+    def work():
+        timer = PhaseTimer("build")
+        timer.record("runner_queue", time.monotonic() - submitted)
         return _build_image(
             tool_id=payload["tool_id"],
             version_id=payload["version_id"],
-            app_py=payload["app_py"],
-            requirements_txt=payload["requirements_txt"],
+            app_digest=payload["app_digest"],
+            requirements_digest=payload["requirements_digest"],
+            bundle_digest=payload.get("bundle_digest"),
+            timer=timer,
         )
-    except docker_errors.BuildError as exc:  # pragma: no cover
-        raise HTTPException(status_code=400, detail=str(exc))
+
+    try:
+        job = build_jobs.submit("build", work, job_id=payload.get("job_id"), traceparent=current_traceparent())
+    except JobQueueFull as exc:
+        raise HTTPException(status_code=429, detail=f"Build queue is full: {exc}")
+    return job.describe()
+
+
+@app.post("/resolve")
+def resolve(payload: dict):
+    """Pin a requirements blob to a lockfile, preferring the versions the base image already has."""
+    requirements_txt = blobs.read_text(payload["requirements_digest"])
+    try:
+        return resolve_lock(requirements_txt, sandbox, warm_pool.base_packages() if warm_pool is not None else None)
+    except ResolutionError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+
+
+@app.get("/jobs")
+def job_stats():
+    return build_jobs.stats()
+
+
+@app.get("/wheelhouse")
+def wheelhouse_usage():
+    return wheelhouse.usage()
+
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    try:
+        return build_jobs.get(job_id).describe()
+    except JobNotFound:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+
+@app.get("/jobs/{job_id}/events")
+def job_events(job_id: str, after: int = 0):
+    try:
+        build_jobs.get(job_id)
+    except JobNotFound:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return StreamingResponse(_ndjson(build_jobs.follow(job_id, after)), media_type="application/x-ndjson")
+
+
+@app.post("/jobs/{job_id}/cancel")
+def cancel_job(job_id: str):
+    try:
+        return build_jobs.cancel(job_id).describe()
+    except JobNotFound:
+        raise HTTPException(status_code=404, detail="Job not found")
 
 
 @app.post("/run")
 def run(payload: dict):
+    if reporter.draining:
+        raise HTTPException(status_code=409, detail="Node is draining")
     try:
-        return _run_container(tool_id=payload["tool_id"], image_ref=payload["image_ref"])
+        return _run_container(
+            tool_id=payload["tool_id"],
+            image_ref=payload["image_ref"],
+            min_replicas=payload.get("min_replicas", 1),
+            max_replicas=payload.get("max_replicas", 1),
+            source=payload.get("source"),
+            resources=payload.get("resources"),
+        )
     except docker_errors.ContainerError as exc:  # pragma: no cover
         raise HTTPException(status_code=400, detail=str(exc))
+    except StartupFailed as exc:
+        # The tool's own fault, so not a 5xx that would count against this node's circuit breaker.
+        raise HTTPException(status_code=422, detail=str(exc))
+    except AdmissionRefused as exc:
+        raise HTTPException(status_code=429, detail=str(exc))
 
 
 @app.post("/stop")
 def stop(payload: dict):
     return _stop_container(payload["tool_id"])
+
+
+@app.post("/scale")
+def scale(payload: dict):
+    """Update a deployment's replica bounds; the current count is clamped into them."""
+    deployment = deployments.get(payload["tool_id"])
+    if deployment is None:
+        raise HTTPException(status_code=404, detail="Tool is not deployed")
+    deployment.min_replicas = max(1, payload["min_replicas"])
+    deployment.max_replicas = max(deployment.min_replicas, payload["max_replicas"])
+    deployments.put(deployment)
+    current = len(tool_containers(client, deployment.tool_id))
+    try:
+        replicas = _scale(deployment.tool_id, current or deployment.min_replicas)
+    except AdmissionRefused as exc:
+        raise HTTPException(status_code=429, detail=str(exc))
+    return {"min_replicas": deployment.min_replicas, "max_replicas": deployment.max_replicas, "replicas": replicas}
+
+
+@app.get("/logs/{tool_id}")
+def tool_log_lines(tool_id: int, after: int = 0, since: Optional[float] = None, tail: Optional[int] = None):
+    """Buffered output: lines after sequence ``after``, written at or after ``since``, at most the last ``tail``."""
+    ring = tool_logs.get(tool_id)
+    if ring is None:
+        raise HTTPException(status_code=404, detail="No logs for this tool")
+    return ring.describe(after, since, tail)
+
+
+@app.get("/logs/{tool_id}/follow")
+def follow_tool_logs(tool_id: int, after: int = 0):
+    ring = tool_logs.get(tool_id)
+    if ring is None:
+        raise HTTPException(status_code=404, detail="No logs for this tool")
+    return StreamingResponse(_ndjson(ring.follow(after)), media_type="application/x-ndjson")
+
+
+@app.get("/activity")
+def tool_activity():
+    with _hibernated_lock:
+        hibernated = sorted(_hibernated)
+    return {"idle_timeout_seconds": IDLE_TIMEOUT_SECONDS, "last_active": activity.last_active(), "hibernated": hibernated}
+
+
+@app.get("/node")
+def node_status():
+    return {**node_report(client, admission), "status": reporter.status}
+
+
+@app.get("/usage")
+def usage():
+    """Reservations against this host and what each tool replica actually uses, for right-sizing profiles."""
+    containers = [
+        container
+        for container in client.containers.list(filters={"label": "sheetify.managed=true"})
+        if tool_id_of(container) is not None
+    ]
+    return {"host": admission.snapshot(), "containers": [container_usage(container) for container in containers]}
+
+
+@app.get("/images")
+def images():
+    """Image disk usage per tool, with what a GC pass would evict right now."""
+    return {**image_gc.disk_usage(), "plan": image_gc.plan(), "last_gc": image_gc.last_report}
+
+
+@app.post("/images/gc")
+def collect_images(dry_run: Optional[bool] = None):
+    """Run an image GC pass now; ``dry_run`` defaults to ``RUNNER_IMAGE_GC_DRY_RUN``."""
+    return image_gc.collect(dry_run=dry_run)
+
+
+@app.get("/caches")
+def caches():
+    """Each tool's cache volume: size as of the last sweep, hits, misses and invalidations."""
+    return tool_caches.stats()
+
+
+@app.post("/caches/sweep")
+def sweep_caches():
+    """Run a cache sweep now: evict LRU files over quota and drop caches of long-gone tools."""
+    return tool_caches.sweep()
+
+
+@app.get("/warm-pool")
+def warm_pool_stats():
+    return warm_pool.stats() if warm_pool is not None else {"size": 0, "idle": 0}
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.get("/t/{tool_id}")
+@app.get("/t/{tool_id}/{path:path}")
+async def wake(tool_id: int, request: Request, path: str = ""):
+    """Fallback route for tools with no live container: wake the tool, then send the client back."""
+    try:
+        woke = await run_in_threadpool(_wake, tool_id)
+    except docker_errors.NotFound:
+        raise HTTPException(status_code=404, detail="Tool is not deployed")
+    except StartupFailed as exc:
+        raise HTTPException(status_code=504, detail=str(exc))
+    except AdmissionRefused as exc:
+        raise HTTPException(status_code=503, detail=str(exc), headers={"Retry-After": "30"})
+    if not woke:
+        # Running already: give the proxy a moment to publish the tool's route.
+        await asyncio.sleep(1)
+    target = request.url.path + (f"?{request.url.query}" if request.url.query else "")
+    return RedirectResponse(target, status_code=307)
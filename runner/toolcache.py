@@ -0,0 +1,255 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional, Set
+
+from docker import errors as docker_errors
+
+from metrics import TOOL_CACHE_BYTES, TOOL_CACHE_EVICTED_BYTES, TOOL_CACHE_STARTS
+
+# Off by default: pooled containers cannot mount a tool's volume, so caches turn warm starts off.
+TOOL_CACHE_MB = int(os.getenv("RUNNER_TOOL_CACHE_MB", "0"))
+TOOL_CACHE_SWEEP_SECONDS = int(os.getenv("RUNNER_TOOL_CACHE_SWEEP_SECONDS", "300"))
+TOOL_CACHE_MAX_IDLE_DAYS = int(os.getenv("RUNNER_TOOL_CACHE_MAX_IDLE_DAYS", "30"))
+TOOL_CACHE_STATS_PATH = Path(os.getenv("RUNNER_TOOL_CACHE_STATS_PATH", "/var/lib/sheetify/state/tool-caches.json"))
+
+CACHE_VOLUME_PREFIX = "sheetify-cache-"
+CACHE_MOUNT = "/cache"
+# Libraries that follow XDG (Hugging Face, torch hub, pip, ...) keep downloads under the mount; the base
+# entrypoint links Streamlit's ``persist="disk"`` cache there too.
+CACHE_ENVIRONMENT = {"SHEETIFY_CACHE_DIR": CACHE_MOUNT, "XDG_CACHE_HOME": f"{CACHE_MOUNT}/xdg"}
+
+# Runs inside a throwaway base-image container with the volume mounted: deletes the least recently used
+# files while the volume is over quota and prints what is left and what went.
+_SWEEP_SCRIPT = """
+import json, os, sys
+root, quota = sys.argv[1], int(sys.argv[2])
+files = []
+for directory, _, names in os.walk(root):
+    for name in names:
+        path = os.path.join(directory, name)
+        try:
+            stat = os.lstat(path)
+        except OSError:
+            continue
+        files.append((max(stat.st_atime, stat.st_mtime), stat.st_size, path))
+total = sum(size for _, size, _ in files)
+evicted_files = evicted_bytes = 0
+for _, size, path in sorted(files):
+    if total <= quota:
+        break
+    try:
+        os.unlink(path)
+    except OSError:
+        continue
+    total -= size
+    evicted_files += 1
+    evicted_bytes += size
+print(json.dumps({"bytes": total, "files": len(files) - evicted_files,
+                  "evicted_files": evicted_files, "evicted_bytes": evicted_bytes}))
+"""
+
+# Stats fields that accumulate rather than being replaced.
+_COUNTERS = {"hits", "misses", "invalidations", "evicted_files", "evicted_bytes"}
+
+logger = logging.getLogger(__name__)
+
+
+def cache_volume_name(tool_id: int) -> str:
+    return f"{CACHE_VOLUME_PREFIX}{tool_id}"
+
+
+def cache_key(image) -> str:
+    """What a tool's cache was filled by: the image's lockfile and app sources.
+
+    A rebuild from the same lockfile and sources (a new version tag, a new
+    base image) keeps the cache. Images without source labels key on their ID.
+    """
+    labels = image.labels or {}
+    requirements_digest = labels.get("sheetify.requirements-digest")
+    app_digest = labels.get("sheetify.bundle-digest") or labels.get("sheetify.app-digest")
+    if not requirements_digest or not app_digest:
+        return image.id
+    return hashlib.sha256(f"{requirements_digest}\0{app_digest}".encode("utf-8")).hexdigest()
+
+
+class ToolCaches(threading.Thread):
+    """One Docker volume per tool, mounted at ``/cache`` in every replica, that outlives its containers.
+
+    Each volume is labelled with the ``cache_key`` of the image that filled it;
+    a run whose image has another key starts from a fresh volume. Docker cannot
+    cap a volume's size, so every ``interval`` seconds each volume is swept in a
+    throwaway container from ``image``, deleting least recently used files
+    until it is within ``quota_bytes``. Volumes of tools that are neither
+    deployed (``protected()``) nor started within ``max_idle`` seconds are
+    removed. Hits, misses and the last sweep are kept per tool in
+    ``stats_path`` so they survive runner restarts.
+    """
+
+    def __init__(
+        self,
+        client,
+        image: str,
+        protected: Callable[[], Set[int]],
+        quota_bytes: int,
+        interval: int,
+        max_idle: int,
+        stats_path: Path,
+    ) -> None:
+        super().__init__(name="tool-caches", daemon=True)
+        self.client = client
+        self.image = image
+        self.protected = protected
+        self.quota_bytes = quota_bytes
+        self.interval = interval
+        self.max_idle = max_idle
+        self.stats_path = stats_path
+        self._lock = threading.Lock()
+        self._tool_locks: Dict[int, threading.Lock] = {}
+        self._stopped = threading.Event()
+        try:
+            self._stats: Dict[str, dict] = json.loads(stats_path.read_text())
+        except (OSError, ValueError):
+            self._stats = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.quota_bytes > 0
+
+    def run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception:  # pragma: no cover
+                logger.exception("Tool cache sweep failed")
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def _tool_lock(self, tool_id: int) -> threading.Lock:
+        with self._lock:
+            return self._tool_locks.setdefault(tool_id, threading.Lock())
+
+    def _update(self, tool_id: int, **counts) -> dict:
+        with self._lock:
+            stats = self._stats.setdefault(str(tool_id), dict.fromkeys(sorted(_COUNTERS), 0))
+            for key, value in counts.items():
+                stats[key] = stats.get(key, 0) + value if key in _COUNTERS else value
+            self._save()
+            return dict(stats)
+
+    def _save(self) -> None:
+        self.stats_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.stats_path.with_name(f".{self.stats_path.name}.tmp")
+        tmp.write_text(json.dumps(self._stats))
+        os.replace(tmp, self.stats_path)
+
+    def prepare(self, tool_id: int, image_ref: str) -> Optional[str]:
+        """Make the tool's volume match ``image_ref`` before its replicas start.
+
+        Call with no containers of the tool left, since a volume in use cannot
+        be replaced. Returns ``hit`` (volume kept), ``miss`` (first volume) or
+        ``invalidated`` (lockfile or app changed), or ``None`` when disabled.
+        """
+        if not self.enabled:
+            return None
+        key = cache_key(self.client.images.get(image_ref))
+        name = cache_volume_name(tool_id)
+        with self._tool_lock(tool_id):
+            try:
+                volume = self.client.volumes.get(name)
+            except docker_errors.NotFound:
+                volume = None
+            if volume is None:
+                outcome = "miss"
+            elif (volume.attrs.get("Labels") or {}).get("sheetify.cache-key") != key:
+                volume.remove(force=True)
+                outcome = "invalidated"
+            else:
+                outcome = "hit"
+            if outcome != "hit":
+                self.client.volumes.create(
+                    name=name,
+                    labels={"sheetify.tool-cache": "true", "sheetify.tool-id": str(tool_id), "sheetify.cache-key": key},
+                )
+                TOOL_CACHE_BYTES.labels(str(tool_id)).set(0)
+                self._update(tool_id, bytes=0, files=0)
+            counter = {"hit": "hits", "miss": "misses", "invalidated": "invalidations"}[outcome]
+            self._update(tool_id, key=key, last_started=time.time(), **{counter: 1})
+        TOOL_CACHE_STARTS.labels(str(tool_id), outcome).inc()
+        return outcome
+
+    def run_kwargs(self, tool_id: int) -> dict:
+        """``containers.run`` arguments that mount the tool's cache; empty when disabled."""
+        if not self.enabled:
+            return {}
+        return {
+            "volumes": {cache_volume_name(tool_id): {"bind": CACHE_MOUNT, "mode": "rw"}},
+            "environment": CACHE_ENVIRONMENT,
+        }
+
+    def _sweep_volume(self, name: str) -> dict:
+        output = self.client.containers.run(
+            self.image,
+            ["python", "-c", _SWEEP_SCRIPT, CACHE_MOUNT, str(self.quota_bytes)],
+            entrypoint=[],
+            remove=True,
+            network_disabled=True,
+            volumes={name: {"bind": CACHE_MOUNT, "mode": "rw"}},
+        )
+        return json.loads(output)
+
+    def sweep(self) -> dict:
+        """Bring every cache volume within quota and remove those of long-gone tools; reports each tool."""
+        protected = self.protected()
+        now = time.time()
+        swept, removed = {}, []
+        for volume in self.client.volumes.list(filters={"label": "sheetify.tool-cache=true"}):
+            tool_id = int((volume.attrs.get("Labels") or {})["sheetify.tool-id"])
+            with self._tool_lock(tool_id):
+                last_started = self._stats.get(str(tool_id), {}).get("last_started")
+                if last_started is None:
+                    # A volume the stats have lost track of counts as used now rather than as ancient.
+                    last_started = self._update(tool_id, last_started=now)["last_started"]
+                if tool_id not in protected and now - last_started > self.max_idle:
+                    try:
+                        volume.remove()
+                    except docker_errors.APIError as exc:
+                        # Still mounted, e.g. by a stopped container.
+                        logger.info("Keeping cache volume %s: %s", volume.name, exc)
+                        continue
+                    with self._lock:
+                        self._stats.pop(str(tool_id), None)
+                        self._save()
+                    try:
+                        TOOL_CACHE_BYTES.remove(str(tool_id))
+                    except KeyError:
+                        pass
+                    removed.append(tool_id)
+                    continue
+                usage = self._sweep_volume(volume.name)
+                stats = self._update(
+                    tool_id,
+                    bytes=usage["bytes"],
+                    files=usage["files"],
+                    evicted_files=usage["evicted_files"],
+                    evicted_bytes=usage["evicted_bytes"],
+                    last_swept=now,
+                )
+            TOOL_CACHE_BYTES.labels(str(tool_id)).set(usage["bytes"])
+            TOOL_CACHE_EVICTED_BYTES.inc(usage["evicted_bytes"])
+            swept[tool_id] = {**stats, "evicted_now": usage["evicted_bytes"]}
+        return {"finished_at": now, "quota_bytes": self.quota_bytes, "tools": swept, "removed": removed}
+
+    def stats(self) -> dict:
+        """Size as of the last sweep and start hit ratio, per tool."""
+        with self._lock:
+            tools = {}
+            for tool_id, stats in self._stats.items():
+                starts = stats.get("hits", 0) + stats.get("misses", 0) + stats.get("invalidations", 0)
+                tools[tool_id] = {**stats, "hit_ratio": round(stats.get("hits", 0) / starts, 3) if starts else None}
+        return {"enabled": self.enabled, "quota_bytes": self.quota_bytes, "tools": tools}
@@ -0,0 +1,53 @@
+import os
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+from metrics import PHASE_SECONDS
+
+# W3C trace context: version-trace_id-parent_id-flags.
+TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+_traceparent: ContextVar[Optional[str]] = ContextVar("traceparent", default=None)
+
+
+def trace_id_of(traceparent: Optional[str]) -> Optional[str]:
+    match = TRACEPARENT.match(traceparent or "")
+    return match.group(1) if match else None
+
+
+def set_traceparent(traceparent: Optional[str]):
+    """Make the caller's ``traceparent`` current, or start a new trace; returns the reset token."""
+    if not trace_id_of(traceparent):
+        traceparent = f"00-{os.urandom(16).hex()}-{os.urandom(8).hex()}-01"
+    return _traceparent.set(traceparent)
+
+
+def reset_traceparent(token) -> None:
+    _traceparent.reset(token)
+
+
+def current_traceparent() -> Optional[str]:
+    return _traceparent.get()
+
+
+class PhaseTimer:
+    """Wall-clock seconds per phase of one build or run, also observed in ``sheetify_runner_phase_seconds``."""
+
+    def __init__(self, operation: str) -> None:
+        self.operation = operation
+        self.timings: Dict[str, float] = {}
+
+    def record(self, phase: str, seconds: float) -> None:
+        self.timings[phase] = round(self.timings.get(phase, 0.0) + seconds, 3)
+        PHASE_SECONDS.labels(self.operation, phase).observe(seconds)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record(name, time.monotonic() - started)
@@ -0,0 +1,140 @@
+import json
+import logging
+import os
+import threading
+import uuid
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from docker import errors as docker_errors
+from packaging.requirements import InvalidRequirement, Requirement
+from packaging.utils import canonicalize_name
+
+from containers import CONTAINER_OPTIONS
+from metrics import WARM_POOL_IDLE
+
+WARM_POOL_SIZE = int(os.getenv("RUNNER_WARM_POOL_SIZE", "2"))
+WARM_POOL_REFILL_SECONDS = int(os.getenv("RUNNER_WARM_POOL_REFILL_SECONDS", "5"))
+# CPU and memory limits are applied when a container is claimed; the pids limit can only be set at creation.
+WARM_POOL_PIDS_LIMIT = int(os.getenv("RUNNER_WARM_POOL_PIDS_LIMIT", "256"))
+WARM_CONTAINER_PREFIX = "sheetify-warm-"
+WARM_BOOT_COMMAND = ["python", "/opt/sheetify/warm_boot.py"]
+
+logger = logging.getLogger(__name__)
+
+
+class WarmPool(threading.Thread):
+    """Keeps ``size`` idle containers booted from the base image, ready to be handed an app.
+
+    Pooled containers have already imported Streamlit and wait for a launch
+    file (see ``base/warm_boot.py``), so only tools whose requirements the base
+    image already satisfies can use them. Claimed containers are replaced in
+    the background.
+    """
+
+    def __init__(self, client, image: str, size: int, network: Optional[str], interval: int) -> None:
+        super().__init__(name="warm-pool", daemon=True)
+        self.client = client
+        self.image = image
+        self.size = size
+        self.network = network
+        self.interval = interval
+        self._idle: Deque = deque()
+        self._lock = threading.Lock()
+        self._wanted = threading.Event()
+        self._stopped = threading.Event()
+        self._packages: Dict[str, Dict[str, str]] = {}
+
+    def run(self) -> None:
+        self._adopt()
+        while not self._stopped.is_set():
+            try:
+                self.refill()
+            except Exception:  # pragma: no cover
+                logger.exception("Warm pool refill failed")
+            self._wanted.wait(self.interval)
+            self._wanted.clear()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._wanted.set()
+
+    def _adopt(self) -> None:
+        """Reuse idle pool containers left by a previous runner process and drop stale or surplus ones."""
+        image_id = self.client.images.get(self.image).id
+        for container in self.client.containers.list(all=True, filters={"name": WARM_CONTAINER_PREFIX}):
+            if container.status == "running" and container.image.id == image_id and len(self._idle) < self.size:
+                with self._lock:
+                    self._idle.append(container)
+            else:
+                container.remove(force=True)
+        WARM_POOL_IDLE.set(len(self._idle))
+
+    def refill(self) -> None:
+        while len(self._idle) < self.size and not self._stopped.is_set():
+            container = self.client.containers.run(
+                self.image,
+                name=f"{WARM_CONTAINER_PREFIX}{uuid.uuid4().hex[:12]}",
+                command=WARM_BOOT_COMMAND,
+                detach=True,
+                network=self.network,
+                labels={"sheetify.managed": "true", "sheetify.warm": "true"},
+                pids_limit=WARM_POOL_PIDS_LIMIT,
+                **CONTAINER_OPTIONS,
+            )
+            with self._lock:
+                self._idle.append(container)
+                WARM_POOL_IDLE.set(len(self._idle))
+
+    def claim(self):
+        """Hand out an idle container, or ``None`` if the pool is empty."""
+        try:
+            while True:
+                with self._lock:
+                    container = self._idle.popleft()
+                    WARM_POOL_IDLE.set(len(self._idle))
+                try:
+                    container.reload()
+                except docker_errors.NotFound:
+                    continue
+                if container.status == "running":
+                    return container
+                container.remove(force=True)
+        except IndexError:
+            return None
+        finally:
+            self._wanted.set()
+
+    def base_packages(self) -> Dict[str, str]:
+        """Installed distributions in the base image, by canonical name; cached per image ID."""
+        image_id = self.client.images.get(self.image).id
+        if image_id not in self._packages:
+            output = self.client.containers.run(
+                self.image, ["pip", "list", "--format=json"], entrypoint=[], remove=True, network_disabled=True
+            )
+            self._packages[image_id] = {
+                canonicalize_name(package["name"]): package["version"] for package in json.loads(output)
+            }
+        return self._packages[image_id]
+
+    def can_serve(self, requirements_txt: str) -> bool:
+        """Whether every requirement is already satisfied by the base image."""
+        installed = self.base_packages()
+        for line in requirements_txt.splitlines():
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            try:
+                requirement = Requirement(line)
+            except InvalidRequirement:
+                # Pip options, URLs and the like: leave these to a real build.
+                return False
+            if requirement.marker is not None and not requirement.marker.evaluate():
+                continue
+            version = installed.get(canonicalize_name(requirement.name))
+            if version is None or not requirement.specifier.contains(version, prereleases=True):
+                return False
+        return True
+
+    def stats(self) -> dict:
+        return {"size": self.size, "idle": len(self._idle)}
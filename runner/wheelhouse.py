@@ -0,0 +1,126 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, Generator, List
+
+from sandbox import SANDBOX_WHEELHOUSE, Sandbox, SandboxError
+
+WHEELHOUSE_DIR = Path(os.getenv("SHEETIFY_WHEELHOUSE_DIR", "/var/lib/sheetify/wheelhouse"))
+# The same directory as the Docker daemon knows it (a volume name or host path), to mount into sandboxes.
+WHEELHOUSE_VOLUME = os.getenv("SHEETIFY_WHEELHOUSE_VOLUME", "sheetify-wheelhouse")
+WHEELHOUSE_BUDGET_MB = int(os.getenv("SHEETIFY_WHEELHOUSE_BUDGET_MB", "10240"))
+WHEELHOUSE_OFFLINE = os.getenv("SHEETIFY_WHEELHOUSE_OFFLINE", "false").lower() in {"1", "true", "yes"}
+
+
+class WheelhouseError(Exception):
+    pass
+
+
+class Wheelhouse:
+    """Persistent wheel cache shared by every tool build on this runner.
+
+    Each requirements set is resolved into wheels once and recorded in a
+    manifest; later builds copy the listed wheels into their build context and
+    install with ``--no-index``. The wheels are built by pip in a sandbox
+    container, since sdists run their own build code. Wheels are evicted least
+    recently used first once the directory exceeds its budget.
+    """
+
+    def __init__(self, root: Path, budget_bytes: int, offline: bool = False) -> None:
+        self.wheels_dir = root / "wheels"
+        self.manifests_dir = root / "manifests"
+        self.budget_bytes = budget_bytes
+        self.offline = offline
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self._evict_lock = threading.Lock()
+
+    def _lock_for(self, key: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _cached(self, manifest: Path) -> List[Path]:
+        if not manifest.exists():
+            return []
+        wheels = [self.wheels_dir / name for name in manifest.read_text().split()]
+        if not all(wheel.exists() for wheel in wheels):
+            return []
+        for wheel in wheels:
+            os.utime(wheel)
+        return wheels
+
+    def _build(self, requirements_txt: str, manifest: Path, sandbox: Sandbox) -> Generator[str, None, List[Path]]:
+        self.wheels_dir.mkdir(parents=True, exist_ok=True)
+        self.manifests_dir.mkdir(parents=True, exist_ok=True)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            out = Path(tmpdir)
+            cmd = [
+                "pip",
+                "wheel",
+                "--wheel-dir",
+                "out",
+                "--find-links",
+                f"{SANDBOX_WHEELHOUSE}/{self.wheels_dir.name}",
+                "-r",
+                "requirements.txt",
+            ]
+            if self.offline:
+                cmd.append("--no-index")
+            try:
+                yield from sandbox.run(cmd, {"requirements.txt": requirements_txt}, collect=out)
+            except SandboxError as exc:
+                raise WheelhouseError(str(exc) or "pip wheel failed")
+            names = sorted(path.name for path in out.glob("*.whl"))
+            for name in names:
+                shutil.move(str(out / name), str(self.wheels_dir / name))
+        manifest.write_text("\n".join(names))
+        return [self.wheels_dir / name for name in names]
+
+    def resolve(self, requirements_txt: str, sandbox: Sandbox) -> Generator[str, None, List[Path]]:
+        """Yield log lines while collecting the wheels for ``requirements_txt``, building missing ones in ``sandbox``.
+
+        The wheel paths are the generator's return value, so callers use
+        ``wheels = yield from wheelhouse.resolve(...)``.
+        """
+        key = hashlib.sha256(requirements_txt.encode("utf-8")).hexdigest()
+        manifest = self.manifests_dir / f"{key}.txt"
+        with self._lock_for(key):
+            wheels = self._cached(manifest)
+            if wheels:
+                yield f"Wheelhouse hit: {len(wheels)} cached wheels"
+                return wheels
+            wheels = yield from self._build(requirements_txt, manifest, sandbox)
+        self.evict(keep={wheel.name for wheel in wheels})
+        return wheels
+
+    def usage(self) -> dict:
+        wheels = list(self.wheels_dir.glob("*.whl")) if self.wheels_dir.exists() else []
+        return {
+            "wheels": len(wheels),
+            "bytes": sum(wheel.stat().st_size for wheel in wheels),
+            "budget_bytes": self.budget_bytes,
+            "offline": self.offline,
+        }
+
+    def evict(self, keep=frozenset()) -> List[str]:
+        if not self.wheels_dir.exists():
+            return []
+        evicted = []
+        with self._evict_lock:
+            wheels = sorted(self.wheels_dir.glob("*.whl"), key=lambda path: path.stat().st_mtime)
+            total = sum(wheel.stat().st_size for wheel in wheels)
+            for wheel in wheels:
+                if total <= self.budget_bytes:
+                    break
+                if wheel.name in keep:
+                    continue
+                total -= wheel.stat().st_size
+                wheel.unlink(missing_ok=True)
+                evicted.append(wheel.name)
+        return evicted
+
+
+wheelhouse = Wheelhouse(WHEELHOUSE_DIR, WHEELHOUSE_BUDGET_MB * 1024 * 1024, WHEELHOUSE_OFFLINE)
@@ -1,23 +1,409 @@
-import pandas as pd
+import hashlib
+import os
+import re
+import tempfile
+from datetime import datetime, time
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 import streamlit as st
 
+# Parsed files are kept as Parquet, named by the CSV's content hash, so a file is only parsed once. On Sheetify
+# the tool's cache volume (SHEETIFY_CACHE_DIR) keeps them across restarts.
+CACHE_DIR = Path(
+    os.getenv("CSV_EXPLORER_CACHE_DIR")
+    or Path(os.getenv("SHEETIFY_CACHE_DIR") or tempfile.gettempdir()) / "csv-explorer"
+)
+CACHE_BUDGET_BYTES = int(os.getenv("CSV_EXPLORER_CACHE_MB", "512")) * 1024 * 1024
+# Every rerun touches the file it reads, so anything newer than this may still be open in another session.
+EVICT_MIN_AGE_SECONDS = 600
+APP_DIR = Path(__file__).resolve().parent
+SAMPLE_BYTES = 4 * 1024 * 1024
+BLOCK_BYTES = 16 * 1024 * 1024
+EXPORT_ROWS = 100_000
+ROW = "__row__"
+MAX_CHOICES = 200
+MAX_GROUPS = 1000
+PAGE_SIZES = [50, 100, 500, 1000]
+AGGREGATES = ["count", "count_distinct", "sum", "mean", "min", "max"]
+
+
+class Source:
+    """A CSV to explore: an upload (held in memory by Streamlit) or a file shipped with the app."""
+
+    def __init__(self, name: str, digest: str, buffer=None, path: Optional[Path] = None) -> None:
+        self.name = name
+        self.digest = digest
+        self._buffer = buffer
+        self._path = path
+
+    def open(self):
+        if self._path is not None:
+            return pa.OSFile(str(self._path))
+        return pa.BufferReader(pa.py_buffer(self._buffer))
+
+    def sample(self) -> bytes:
+        stream = self.open()
+        try:
+            return stream.read(SAMPLE_BYTES)
+        finally:
+            stream.close()
+
+
+def upload_source(uploaded) -> Source:
+    # Hashing a large upload takes a while, so do it once per upload rather than on every rerun.
+    key = f"digest:{getattr(uploaded, 'file_id', None) or (uploaded.name, uploaded.size)}"
+    if key not in st.session_state:
+        st.session_state[key] = hashlib.blake2b(uploaded.getbuffer(), digest_size=20).hexdigest()
+    return Source(uploaded.name, st.session_state[key], buffer=uploaded.getbuffer())
+
+
+def file_source(path: Path) -> Source:
+    stat = path.stat()
+    key = f"digest:{path}:{stat.st_size}:{stat.st_mtime_ns}"
+    if key not in st.session_state:
+        digest = hashlib.blake2b(digest_size=20)
+        with path.open("rb") as handle:
+            for chunk in iter(lambda: handle.read(BLOCK_BYTES), b""):
+                digest.update(chunk)
+        st.session_state[key] = digest.hexdigest()
+    return Source(str(path.relative_to(APP_DIR)), st.session_state[key], path=path)
+
+
+def infer_types(sample: bytes) -> dict:
+    """Column types from the first few MB; repetitive text columns become dictionary-encoded."""
+    cut = sample.rfind(b"\n")
+    if cut > 0:
+        sample = sample[: cut + 1]
+    try:
+        table = pacsv.read_csv(pa.BufferReader(sample))
+    except pa.ArrowInvalid:
+        return {}
+    types = {}
+    for name, column in zip(table.column_names, table.columns):
+        if pa.types.is_null(column.type):
+            types[name] = pa.string()
+        elif pa.types.is_string(column.type) and pc.count_distinct(column).as_py() <= len(column) // 2:
+            types[name] = pa.dictionary(pa.int32(), pa.string())
+        else:
+            types[name] = column.type
+    return types
+
+
+def _wider(type_: pa.DataType) -> pa.DataType:
+    return pa.float64() if pa.types.is_integer(type_) else pa.string()
+
+
+def _write_parquet(source: Source, target: Path, column_types: dict) -> None:
+    """Stream the CSV into Parquet one block at a time, adding each row's position as ``__row__``."""
+    # Sessions are threads of one process, so the temp name must be unique per writer, not per process.
+    with tempfile.NamedTemporaryFile(
+        dir=target.parent, prefix=f"{target.stem}.", suffix=".partial", delete=False
+    ) as handle:
+        partial = Path(handle.name)
+    try:
+        reader = pacsv.open_csv(
+            source.open(),
+            read_options=pacsv.ReadOptions(block_size=BLOCK_BYTES),
+            convert_options=pacsv.ConvertOptions(column_types=column_types),
+        )
+        schema = reader.schema.append(pa.field(ROW, pa.int64()))
+        rows = 0
+        with pq.ParquetWriter(str(partial), schema, compression="zstd") as writer:
+            for batch in reader:
+                positions = pa.array(np.arange(rows, rows + batch.num_rows, dtype=np.int64))
+                writer.write_table(pa.Table.from_arrays([*batch.columns, positions], schema=schema))
+                rows += batch.num_rows
+        os.replace(partial, target)
+    finally:
+        partial.unlink(missing_ok=True)
+
+
+def _evict(keep: Path) -> None:
+    files = sorted(CACHE_DIR.glob("*.parquet"), key=lambda path: path.stat().st_mtime)
+    total = sum(path.stat().st_size for path in files)
+    cutoff = datetime.now().timestamp() - EVICT_MIN_AGE_SECONDS
+    for path in files:
+        if total <= CACHE_BUDGET_BYTES or path.stat().st_mtime > cutoff:
+            # Oldest first, so every file left is recent enough to be in use.
+            break
+        if path != keep:
+            total -= path.stat().st_size
+            path.unlink(missing_ok=True)
+
+
+def parquet_path(source: Source) -> str:
+    target = CACHE_DIR / f"{source.digest}.parquet"
+    if not target.exists():
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        column_types = infer_types(source.sample())
+        names = list(column_types)
+        # A value the sample did not predict (a decimal in an integer column, say) widens that column and retries.
+        for _ in range(2 * len(names) + 1):
+            try:
+                _write_parquet(source, target, column_types)
+                break
+            except pa.ArrowInvalid as exc:
+                match = re.search(r"CSV column #(\d+)", str(exc))
+                if not match or int(match.group(1)) >= len(names):
+                    raise
+                name = names[int(match.group(1))]
+                column_types[name] = _wider(column_types[name])
+        _evict(keep=target)
+    os.utime(target)
+    return str(target)
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def open_dataset(path: str) -> ds.Dataset:
+    return ds.dataset(path, format="parquet")
+
+
+def _decoded(table: pa.Table) -> pa.Table:
+    for index, field in enumerate(table.schema):
+        if pa.types.is_dictionary(field.type):
+            table = table.set_column(index, field.name, table.column(index).cast(field.type.value_type))
+    return table
+
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def column_profile(path: str, name: str) -> dict:
+    column = _decoded(open_dataset(path).to_table(columns=[name])).column(name)
+    if pa.types.is_integer(column.type) or pa.types.is_floating(column.type):
+        bounds = pc.min_max(column).as_py()
+        return {"kind": "range", "min": bounds["min"], "max": bounds["max"]}
+    if pa.types.is_timestamp(column.type) or pa.types.is_date(column.type):
+        bounds = pc.min_max(column).as_py()
+        return {"kind": "dates", "min": bounds["min"], "max": bounds["max"]}
+    values = pc.unique(column.drop_null())
+    if len(values) <= MAX_CHOICES:
+        return {"kind": "choice", "values": sorted(values.to_pylist(), key=str)}
+    return {"kind": "text"}
+
+
+def _expression(filters: tuple, schema: pa.Schema) -> Optional[ds.Expression]:
+    expression = None
+    for name, op, value in filters:
+        field, type_ = ds.field(name), schema.field(name).type
+        if pa.types.is_dictionary(type_):
+            field, type_ = field.cast(type_.value_type), type_.value_type
+        if op == "between":
+            term = (field >= pa.scalar(value[0], type=type_)) & (field <= pa.scalar(value[1], type=type_))
+        elif op == "in":
+            term = field.isin(pa.array(value, type=type_))
+        else:
+            term = pc.match_substring(field.cast(pa.string()), value, ignore_case=True)
+        expression = term if expression is None else expression & term
+    return expression
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def view_rows(path: str, filters: tuple, sort: Optional[Tuple[str, bool]]) -> Optional[pa.Array]:
+    """Positions of the matching rows in display order, or ``None`` for the whole file in file order.
+
+    Only ``__row__`` and the sort column are read, so the view costs a few
+    columns of memory however wide the file is.
+    """
+    if not filters and sort is None:
+        return None
+    dataset = open_dataset(path)
+    columns = [ROW] if sort is None else [ROW, sort[0]]
+    table = dataset.to_table(columns=columns, filter=_expression(filters, dataset.schema))
+    if sort is not None:
+        table = _decoded(table).sort_by([(sort[0], "descending" if sort[1] else "ascending")])
+    return table.column(ROW).combine_chunks()
+
+
+def page_frame(path: str, rows: Optional[pa.Array], offset: int, size: int, total: int, columns: List[str]):
+    dataset = open_dataset(path)
+    if rows is None:
+        positions = pa.array(np.arange(offset, min(offset + size, total), dtype=np.int64))
+    else:
+        positions = rows.slice(offset, size)
+    return dataset.take(positions, columns=[ROW, *columns]).to_pandas().set_index(ROW)
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def aggregate(path: str, filters: tuple, keys: Tuple[str, ...], value: str, function: str):
+    dataset = open_dataset(path)
+    table = _decoded(dataset.to_table(columns=[*keys, value], filter=_expression(filters, dataset.schema)))
+    aggregation = (value, function, pc.CountOptions(mode="all")) if function == "count" else (value, function)
+    result = table.group_by(list(keys)).aggregate([aggregation]).to_pandas()
+    result = result.rename(columns={f"{ROW}_count": "rows"})
+    result = result.sort_values(result.columns[-1], ascending=False)
+    return len(result), result.head(MAX_GROUPS)
+
+
+def _export_tables(dataset: ds.Dataset, rows: Optional[pa.Array], columns: List[str]) -> Iterator[pa.Table]:
+    if rows is None:
+        for batch in dataset.to_batches(columns=columns):
+            yield pa.Table.from_batches([batch])
+        return
+    for start in range(0, len(rows), EXPORT_ROWS):
+        yield dataset.take(rows.slice(start, EXPORT_ROWS), columns=columns)
+
+
+def export(path: str, rows: Optional[pa.Array], columns: List[str], fmt: str) -> bytes:
+    """Write the current view to a temporary file in chunks and return its bytes."""
+    dataset = open_dataset(path)
+    schema = pa.schema([dataset.schema.field(name) for name in columns])
+    if fmt == "csv":
+        schema = _decoded(schema.empty_table()).schema
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=CACHE_DIR) as tmpdir:
+        target = Path(tmpdir) / f"export.{fmt}"
+        if fmt == "csv":
+            writer = pacsv.CSVWriter(str(target), schema)
+        else:
+            writer = pq.ParquetWriter(str(target), schema, compression="zstd")
+        try:
+            for table in _export_tables(dataset, rows, columns):
+                writer.write_table(_decoded(table) if fmt == "csv" else table)
+        finally:
+            writer.close()
+        return target.read_bytes()
+
+
 st.set_page_config(page_title="CSV Explorer", page_icon="🧮", layout="wide")
 st.title("CSV Explorer")
 
-uploaded_file = st.file_uploader("Upload a CSV file", type=["csv"]) 
+bundled = sorted(path for path in APP_DIR.rglob("*.csv") if CACHE_DIR not in path.parents)
+mode = st.sidebar.radio("Source", ["Upload", "File shipped with the app"]) if bundled else "Upload"
+source = None
+if mode == "Upload":
+    uploaded_file = st.sidebar.file_uploader("Upload a CSV file", type=["csv"])
+    if uploaded_file is not None:
+        source = upload_source(uploaded_file)
+else:
+    chosen = st.sidebar.selectbox("CSV file", bundled, format_func=lambda path: str(path.relative_to(APP_DIR)))
+    source = file_source(chosen)
 
-if uploaded_file is not None:
-    try:
-        dataframe = pd.read_csv(uploaded_file)
-        st.success(f"Loaded {len(dataframe)} rows")
-        st.dataframe(dataframe, use_container_width=True)
-        st.download_button(
-            "Download filtered CSV",
-            data=dataframe.to_csv(index=False).encode("utf-8"),
-            file_name="filtered.csv",
-            mime="text/csv",
+if source is None:
+    st.info(
+        "Upload a CSV to begin exploring your data. Streamlit limits uploads to 200 MB; "
+        "raise `server.maxUploadSize` in `.streamlit/config.toml` for larger files."
+    )
+    st.stop()
+
+try:
+    with st.spinner(f"Reading {source.name} (only the first time this file is opened)..."):
+        path = parquet_path(source)
+except (pa.ArrowInvalid, OSError) as exc:  # pragma: no cover
+    st.error(f"Unable to parse CSV: {exc}")
+    st.stop()
+
+dataset = open_dataset(path)
+names = [field.name for field in dataset.schema if field.name != ROW]
+total_rows = dataset.count_rows()
+
+st.sidebar.header("View")
+columns = st.sidebar.multiselect("Columns", names, default=names) or names
+filters = []
+for name in st.sidebar.multiselect("Filter by", names):
+    profile = column_profile(path, name)
+    if profile["kind"] == "range":
+        low, high = profile["min"], profile["max"]
+        if low is None or low == high:
+            continue
+        chosen_range = st.sidebar.slider(name, low, high, (low, high))
+        if chosen_range != (low, high):
+            filters.append((name, "between", chosen_range))
+    elif profile["kind"] == "dates":
+        low, high = profile["min"], profile["max"]
+        if low is None:
+            continue
+        is_timestamp = isinstance(low, datetime)
+        picked = st.sidebar.date_input(
+            name,
+            value=(low.date(), high.date()) if is_timestamp else (low, high),
+            min_value=low.date() if is_timestamp else low,
+            max_value=high.date() if is_timestamp else high,
         )
-    except Exception as exc:  # pragma: no cover
-        st.error(f"Unable to parse CSV: {exc}")
+        if len(picked) == 2:
+            start, end = picked
+            if is_timestamp:
+                start, end = datetime.combine(start, time.min), datetime.combine(end, time.max)
+            filters.append((name, "between", (start, end)))
+    elif profile["kind"] == "choice":
+        values = st.sidebar.multiselect(f"{name} is one of", profile["values"])
+        if values:
+            filters.append((name, "in", tuple(values)))
+    else:
+        text = st.sidebar.text_input(f"{name} contains")
+        if text:
+            filters.append((name, "contains", text))
+filters = tuple(filters)
+
+sort_column = st.sidebar.selectbox("Sort by", ["(file order)", *names])
+descending = st.sidebar.checkbox("Descending", value=False)
+sort = None if sort_column == "(file order)" else (sort_column, descending)
+page_size = st.sidebar.selectbox("Rows per page", PAGE_SIZES, index=1)
+
+try:
+    with st.spinner("Applying filters..."):
+        rows = view_rows(path, filters, sort)
+except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as exc:  # pragma: no cover
+    st.error(f"Unable to apply the filters: {exc}")
+    st.stop()
+matching = total_rows if rows is None else len(rows)
+pages = max(1, -(-matching // page_size))
+
+summary, pager = st.columns([3, 1])
+# Changing the view starts again from its first page.
+view_key = hash((filters, sort, page_size))
+page = pager.number_input(f"Page (of {pages:,})", min_value=1, max_value=pages, value=1, step=1, key=f"page:{view_key}")
+offset = (page - 1) * page_size
+if matching:
+    summary.caption(
+        f"Rows {offset + 1:,}–{min(offset + page_size, matching):,} of {matching:,}"
+        + (f" (filtered from {total_rows:,})" if rows is not None and filters else "")
+    )
+    st.dataframe(page_frame(path, rows, offset, page_size, total_rows, columns), use_container_width=True)
 else:
-    st.info("Upload a CSV to begin exploring your data.")
+    summary.caption(f"No rows match the filters (out of {total_rows:,}).")
+
+with st.expander("Group and aggregate"):
+    keys = st.multiselect("Group by", names, max_selections=3)
+    function = st.selectbox("Aggregate", AGGREGATES)
+    numeric = [
+        field.name
+        for field in dataset.schema
+        if field.name in names
+        and field.name not in keys
+        and (pa.types.is_integer(field.type) or pa.types.is_floating(field.type))
+    ]
+    candidates = [name for name in names if name not in keys] if function.startswith("count") else numeric
+    value = ROW if function == "count" else st.selectbox("Of column", candidates)
+    if keys and value:
+        with st.spinner("Aggregating..."):
+            groups, result = aggregate(path, filters, tuple(keys), value, function)
+        if groups > MAX_GROUPS:
+            st.caption(f"Showing the top {MAX_GROUPS:,} of {groups:,} groups.")
+        st.dataframe(result, use_container_width=True, hide_index=True)
+
+with st.expander("Download"):
+    fmt = st.radio("Format", ["csv", "parquet"], horizontal=True)
+    # The file is only written when asked for, instead of re-encoding the whole view on every rerun.
+    if st.button(f"Prepare {matching:,} rows"):
+        with st.spinner("Preparing download..."):
+            data = export(path, rows, columns, fmt)
+        st.download_button(
+            "Download",
+            data=data,
+            file_name=f"filtered.{fmt}",
+            mime="text/csv" if fmt == "csv" else "application/vnd.apache.parquet",
+        )
+
+with st.expander("Columns and types"):
+    metadata = pq.ParquetFile(path).metadata
+    st.caption(
+        f"{total_rows:,} rows in {metadata.num_row_groups} row groups; "
+        f"{Path(path).stat().st_size / 1024 / 1024:,.1f} MB as Parquet."
+    )
+    st.table({"column": names, "type": [str(dataset.schema.field(name).type) for name in names]})